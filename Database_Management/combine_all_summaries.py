@@ -3,7 +3,13 @@ from datetime import datetime
 import pandas as pd
 
 
-def combine_all_summaries():
+def combine_all_summaries(main_summary=None, mechanical_summary=None, chemical_summary=None):
+    """ Combines the database, mechanical properties, and chemical composition summaries into one file.
+    :param pd.DataFrame main_summary: Database summary, if None then it is read from the summary file.
+    :param pd.DataFrame mechanical_summary: Individual mechanical properties, if None then read from file.
+    :param pd.DataFrame chemical_summary: Chemical compositions, if None then read from file.
+    :return pd.DataFrame: The overall summary.
+    """
     date = datetime.today().strftime('%Y-%m-%d')
     summary_dir = 'Database_Summaries'
 
@@ -11,9 +17,14 @@ def combine_all_summaries():
     main_file = os.path.join(summary_dir, 'Summarized_Material_DB_' + date + '.csv')
     mech_file = os.path.join(summary_dir, 'Summarized_Mechanical_Props_Individual_' + date + '.csv')
     chem_file = os.path.join(summary_dir, 'Summarized_Chemical_Composition_' + date + '.csv')
-    main_summary = pd.read_csv(main_file, index_col=0)
-    mechanical_summary = pd.read_csv(mech_file, index_col=0)
-    chemical_summary = pd.read_csv(chem_file)
+    if main_summary is None:
+        main_summary = pd.read_csv(main_file, index_col=0)
+    else:
+        main_summary = main_summary.copy()
+    if mechanical_summary is None:
+        mechanical_summary = pd.read_csv(mech_file, index_col=0)
+    if chemical_summary is None:
+        chemical_summary = pd.read_csv(chem_file)
 
     # Columns to keep in each
     mech_cols = ['citekey', 'Yield Stress [MPa]', 'Elastic Modulus [MPa]', 'Fracture Strain']
@@ -46,6 +57,7 @@ def combine_all_summaries():
         rename_dict[c] = c.lower().replace('.', '').replace('[', '_').replace(']', '_').replace(' ', '_')
     main_summary = main_summary.rename(rename_dict, axis='columns')
     main_summary.to_csv(os.path.join(summary_dir, 'Overall_Summary_' + date + '.csv'), index_label='hidden_index')
+    return main_summary
 
 
 if __name__ == "__main__":
@@ -4,38 +4,40 @@ This file generates, sorts, and extracts cleaned stress-strain data from the dat
 The lists in the 'campaign_directories.py' file specify the data.
 
 Run this file from the command line:
->>> python generate_all_clean_data.py
+>>> python generate_all_clean_data.py --jobs 4
 """
 import os
+import sys
+import time
+import argparse
+import contextlib
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
 import pandas as pd
 from shutil import copy2
 import rlmtp
+from rlmtp.instrumentation import Recorder, write_records, print_summary
 from campaign_directories import input_root, campaign_dirs_rlmtp, campaign_dirs_nonrlmtp
 
 
-def gen_clean_data(output_root='./Clean_Data', should_downsample=True):
-    """ Generates, sorts, and extracts all the cleaned stress-strain data from the database.
-    :param str output_root: Directory to place the processed data.
-    :param bool should_downsample: If True, then downsample data, else do not.
-    """
+def get_db_tag(specimen_dir):
+    """ Returns the database tag of the specimen, or None if the directory is not a specimen. """
+    if 'db_tag.txt' in os.listdir(specimen_dir):
+        with open(os.path.join(specimen_dir, 'db_tag.txt'), 'r') as f:
+            db_tag = int(f.readlines()[0])
+    elif 'specimen_description.csv' not in os.listdir(specimen_dir):
+        # Not a valid specimen, so don't process
+        db_tag = None
+    else:
+        print('Generate the database summary!')
+        raise ValueError('Missing db_tag.txt in {0}'.format(specimen_dir))
+    return db_tag
 
-    # Data processing
-    def get_db_tag(specimen_dir):
-        if 'db_tag.txt' in os.listdir(specimen_dir):
-            with open(os.path.join(p, 'db_tag.txt'), 'r') as f:
-                db_tag = int(f.readlines()[0])
-        elif 'specimen_description.csv' not in os.listdir(specimen_dir):
-            # Not a valid specimen, so don't process
-            db_tag = None
-        else:
-            print('Generate the database summary!')
-            raise ValueError('Missing db_tag.txt in {0}'.format(p))
-        return db_tag
 
-    db_tag_to_clean_file = dict()
-    # Process the RLMTP data
+def find_rlmtp_specimens(output_root):
+    """ Returns [db_tag, specimen directory, output directory] for all the RLMTP specimens in the database. """
+    specimens_to_process = []
     for campaign in campaign_dirs_rlmtp:
-        print('Processing {0}'.format(campaign))
         cdir = os.path.normpath(os.path.join(input_root, campaign))
         # next(os.walk(cdir))[1] gets only the directories in cdir
         try:
@@ -49,22 +51,125 @@ def gen_clean_data(output_root='./Clean_Data', should_downsample=True):
                 p = os.path.join(cdir, lp, s)
                 db_tag = get_db_tag(p)
                 if db_tag is not None:
-                    rlmtp.process_specimen_data(p, output_dir, should_downsample=should_downsample)
-                    pre_name = rlmtp.processing.get_pre_name(p)
-                    output_file = rlmtp.processing.processed_file_name(output_dir, pre_name)
-                    # Add the DB tag to the map
-                    db_tag_to_clean_file[db_tag] = output_file
-
-    # Process the non-RLMTP data
-
-    def is_valid_data(file):
-        """ Returns True file contain stress-strain data, False otherwise. """
-        data = pd.read_csv(file, nrows=5)
-        if 'e_true' and 'Sigma_true' in data.columns:
-            return True
-        else:
-            return False
+                    specimens_to_process.append([db_tag, p, output_dir])
+    return specimens_to_process
+
+
+def process_specimen(task):
+    """ Processes a single specimen, the output of rlmtp is written to a log file for the specimen.
+
+    :param list task: [db_tag, specimen directory, output directory, log directory, should_downsample, rebuild,
+        instrument, trace_memory, output_format, plot_text]
+    :return list: [db_tag, processed data file, error message or None, log file, time in seconds, records]
+
+    - Any exception is caught and written to the log, so a failure does not stop the other specimens.
+    - The log file is named [db_tag]_[pre_name].log.
+    - The records of the stages are only collected if instrument is True, see rlmtp.instrumentation.
+    """
+    db_tag, specimen_dir, output_dir, log_dir, should_downsample, rebuild = task[:6]
+    instrument, trace_memory, output_format, plot_text = task[6:]
+    rlmtp.set_text_mode(plot_text)
+    pre_name = rlmtp.processing.get_pre_name(specimen_dir)
+    # The DB tag is unique, the pre_name is repeated across campaigns (e.g., LP1_Specimen_1)
+    label = '{0}_{1}'.format(db_tag, pre_name)
+    recorder = Recorder(specimen=label, trace_memory=trace_memory) if instrument else None
+    log_file = os.path.join(log_dir, label + '.log')
+    output_file = rlmtp.processing.processed_file_name(output_dir, pre_name, output_format)
+    t0 = time.perf_counter()
+    error = None
+    with open(log_file, 'w') as log, contextlib.redirect_stdout(log), contextlib.redirect_stderr(log):
+        try:
+            rlmtp.process_specimen_data(specimen_dir, output_dir, should_downsample=should_downsample, rebuild=rebuild,
+                                        recorder=recorder, output_format=output_format)
+        except Exception as e:
+            traceback.print_exc()
+            error = '{0}: {1}'.format(type(e).__name__, e)
+    records = [] if recorder is None else recorder.records
+    return [db_tag, output_file, error, log_file, time.perf_counter() - t0, records]
+
+
+def find_stale_specimens(output_root, should_downsample=True, output_format='csv'):
+    """ Returns [db_tag, specimen directory, reason] for the RLMTP specimens that need to be processed.
+
+    - A specimen needs to be processed if its output is missing or out-of-date, see rlmtp.manifest.
+    """
+    stale = []
+    for db_tag, p, output_dir in find_rlmtp_specimens(output_root):
+        reason = rlmtp.processing.rebuild_reason(p, output_dir, should_downsample=should_downsample,
+                                                 output_format=output_format)
+        if reason is not None:
+            stale.append([db_tag, p, reason])
+    return stale
+
+
+def process_rlmtp_specimens(output_root, should_downsample=True, jobs=1, log_dir=None, rebuild=False,
+                            instrument_file=None, trace_memory=False, output_format='csv', plot_text='mathtext'):
+    """ Processes all the RLMTP specimens, in parallel if jobs > 1.
+
+    :param str output_root: Directory to place the processed data.
+    :param bool should_downsample: If True, then downsample data, else do not.
+    :param int jobs: Number of worker processes.
+    :param str log_dir: Directory for the log of each specimen, if None then output_root/logs.
+    :param bool rebuild: If True, then all the specimens are processed, else only the out-of-date ones.
+    :param str instrument_file: If not None, the time and memory of each stage are appended to this file as JSON
+        lines and summarized at the end, see rlmtp.instrumentation.
+    :param bool trace_memory: If True, then the peak traced memory of each stage is also recorded.
+    :param str output_format: Format of the processed data files, see rlmtp.processed_data.OUTPUT_FORMATS.
+    :param str plot_text: Text rendering of the figures, 'mathtext' or 'latex'.
+    :return list: [dict, list] Map from the DB tag to the processed data file of the successful specimens, and the
+        results of the failed specimens, see process_specimen.
+    """
+    if log_dir is None:
+        log_dir = os.path.join(output_root, 'logs')
+    rlmtp.dir_maker(log_dir)
+    instrument = instrument_file is not None
+    tasks = [[db_tag, p, output_dir, log_dir, should_downsample, rebuild, instrument, trace_memory, output_format,
+              plot_text] for db_tag, p, output_dir in find_rlmtp_specimens(output_root)]
+    print('Processing {0} RLMTP specimens with {1} job(s), logs in {2}'.format(len(tasks), jobs, log_dir))
+    results = []
 
+    def report(result):
+        results.append(result)
+        if instrument:
+            write_records(result[5], instrument_file)
+        status = 'FAILED ({0})'.format(result[2]) if result[2] is not None else 'done'
+        print('\t [{0}/{1}] {2} {3} in {4:0.1f} s'.format(len(results), len(tasks), result[3], status, result[4]))
+
+    if jobs > 1:
+        # The workers render their own figures, they must not inherit the background pool
+        with rlmtp.plot_pool.plotting_pool(None), ProcessPoolExecutor(max_workers=jobs) as executor:
+            futures = [executor.submit(process_specimen, t) for t in tasks]
+            for future in as_completed(futures):
+                report(future.result())
+    else:
+        for t in tasks:
+            report(process_specimen(t))
+    # Keep the order of the database in the map
+    order = {t[0]: k for k, t in enumerate(tasks)}
+    results.sort(key=lambda r: order[r[0]])
+    db_tag_to_clean_file = dict((r[0], r[1]) for r in results if r[2] is None)
+    failures = [r for r in results if r[2] is not None]
+    if instrument:
+        print_summary([record for r in results for record in r[5]])
+    return [db_tag_to_clean_file, failures]
+
+
+def is_valid_data(file):
+    """ Returns True file contain stress-strain data, False otherwise. """
+    data = pd.read_csv(file, nrows=5)
+    if 'e_true' and 'Sigma_true' in data.columns:
+        return True
+    else:
+        return False
+
+
+def copy_nonrlmtp_data(output_root):
+    """ Copies the non-RLMTP data to the output directory and plots it.
+
+    :param str output_root: Directory to place the processed data.
+    :return dict: Map from the DB tag to the copied data file.
+    """
+    db_tag_to_clean_file = dict()
     for campaign in campaign_dirs_nonrlmtp:
         print('Processing {0}'.format(campaign))
         cdir = os.path.normpath(os.path.join(input_root, campaign))
@@ -90,11 +195,66 @@ def gen_clean_data(output_root='./Clean_Data', should_downsample=True):
                             # Do copy and do plot
                             copy2(data_file, output_dir)
                             data = pd.read_csv(data_file)
-                            rlmtp.stress_strain_plotter(data, output_dir, f[:-4])
+                            rlmtp.plot_pool.submit_plot(rlmtp.stress_strain_plotter, data, output_dir, f[:-4])
                         # Add the DB tag to the map
                         p = os.path.join(cdir, lp, s)
                         db_tag_to_clean_file[get_db_tag(p)] = os.path.join(output_dir, f)
                         break
+    return db_tag_to_clean_file
+
+
+def gen_clean_data(output_root='./Clean_Data', should_downsample=True, jobs=1, log_dir=None, rebuild=False,
+                   dry_run=False, instrument_file=None, trace_memory=False, output_format='csv', store_dir=None,
+                   plot_jobs=1, plot_text='mathtext'):
+    """ Generates, sorts, and extracts all the cleaned stress-strain data from the database.
+    :param str output_root: Directory to place the processed data.
+    :param bool should_downsample: If True, then downsample data, else do not.
+    :param int jobs: Number of worker processes for the RLMTP specimens.
+    :param str log_dir: Directory for the log of each RLMTP specimen, if None then output_root/logs.
+    :param bool rebuild: If True, then all the RLMTP specimens are processed, else only the out-of-date ones.
+    :param bool dry_run: If True, then only list the RLMTP specimens that would be processed.
+    :param str instrument_file: If not None, the time and memory of each stage of the RLMTP specimens are appended to
+        this file as JSON lines, see rlmtp.instrumentation.
+    :param bool trace_memory: If True, then the peak traced memory of each stage is also recorded.
+    :param str output_format: Format of the processed data files of the RLMTP specimens: 'csv', 'parquet', 'feather',
+        or 'npz'. The non-RLMTP data is always copied as .csv files.
+    :param str store_dir: If not None, then the curves of all the specimens in the DB tag map are also written to a
+        single store in this directory, see rlmtp.curve_store.
+    :param int plot_jobs: Number of background processes that render the figures, see rlmtp.plot_pool. If 0, then the
+        figures are rendered when each specimen is processed.
+    :param str plot_text: Text rendering of the figures: 'mathtext' (fast) or 'latex' (publication quality).
+    :return list: Results of the RLMTP specimens that failed, see process_specimen.
+
+    - The specimens that fail are listed at the end and are not included in the DB tag map.
+    - The RLMTP specimens are processed again if their inputs, the processing parameters, or the version of rlmtp
+    changed since their output was generated, see rlmtp.manifest.
+    - With jobs > 1 the figures of the RLMTP specimens are rendered by the worker processes, the background processes
+    are only used for the other figures.
+    """
+    if dry_run:
+        stale = find_stale_specimens(output_root, should_downsample=should_downsample, output_format=output_format)
+        print('{0} RLMTP specimen(s) would be processed:'.format(len(stale)))
+        for db_tag, p, reason in stale:
+            print('\t {0} ({1}): {2}'.format(p, db_tag, reason))
+        return []
+
+    # The figures are rendered in the background while the data is processed
+    rlmtp.set_text_mode(plot_text)
+    pool = rlmtp.plot_pool.PlotPool(jobs=plot_jobs, text_mode=plot_text) if plot_jobs > 0 else None
+    try:
+        with rlmtp.plot_pool.plotting_pool(pool):
+            # Process the RLMTP data
+            db_tag_to_clean_file, failures = process_rlmtp_specimens(output_root, should_downsample=should_downsample,
+                                                                     jobs=jobs, log_dir=log_dir, rebuild=rebuild,
+                                                                     instrument_file=instrument_file,
+                                                                     trace_memory=trace_memory,
+                                                                     output_format=output_format, plot_text=plot_text)
+            # Process the non-RLMTP data
+            db_tag_to_clean_file.update(copy_nonrlmtp_data(output_root))
+    finally:
+        if pool is not None:
+            print('Waiting for the figures...')
+            pool.close()
 
     # Write the DB tag to output file map
     tag_to_outdir_file = os.path.join(output_root, 'db_tag_clean_data_map.csv')
@@ -102,6 +262,43 @@ def gen_clean_data(output_root='./Clean_Data', should_downsample=True):
         for tag, dir_path in db_tag_to_clean_file.items():
             f.write('{0},{1}\n'.format(tag, dir_path))
 
+    if store_dir is not None:
+        rlmtp.build_curve_store(db_tag_to_clean_file, store_dir)
+
+    if len(failures) > 0:
+        print('{0} specimen(s) failed, see the logs:'.format(len(failures)))
+        for db_tag, _, error, log_file in [r[:4] for r in failures]:
+            print('\t {0} ({1}): {2}'.format(log_file, db_tag, error))
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Generate the cleaned stress-strain data of the database.')
+    parser.add_argument('--output-root', default='./Clean_Data', help='Directory to place the processed data.')
+    parser.add_argument('--no-downsample', action='store_true', help='Do not downsample the data.')
+    parser.add_argument('--jobs', type=int, default=os.cpu_count(), help='Number of worker processes.')
+    parser.add_argument('--log-dir', default=None, help='Directory for the specimen logs (default: output/logs).')
+    parser.add_argument('--rebuild', action='store_true', help='Process all the specimens, even if up-to-date.')
+    parser.add_argument('--dry-run', action='store_true', help='List the specimens that would be processed.')
+    parser.add_argument('--instrument', default=None, metavar='FILE',
+                        help='Append the time and memory of each stage to FILE as JSON lines.')
+    parser.add_argument('--trace-memory', action='store_true', help='Also record the traced memory (slower).')
+    parser.add_argument('--format', default='csv', choices=list(rlmtp.processed_data.OUTPUT_FORMATS),
+                        help='Format of the processed data files.')
+    parser.add_argument('--plot-jobs', type=int, default=1,
+                        help='Number of background processes for the figures, 0 to render them in turn.')
+    parser.add_argument('--plot-text', default='mathtext', choices=list(rlmtp.mpl_import.TEXT_MODES),
+                        help='Text rendering of the figures, latex is slower but for publication.')
+    parser.add_argument('--store', default=None, metavar='DIR',
+                        help='Also write all the curves to a single store in DIR, see rlmtp.curve_store.')
+    args = parser.parse_args(argv)
+    failures = gen_clean_data(output_root=args.output_root, should_downsample=not args.no_downsample,
+                              jobs=args.jobs, log_dir=args.log_dir, rebuild=args.rebuild, dry_run=args.dry_run,
+                              instrument_file=args.instrument, trace_memory=args.trace_memory,
+                              output_format=args.format, store_dir=args.store, plot_jobs=args.plot_jobs,
+                              plot_text=args.plot_text)
+    return 1 if failures else 0
+
 
 if __name__ == "__main__":
-    gen_clean_data()
+    sys.exit(main())
@@ -6,8 +6,11 @@ from campaign_directories import campaign_dirs_nonrlmtp, campaign_dirs_rlmtp, in
 from campaign_reference_map import campaign_reference_map
 
 
-def gen_chem_comp():
-
+def gen_chem_comp(db_summary=None):
+    """ Generates the table of the chemical compositions of each campaign.
+    :param pd.DataFrame db_summary: Database summary, if None then it is read from the summary file.
+    :return pd.DataFrame: The table, as read from the output file.
+    """
     date = datetime.today().strftime('%Y-%m-%d')
 
     # Load all the chemical compositions
@@ -30,7 +33,9 @@ def gen_chem_comp():
     df['Source'] = None
 
     # Load DB summary
-    db_summary = pd.read_csv('Database_Summaries/Summarized_Material_DB_' + date + '.csv')
+    if db_summary is None:
+        # Same index as the summary from gen_db_summary, the DB tags (equal to the row numbers, so .loc is unchanged)
+        db_summary = pd.read_csv('Database_Summaries/Summarized_Material_DB_' + date + '.csv', index_col=0)
     # Load tag map
     db_tag_map = pd.read_csv('Clean_Data/db_tag_clean_data_map.csv', names=['tag', 'path'])
     db_tag_map['path'] = db_tag_map['path'].apply(os.path.normpath)
@@ -59,3 +64,4 @@ def gen_chem_comp():
     df = df.replace('-', np.nan)
     csv_output = 'Database_Summaries/Summarized_Chemical_Composition_' + date + '.csv'
     df.to_csv(csv_output)
+    return df.reset_index()
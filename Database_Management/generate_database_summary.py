@@ -3,10 +3,16 @@ from datetime import datetime
 
 
 def gen_db_summary():
+    """ Generates the summary of the specimen descriptions.
+    :return pd.DataFrame: The summary, with the same index and types as when read from the output file.
+    """
     date = datetime.today().strftime('%Y-%m-%d')
     database_dir = './RESSLab_Material_DB'
     csv_output = 'Database_Summaries/Summarized_Material_DB_' + date + '.csv'
-    rlmtp.write_description_database_csv(database_dir, csv_output)
+    summary = rlmtp.write_description_database_csv(database_dir, csv_output)
+    # The DB tags are the index
+    summary.index = summary.index.astype('int64')
+    return summary.infer_objects()
 
 
 if __name__ == "__main__":
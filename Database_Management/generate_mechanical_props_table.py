@@ -8,7 +8,13 @@ from datetime import datetime
 from campaign_reference_map import campaign_reference_map
 
 
-def gen_mech_props_tab(processed_data_root='Unreduced_Data'):
+def gen_mech_props_tab(processed_data_root='Unreduced_Data', summary=None, yield_props=None):
+    """ Generates the tables of the mechanical properties for each specimen and each campaign.
+    :param str processed_data_root: Directory containing the processed stress-strain data.
+    :param pd.DataFrame summary: Database summary, if None then it is read from the summary file.
+    :param pd.DataFrame yield_props: Measured yield properties, if None then they are read from the yield stress file.
+    :return pd.DataFrame: The individual specimen table.
+    """
     # User inputs
     date = datetime.today().strftime('%Y-%m-%d')
     summary_table = 'Database_Summaries/Summarized_Material_DB_' + date + '.csv'
@@ -17,7 +23,10 @@ def gen_mech_props_tab(processed_data_root='Unreduced_Data'):
 
     # Automatic processing below --------------------------------------------------
     # Set-up the dataframe
-    df = pd.read_csv(summary_table, index_col=[0])
+    if summary is None:
+        df = pd.read_csv(summary_table, index_col=[0])
+    else:
+        df = summary.copy()
     # df = df.loc[:, columns]
     fy_col = 'Yield Stress [MPa]'
     em_col = 'Elastic Modulus [MPa]'
@@ -26,7 +35,10 @@ def gen_mech_props_tab(processed_data_root='Unreduced_Data'):
     df[em_col] = np.nan
 
     # Load and transfer the yield properties
-    yield_props = pd.read_csv(yield_props_table)
+    if yield_props is None:
+        yield_props = pd.read_csv(yield_props_table)
+    else:
+        yield_props = yield_props.copy()
     ind_to_fpath = pd.read_csv(db_tag_map, names=['ind', 'data_file'])
     # Normalize the paths
     yield_props['data_file'] = yield_props['data_file'].apply(os.path.normpath)
@@ -67,6 +79,7 @@ def gen_mech_props_tab(processed_data_root='Unreduced_Data'):
     df_campaign = df_campaign.sort_values(by=['Grade', 'Spec.', 'Source'])
     df_campaign = df_campaign.groupby([ref_col, 'Grade', 'Spec.', 'Source']).agg(['size', 'count', 'mean', coefvar])
     df_campaign.to_csv('Database_Summaries/Summarized_Mechanical_Props_Campaign_' + date + '.csv')
+    return df_individual
 
 
 def construct_reference_map(root_dir, ind_to_fpath):
@@ -3,9 +3,10 @@ This file generates strain rate plots for a sample of the tests.
 
 Run this file from the command line:
 >>> python generate_strain_rate_plots.py
+
+The curves are read from the curve store of the input root if it has been built, see rlmtp.curve_store.
 """
 import os
-import pandas as pd
 import rlmtp
 
 # Use the data that has already been filtered/reduced
@@ -18,12 +19,18 @@ data_dirs = [
 output_root = 'Clean_Data/strain_rates'
 
 # Data processing -------------------------------------------------------------
+store = rlmtp.curve_store.open_default_store(input_root)
 for d in data_dirs:
-    files = os.listdir(os.path.join(input_root, d))
-    csv_files = [os.path.join(input_root, d, fi) for fi in files if fi[-3:] == 'csv']
-    for data_file in csv_files:
-        data = pd.read_csv(data_file)
-        output_dir = os.path.join(output_root, d)
-        rlmtp.dir_maker(output_dir)
+    output_dir = os.path.join(output_root, d)
+    rlmtp.dir_maker(output_dir)
+    if store is not None:
+        # Views of the curves in the store, the files are not read
+        campaign_dir = os.path.normpath(os.path.join(input_root, d))
+        curves = ((store.sources[tag], store.curve(tag)) for tag in store.tags
+                  if os.path.dirname(os.path.normpath(store.sources[tag])) == campaign_dir)
+    else:
+        curves = ((f, rlmtp.processed_data.read_processed_data(f))
+                  for f in rlmtp.processed_data.find_data_files(os.path.join(input_root, d)))
+    for data_file, data in curves:
         test_name = '_'.join(os.path.basename(data_file).split('_')[:3])
         rlmtp.strain_rate_plotter(data, output_dir, test_name)
@@ -7,56 +7,108 @@ Run this file from the command line:
 Notes:
     - All the processed data needs to be generated first.
     - By default this uses the unreduced data to have more datapoints in the yield plateau.
+    - The curves are read from the curve store if it has been built (python -m rlmtp.curve_store build
+        ./Unreduced_Data), which avoids parsing all the processed data files.
     - The link between the database entry and the file can be found through the
         'db_tag_clean_data_map.csv' file.
 """
 import os
+from concurrent.futures import ProcessPoolExecutor
 import pandas as pd
 import numpy as np
 import rlmtp
 from campaign_directories import campaign_dirs_rlmtp, campaign_dirs_nonrlmtp
 
 
-def gen_yield_props(processed_data_root='Unreduced_Data'):
+def gen_yield_props(processed_data_root='Unreduced_Data', use_store=True, jobs=1):
     """ Generates the measured yield stress and elastic modulus for all tests.
     :param str processed_data_root: Directory containing the processed stress-strain data.
+    :param bool use_store: If True, then the curves are read from the curve store of processed_data_root if it has
+        been built, see rlmtp.curve_store. Else, or if there is no store, the processed data files are read.
+    :param int jobs: Number of worker processes when the curves are read from the store.
+    :return pd.DataFrame: The measured properties, as written to the output file.
+
+    - The store only contains the specimens in the DB tag map, the files are read from the campaign directories.
     """
-    # Specify the directories with the stress-strain data
-    data_dirs = campaign_dirs_rlmtp + campaign_dirs_nonrlmtp
     # Set the output directory
     output_root = os.path.join(processed_data_root, 'yield_stress')
     rlmtp.dir_maker(output_root)
 
     # Data processing -------------------------------------------------------------
-    yield_data = []
-    for d in data_dirs:
-        files = os.listdir(os.path.join(processed_data_root, d))
-        csv_files = [os.path.join(processed_data_root, d, fi) for fi in files if fi[-3:] == 'csv']
-        for data_file in csv_files:
-            data = pd.read_csv(data_file)
-            try:
-                fyn = get_nominal_fy(data_file)
-                yield_props = rlmtp.yield_properties(data, f_yn=fyn)
-            except IndexError:
-                try:
-                    # Poor data in elastic region, extend the range
-                    # Boost the yield stress so that a*f_yn = f_yn, a is fixed as 0.66
-                    fyn = fyn / 0.66
-                    yield_props = rlmtp.yield_properties(data, f_yn=fyn)
-                except IndexError:
-                    # Insufficient data in elastic region
-                    yield_props = [np.nan, np.nan]
-            # If the elastic data is "bad quality" then the elastic modulus may be low
-            # In this case we want to reject the fitting
-            e_mod_min_acceptable, e_mod_max_acceptable = get_acceptable_e_range(data_file)
-            if not (e_mod_min_acceptable <= yield_props[0] <= e_mod_max_acceptable):
-                # Reject the found properties
-                yield_props = [np.nan, np.nan]
-            yield_data.append([data_file, yield_props[0], yield_props[1]])
+    store = rlmtp.curve_store.open_default_store(processed_data_root) if use_store else None
+    if store is not None:
+        print('Reading the curves from {0}'.format(store.store_dir))
+        yield_data = store_yield_props(store, jobs=jobs)
+    else:
+        # Specify the directories with the stress-strain data
+        data_dirs = campaign_dirs_rlmtp + campaign_dirs_nonrlmtp
+        yield_data = []
+        for d in data_dirs:
+            # The processed data can be in any of the output formats
+            data_files = rlmtp.processed_data.find_data_files(os.path.join(processed_data_root, d))
+            for data_file in data_files:
+                data = rlmtp.processed_data.read_processed_data(data_file, has_index=d in campaign_dirs_rlmtp)
+                yield_data.append(compute_yield_props(data, data_file))
 
     # Store in a dataframe and save
     df = pd.DataFrame(yield_data, columns=['data_file', 'E_m', 'fy_m'])
     df.to_csv(os.path.join(output_root, 'yield_stress_data.csv'), index=False)
+    return df
+
+
+def compute_yield_props(data, data_file):
+    """ Returns [data_file, E_m, fy_m] for the stress-strain data, NaN values if the fitting is rejected.
+
+    :param data: (pd.DataFrame or dict) Contains the 'e_true' and 'Sigma_true' columns.
+    :param str data_file: Processed data file, used to find the nominal yield stress and acceptable modulus.
+    """
+    try:
+        fyn = get_nominal_fy(data_file)
+        yield_props = rlmtp.yield_properties(data, f_yn=fyn)
+    except IndexError:
+        try:
+            # Poor data in elastic region, extend the range
+            # Boost the yield stress so that a*f_yn = f_yn, a is fixed as 0.66
+            fyn = fyn / 0.66
+            yield_props = rlmtp.yield_properties(data, f_yn=fyn)
+        except IndexError:
+            # Insufficient data in elastic region
+            yield_props = [np.nan, np.nan]
+    # If the elastic data is "bad quality" then the elastic modulus may be low
+    # In this case we want to reject the fitting
+    e_mod_min_acceptable, e_mod_max_acceptable = get_acceptable_e_range(data_file)
+    if not (e_mod_min_acceptable <= yield_props[0] <= e_mod_max_acceptable):
+        # Reject the found properties
+        yield_props = [np.nan, np.nan]
+    return [data_file, yield_props[0], yield_props[1]]
+
+
+# Store opened by each worker process
+_worker_store = None
+
+
+def _open_worker_store(store_dir):
+    global _worker_store
+    _worker_store = rlmtp.CurveStore(store_dir)
+
+
+def _store_yield_props(db_tag):
+    curve = _worker_store.curve(db_tag, columns=['e_true', 'Sigma_true'])
+    return compute_yield_props(curve, _worker_store.sources[db_tag])
+
+
+def store_yield_props(store, jobs=1):
+    """ Returns [data_file, E_m, fy_m] for all the specimens in the CurveStore, in the order of the store.
+
+    - The curves are views of the store, nothing is parsed or copied. With jobs > 1 each worker maps the same files,
+    so the pages are shared between the processes.
+    """
+    if jobs > 1:
+        with ProcessPoolExecutor(max_workers=jobs, initializer=_open_worker_store,
+                                 initargs=(store.store_dir,)) as executor:
+            return list(executor.map(_store_yield_props, store.tags, chunksize=8))
+    return [compute_yield_props(store.curve(tag, columns=['e_true', 'Sigma_true']), store.sources[tag])
+            for tag in store.tags]
 
 
 def get_acceptable_e_range(fpath):
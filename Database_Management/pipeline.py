@@ -0,0 +1,273 @@
+"""
+Declarative runner for the stages that update the material database.
+
+Each stage declares the stages it depends on, the files and directories it reads, the files it writes, and the
+DataFrames it passes to the later stages. The runner:
+    - Skips the stages that are up-to-date. A stage is up-to-date if all its outputs exist and the fingerprint of its
+    inputs is the same as when it last ran. Since the outputs of a stage are the inputs of the next, an unchanged
+    output also skips the stages that depend on it.
+    - Runs the stages that do not depend on each other concurrently (threads), except the stages in the same
+    exclusive group.
+    - Passes the DataFrames between the stages in memory. If the stage that creates a DataFrame is skipped, then the
+    DataFrame is loaded from its file once and shared by all the stages that use it.
+
+The fingerprints are stored in a json state file.
+"""
+import os
+import json
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from rlmtp.data_cache import file_digest
+
+# Files and directories that do not change the inputs of a stage, e.g., written by the stages themselves
+IGNORED_NAMES = {'db_tag.txt', '.rlmtp_cache', 'logs', 'yield_stress', 'curve_store', '.plot_cache', '__pycache__'}
+IGNORED_EXTENSIONS = {'.log', '.pdf', '.json'}
+
+
+class StageIncomplete(Exception):
+    """ Raised by a stage that ran, but with an incomplete output (e.g., some specimens failed).
+
+    - The stage is not recorded as up-to-date, so it runs again the next time. The stages that depend on it still run.
+    """
+    pass
+
+
+class Stage:
+    """ Step of the processing.
+
+    Notes:
+    ======
+        - func is called with the DataFrames in uses as keyword arguments, i.e., func(**{arg: artifact}).
+        - If provides is not None, then the DataFrame returned by func is stored as the artifact provides.
+        - inputs and outputs are paths, the directories in inputs are fingerprinted from the size and modification
+        time of their files.
+        - The stages with the same exclusive group never run at the same time, e.g., because they use process-global
+        state or all the CPUs.
+    """
+    __slots__ = ('name', 'func', 'deps', 'inputs', 'outputs', 'uses', 'provides', 'exclusive')
+
+    def __init__(self, name, func, deps=(), inputs=(), outputs=(), uses=None, provides=None, exclusive=None):
+        """ Constructor.
+
+        :param str name: Name of the stage.
+        :param callable func: Function that runs the stage.
+        :param list deps: (str) Names of the stages that must run before this one.
+        :param list inputs: (str) Paths of the files and directories read by the stage.
+        :param list outputs: (str) Paths of the files written by the stage.
+        :param dict uses: {argument name: artifact name} DataFrames passed to func.
+        :param str provides: Name of the artifact returned by func.
+        :param str exclusive: Name of the group of stages that do not run at the same time, None if not in a group.
+        """
+        self.name = name
+        self.func = func
+        self.deps = list(deps)
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.uses = dict() if uses is None else dict(uses)
+        self.provides = provides
+        self.exclusive = exclusive
+
+
+class Pipeline:
+    """ Runs the stages in the order of their dependencies, see the module documentation. """
+    __slots__ = ('stages', 'loaders', 'state_file', 'artifacts', '_lock')
+
+    def __init__(self, stages, loaders=None, state_file='.pipeline_state.json'):
+        """ Constructor.
+
+        :param list stages: (Stage) All the stages.
+        :param dict loaders: {artifact name: callable} Functions that load the artifacts from their files.
+        :param str state_file: Path to the file with the fingerprints of the stages.
+        """
+        self.stages = dict((s.name, s) for s in stages)
+        for s in stages:
+            unknown = [d for d in s.deps if d not in self.stages]
+            if len(unknown) > 0:
+                raise ValueError('Stage "{0}" depends on unknown stages {1}.'.format(s.name, unknown))
+        self.loaders = dict() if loaders is None else dict(loaders)
+        self.state_file = state_file
+        self.artifacts = dict()
+        self._lock = threading.Lock()
+
+    def order(self, targets=None):
+        """ Returns the names of the stages required for the targets, dependencies first.
+
+        :param list targets: (str) Names of the stages to run, if None then all the stages.
+        :return list: (str) Stage names.
+        """
+        if targets is None:
+            targets = list(self.stages)
+        order = []
+        visiting = set()
+
+        def visit(name):
+            if name in order:
+                return
+            if name not in self.stages:
+                raise ValueError('Unknown stage "{0}", the stages are {1}.'.format(name, list(self.stages)))
+            if name in visiting:
+                raise ValueError('Cyclic dependency on stage "{0}".'.format(name))
+            visiting.add(name)
+            for d in self.stages[name].deps:
+                visit(d)
+            visiting.remove(name)
+            order.append(name)
+
+        for t in targets:
+            visit(t)
+        return order
+
+    def fingerprint(self, name):
+        """ Returns the fingerprint of the inputs of the stage. """
+        h = hashlib.sha1()
+        for path in self.stages[name].inputs:
+            h.update('{0}|{1}\n'.format(path, path_fingerprint(path)).encode('utf-8'))
+        return h.hexdigest()
+
+    def stale_reason(self, name, state=None):
+        """ Returns why the stage needs to run, or None if it is up-to-date. """
+        if state is None:
+            state = self.read_state()
+        missing = [p for p in self.stages[name].outputs if not os.path.exists(p)]
+        if len(missing) > 0:
+            return 'missing {0}'.format(', '.join(missing))
+        if name not in state:
+            return 'never ran'
+        if state[name] != self.fingerprint(name):
+            return 'changed inputs'
+        return None
+
+    def read_state(self):
+        """ Returns {stage name: fingerprint} of the stages that ran. """
+        try:
+            with open(self.state_file, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return dict()
+
+    def _record(self, name, fingerprint):
+        """ Stores the fingerprint of the stage that ran, or removes it if fingerprint is None. """
+        with self._lock:
+            state = self.read_state()
+            if fingerprint is None:
+                state.pop(name, None)
+            else:
+                state[name] = fingerprint
+            with open(self.state_file, 'w') as f:
+                json.dump(state, f, indent=2, sort_keys=True)
+
+    def artifact(self, name):
+        """ Returns the artifact from memory, or loads it with its loader. """
+        with self._lock:
+            if name not in self.artifacts:
+                if name not in self.loaders:
+                    raise KeyError('No stage provided "{0}" and there is no loader for it.'.format(name))
+                self.artifacts[name] = self.loaders[name]()
+            return self.artifacts[name]
+
+    def _run_stage(self, name, force):
+        """ Runs the stage if it is out-of-date, returns [name, status]. """
+        stage = self.stages[name]
+        reason = 'forced' if force else self.stale_reason(name)
+        if reason is None:
+            return [name, 'up-to-date']
+        print('Running stage "{0}" ({1})'.format(name, reason))
+        # The fingerprint is taken before the stage runs so that changes during the run are not missed
+        fingerprint = self.fingerprint(name)
+        kwargs = dict((arg, self.artifact(a)) for arg, a in stage.uses.items())
+        try:
+            result = stage.func(**kwargs)
+        except StageIncomplete as e:
+            print('Stage "{0}" is incomplete, it will run again: {1}'.format(name, e))
+            self._record(name, None)
+            return [name, 'incomplete: {0}'.format(e)]
+        if stage.provides is not None and result is not None:
+            with self._lock:
+                self.artifacts[stage.provides] = result
+        self._record(name, fingerprint)
+        return [name, 'ran']
+
+    def run(self, targets=None, jobs=1, force=False, dry_run=False):
+        """ Runs the out-of-date stages required for the targets.
+
+        :param list targets: (str) Names of the stages to run, if None then all the stages.
+        :param int jobs: Maximum number of stages that run at the same time.
+        :param bool force: If True, then all the stages run even if they are up-to-date.
+        :param bool dry_run: If True, then only print the stages that would run.
+        :return list: [stage name, status] for each stage, the status is 'ran', 'up-to-date', 'incomplete: [reason]',
+            'failed: [error]', 'skipped', or 'would run: [reason]' for a dry run.
+
+        - The stages in the same exclusive group run one at a time, see Stage.
+        - A stage that fails does not stop the stages that do not depend on it, the stages that depend on it are
+        skipped.
+        - The stages that depend on an incomplete stage run, see StageIncomplete.
+        - In a dry run, the stages that depend on a stage that would run are also listed, since their inputs may
+        change.
+        """
+        order = self.order(targets)
+        if dry_run:
+            return self._dry_run(order, force)
+        statuses = dict()
+        pending = list(order)
+        running = dict()
+        busy_groups = set()
+        with ThreadPoolExecutor(max_workers=max(jobs, 1)) as executor:
+            while pending or running:
+                for name in list(pending):
+                    dep_status = [statuses.get(d) for d in self.stages[name].deps]
+                    if any(s is not None and s != 'ran' and s != 'up-to-date' and not s.startswith('incomplete')
+                           for s in dep_status):
+                        statuses[name] = 'skipped'
+                        pending.remove(name)
+                    elif all(s is not None for s in dep_status) and self.stages[name].exclusive not in busy_groups:
+                        running[executor.submit(self._run_stage, name, force)] = name
+                        pending.remove(name)
+                        if self.stages[name].exclusive is not None:
+                            busy_groups.add(self.stages[name].exclusive)
+                if len(running) == 0:
+                    continue
+                finished, _ = wait(list(running), return_when=FIRST_COMPLETED)
+                for future in finished:
+                    name = running.pop(future)
+                    busy_groups.discard(self.stages[name].exclusive)
+                    try:
+                        statuses[name] = future.result()[1]
+                    except Exception as e:
+                        statuses[name] = 'failed: {0}: {1}'.format(type(e).__name__, e)
+                        print('Stage "{0}" failed, the stages that depend on it are skipped.'.format(name))
+        return [[name, statuses[name]] for name in order]
+
+    def _dry_run(self, order, force):
+        state = self.read_state()
+        statuses = dict()
+        for name in order:
+            reason = 'forced' if force else self.stale_reason(name, state)
+            if reason is None:
+                upstream = [d for d in self.stages[name].deps if statuses[d] != 'up-to-date']
+                if len(upstream) > 0:
+                    reason = 'depends on {0}'.format(', '.join(upstream))
+            statuses[name] = 'up-to-date' if reason is None else 'would run: {0}'.format(reason)
+        return [[name, statuses[name]] for name in order]
+
+
+def path_fingerprint(path):
+    """ Returns a fingerprint of the file or directory at path.
+
+    - Files are identified by their contents. Directories are identified by the relative path, size, and modification
+    time of all their files, except the ones in IGNORED_NAMES and IGNORED_EXTENSIONS.
+    """
+    if os.path.isfile(path):
+        return file_digest(path)
+    if not os.path.isdir(path):
+        return 'missing'
+    h = hashlib.sha1()
+    for root, dirs, files in os.walk(path):
+        dirs[:] = sorted(d for d in dirs if d not in IGNORED_NAMES)
+        for f in sorted(files):
+            if f in IGNORED_NAMES or os.path.splitext(f)[1] in IGNORED_EXTENSIONS:
+                continue
+            file = os.path.join(root, f)
+            st = os.stat(file)
+            h.update('{0}|{1}|{2}\n'.format(os.path.relpath(file, path), st.st_size, st.st_mtime_ns).encode('utf-8'))
+    return h.hexdigest()
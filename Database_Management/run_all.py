@@ -2,8 +2,21 @@
 Runs all the processing files for the material database.
 
 This file executes step "Update the database" in the "instructions.md" file.
+
+Run this file from the command line:
+>>> python run_all.py --jobs 4 --stage-jobs 2
+Only the stages that are out-of-date are run, see pipeline.py. To run specific stages (and the stages they depend on),
+or to only list the stages that would run:
+>>> python run_all.py yield_props mech_props --dry-run
 """
 import os
+import sys
+import argparse
+from datetime import datetime
+import pandas as pd
+import rlmtp
+from pipeline import Stage, Pipeline, StageIncomplete
+from campaign_directories import input_root
 from generate_database_summary import gen_db_summary
 from generate_all_clean_data import gen_clean_data
 from generate_yield_properties import gen_yield_props
@@ -14,21 +27,106 @@ from combine_all_summaries import combine_all_summaries
 # Directory where summaries will be created
 output_dir = 'Database_Summaries'
 backup_dir = 'Old'
-# Move old summaries to the backup directory (csv files)
-dir_csv_contents = [f for f in os.listdir(output_dir) if os.path.splitext(f)[1] == '.csv']
-for f in dir_csv_contents:
-    os.replace(os.path.join(output_dir, f), os.path.join(output_dir, backup_dir, f))
-
-# Do the processing and generate new summaries
-gen_db_summary()
-# The downsampled data
-# gen_clean_data()
-# The raw data
-# gen_clean_data(output_root='./Unreduced_Data', should_downsample=False)
-# The yield stress and elastic modulus
-gen_yield_props(processed_data_root='Clean_Data')
-gen_mech_props_tab(processed_data_root='Clean_Data')
-# The chemical composition table
-gen_chem_comp()
-# Combine all the different summaries into one file
-combine_all_summaries()
+# Stages that run by default, the unreduced data is only generated on request
+DEFAULT_TARGETS = ['summary', 'clean_data', 'yield_props', 'mech_props', 'chem_comp', 'combine']
+# Exclusive group of the stages with worker processes, gen_clean_data also sets the process-global plot pool and text
+# mode, so these stages run one at a time and each can use all the workers
+WORKER_STAGES = 'workers'
+
+
+def backup_old_summaries(date):
+    """ Moves the summaries (csv files) that are not from date to the backup directory. """
+    dir_csv_contents = [f for f in os.listdir(output_dir) if os.path.splitext(f)[1] == '.csv']
+    for f in dir_csv_contents:
+        if not f.endswith(date + '.csv'):
+            os.replace(os.path.join(output_dir, f), os.path.join(output_dir, backup_dir, f))
+
+
+def build_pipeline(date, jobs=1):
+    """ Returns the Pipeline of the database processing for the summaries of date.
+
+    :param str date: Date in the summary file names (YYYY-MM-DD).
+    :param int jobs: Number of worker processes of the clean data, unreduced data, and yield properties stages.
+    :return Pipeline: The stages and loaders of the summaries.
+    """
+    def summary_file(name):
+        return os.path.join(output_dir, name + '_' + date + '.csv')
+
+    main_file = summary_file('Summarized_Material_DB')
+    mech_file = summary_file('Summarized_Mechanical_Props_Individual')
+    chem_file = summary_file('Summarized_Chemical_Composition')
+    yield_file = os.path.join('Clean_Data', 'yield_stress', 'yield_stress_data.csv')
+
+    def clean_data():
+        # The failed specimens are listed by gen_clean_data, the stage runs again until they are all processed
+        # The curves are also packed in a store for the yield properties, see rlmtp.curve_store
+        failures = gen_clean_data(jobs=jobs, store_dir=rlmtp.curve_store.default_store_dir('./Clean_Data'))
+        if len(failures) > 0:
+            raise StageIncomplete('{0} specimen(s) failed'.format(len(failures)))
+
+    def unreduced_data():
+        failures = gen_clean_data(output_root='./Unreduced_Data', should_downsample=False, jobs=jobs,
+                                  store_dir=rlmtp.curve_store.default_store_dir('./Unreduced_Data'))
+        if len(failures) > 0:
+            raise StageIncomplete('{0} specimen(s) failed'.format(len(failures)))
+
+    stages = [
+        Stage('summary', gen_db_summary, inputs=[input_root], outputs=[main_file], provides='summary'),
+        # The downsampled data
+        Stage('clean_data', clean_data, deps=['summary'], inputs=[input_root],
+              outputs=['Clean_Data/db_tag_clean_data_map.csv'], exclusive=WORKER_STAGES),
+        # The raw data
+        Stage('unreduced_data', unreduced_data, deps=['summary'], inputs=[input_root],
+              outputs=['Unreduced_Data/db_tag_clean_data_map.csv'], exclusive=WORKER_STAGES),
+        # The yield stress and elastic modulus
+        Stage('yield_props', lambda: gen_yield_props(processed_data_root='Clean_Data', jobs=jobs),
+              deps=['clean_data'], inputs=['Clean_Data'], outputs=[yield_file], provides='yield_props',
+              exclusive=WORKER_STAGES),
+        Stage('mech_props', lambda **kw: gen_mech_props_tab(processed_data_root='Clean_Data', **kw),
+              deps=['summary', 'yield_props'], inputs=[main_file, yield_file, 'Clean_Data/db_tag_clean_data_map.csv'],
+              outputs=[mech_file], uses={'summary': 'summary', 'yield_props': 'yield_props'}, provides='mech_props'),
+        # The chemical composition table
+        Stage('chem_comp', gen_chem_comp, deps=['summary', 'clean_data'],
+              inputs=[input_root, main_file, 'Clean_Data/db_tag_clean_data_map.csv'], outputs=[chem_file],
+              uses={'db_summary': 'summary'}, provides='chem_comp'),
+        # Combine all the different summaries into one file
+        Stage('combine', combine_all_summaries, deps=['summary', 'mech_props', 'chem_comp'],
+              inputs=[main_file, mech_file, chem_file, 'Clean_Data/db_tag_clean_data_map.csv'],
+              outputs=[summary_file('Overall_Summary')],
+              uses={'main_summary': 'summary', 'mechanical_summary': 'mech_props', 'chemical_summary': 'chem_comp'})
+    ]
+    # Used if the stage that provides the DataFrame is up-to-date
+    loaders = {
+        'summary': lambda: pd.read_csv(main_file, index_col=0),
+        'yield_props': lambda: pd.read_csv(yield_file),
+        'mech_props': lambda: pd.read_csv(mech_file, index_col=0),
+        'chem_comp': lambda: pd.read_csv(chem_file)
+    }
+    return Pipeline(stages, loaders, state_file=os.path.join(output_dir, '.pipeline_state.json'))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Update the material database summaries.')
+    parser.add_argument('stages', nargs='*', default=DEFAULT_TARGETS,
+                        help='Stages to run, with the stages they depend on (default: all except unreduced_data).')
+    parser.add_argument('--jobs', type=int, default=os.cpu_count(),
+                        help='Number of worker processes for the clean data and the yield properties.')
+    parser.add_argument('--stage-jobs', type=int, default=2,
+                        help='Number of stages that run at the same time, the stages with workers run one at a time.')
+    parser.add_argument('--force', action='store_true', help='Run the stages even if they are up-to-date.')
+    parser.add_argument('--dry-run', action='store_true', help='List the stages that would run.')
+    args = parser.parse_args(argv)
+
+    date = datetime.today().strftime('%Y-%m-%d')
+    if not args.dry_run:
+        # Move old summaries to the backup directory
+        backup_old_summaries(date)
+    pipeline = build_pipeline(date, jobs=args.jobs)
+    results = pipeline.run(args.stages, jobs=args.stage_jobs, force=args.force, dry_run=args.dry_run)
+    for name, status in results:
+        print('{0}: {1}'.format(name, status))
+    return 1 if any(s.startswith('failed') or s.startswith('incomplete') for _, s in results) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
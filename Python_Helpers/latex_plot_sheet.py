@@ -4,6 +4,9 @@ import rlmtp
 root_dir = 'Clean_Data'
 output_dir = 'Python_helpers/All_Plots'
 rlmtp.dir_maker(output_dir)
+# If True, then all the stress-strain curves are plotted in one multi-page PDF instead of a LaTeX file that includes
+# the figure of each specimen. The curves are read from the curve store, the LaTeX file is made if it is not built
+batch = True
 
 
 def sort_split(s):
@@ -16,13 +19,42 @@ def sort_split(s):
         return s
 
 
-all_pdf_files = []
-for root, dirs, files in os.walk(root_dir, topdown=False):
-    print(root)
-    rel_dp = os.path.relpath(root, output_dir)
-    pdf_files = [f for f in files if os.path.splitext(f)[1] == '.pdf']
-    pdf_files.sort(key=sort_split)
-    all_pdf_files += [os.path.join(rel_dp, f) for f in pdf_files]
+def batch_curves():
+    """ Returns [title, data] of all the curves in the curve store of root_dir, or None if it has not been built. """
+    store = rlmtp.curve_store.open_default_store(root_dir)
+    if store is None:
+        return None
+    files = [[store.sources[tag], store.curve(tag, columns=['e_true', 'Sigma_true'])] for tag in store.tags]
+    curves = [[os.path.splitext(os.path.basename(f))[0].replace('_processed_data', ''), data] for f, data in files]
+    # The loading protocols are sorted by number, then the other specimens by name
+    curves.sort(key=lambda c: (0, sort_split(c[0]), c[0]) if isinstance(sort_split(c[0]), int) else (1, 0, c[0]))
+    return curves
 
-outpath = os.path.join(output_dir, 'latex_figures_file.tex')
-rlmtp.create_latex_photos.make_latex_doc(all_pdf_files, outpath)
+
+def latex_sheet():
+    """ Writes the LaTeX file that includes the figure of each specimen. """
+    all_pdf_files = []
+    for root, dirs, files in os.walk(root_dir, topdown=False):
+        print(root)
+        rel_dp = os.path.relpath(root, output_dir)
+        pdf_files = [f for f in files if os.path.splitext(f)[1] == '.pdf']
+        pdf_files.sort(key=sort_split)
+        all_pdf_files += [os.path.join(rel_dp, f) for f in pdf_files]
+
+    outpath = os.path.join(output_dir, 'latex_figures_file.tex')
+    rlmtp.create_latex_photos.make_latex_doc(all_pdf_files, outpath)
+
+
+# The batch PDF is only made from the curve store, reading all the processed data files would hold them all in memory
+curves = batch_curves() if batch else None
+if curves is not None:
+    outpath = os.path.join(output_dir, 'all_stress_strain_plots.pdf')
+    if rlmtp.batch_plotter(curves, outpath):
+        print('Plotted all the curves in {0}'.format(outpath))
+    else:
+        print('{0} is up-to-date'.format(outpath))
+else:
+    if batch:
+        print('No curve store in {0} (python -m rlmtp.curve_store build {0}), '
+              'making the LaTeX file of the figures instead.'.format(root_dir))
+    latex_sheet()
@@ -1,11 +1,50 @@
-from .readers import import_dion7_data, import_catman_data
+__version__ = '1.0.0'
+
+import importlib
+
+# The functions that share the name of their module are imported now, else importing the module (e.g., by another
+# module of rlmtp) would replace the function by the module in the package
 from .sync_temperature import sync_temperature
-from .sync_video import dion7_times_to_video_times, output_frames_at_times
-from .create_latex_photos import latex_photo_compiler
-from .processing import process_specimen_data, dir_maker
-from .construct_database import write_description_database_csv
-from .plotting import stress_strain_plotter, temp_time_plotter, temp_strain_plotter, strain_rate_plotter
-from .plotting import yield_properties_plotter
 from .yield_properties import yield_properties, compute_modulus
-from .fracture_strain import compute_fracture_strain, process_fracture_strains
-from .downsampler import rlmtp_downsampler, downsample_error
+
+# Public name: module that defines it, imported on first use so that "import rlmtp" does not import matplotlib, scipy,
+# or polyprox unless they are needed
+_LAZY_NAMES = {
+    'import_dion7_data': 'readers', 'import_catman_data': 'readers',
+    'dion7_times_to_video_times': 'sync_video', 'output_frames_at_times': 'sync_video',
+    'latex_photo_compiler': 'create_latex_photos',
+    'process_specimen_data': 'processing', 'dir_maker': 'processing',
+    'read_processed_data': 'processed_data', 'write_processed_data': 'processed_data',
+    'CurveStore': 'curve_store', 'build_curve_store': 'curve_store',
+    'write_description_database_csv': 'construct_database',
+    'stress_strain_plotter': 'plotting', 'temp_time_plotter': 'plotting', 'temp_strain_plotter': 'plotting',
+    'strain_rate_plotter': 'plotting', 'yield_properties_plotter': 'plotting', 'batch_plotter': 'plotting',
+    'set_text_mode': 'plotting', 'plot_style': 'plotting',
+    'compute_fracture_strain': 'fracture_strain', 'process_fracture_strains': 'fracture_strain',
+    'rlmtp_downsampler': 'downsampler', 'downsample_error': 'downsampler',
+    'minmax_decimate': 'decimation', 'display_indices': 'decimation',
+    'CycleIndex': 'find_peaks'
+}
+# Modules that can be used as attributes of the package, e.g., rlmtp.processed_data
+_SUBMODULES = (
+    'auto_filter_file', 'construct_database', 'create_latex_photos', 'curve_store', 'data_cache', 'decimation',
+    'downsampler', 'error_evaluator', 'filtering', 'find_peaks', 'fracture_strain', 'instrumentation', 'manifest',
+    'mpl_import', 'plot_pool', 'plotting', 'point_ranking', 'processed_data', 'processing', 'readers', 'streaming',
+    'sync_video', 'timed_data'
+)
+
+__all__ = ['sync_temperature', 'yield_properties', 'compute_modulus'] + list(_LAZY_NAMES)
+
+
+def __getattr__(name):
+    if name in _LAZY_NAMES:
+        value = getattr(importlib.import_module('.' + _LAZY_NAMES[name], __name__), name)
+        globals()[name] = value
+        return value
+    if name in _SUBMODULES:
+        return importlib.import_module('.' + name, __name__)
+    raise AttributeError('module {0!r} has no attribute {1!r}'.format(__name__, name))
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY_NAMES) | set(_SUBMODULES))
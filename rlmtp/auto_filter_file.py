@@ -1,11 +1,11 @@
 """@package auto_filter_file
 Function to generate filter files from stress-strain data.
 """
-from .find_peaks import find_peaks, find_peaks2
+from .find_peaks import CycleIndex
 from .yield_properties import yield_properties
 
 
-def generate_filter_file(d, out_path, remove_ranges=[], last_ind=None, wl1=50, wl2=5, wly=None):
+def generate_filter_file(d, out_path, remove_ranges=[], last_ind=None, wl1=50, wl2=5, wly=None, cycle_index=None):
     """ Writes an automatically generated filter file for data.
     :param pd.DataFrame d: Contains stress-strain data.
     :param str out_path: Path to write the output filter file.
@@ -14,16 +14,18 @@ def generate_filter_file(d, out_path, remove_ranges=[], last_ind=None, wl1=50, w
     :param int wl1: Window length for strain range prior to 2% amplitude.
     :param int wl2: Window length for strain range after 2% amplitude.
     :param int wly: Optional, Window length for the strain range up to the yield stress.
+    :param CycleIndex cycle_index: Optional, half-cycles of d, computed from d if not provided.
 
     Notes:
     ======
         - The parameter wly only has an effect if the strain amplitude is less than 2% (e.g., LP4 and LP5)
     """
+    if cycle_index is None:
+        cycle_index = CycleIndex.from_data(d)
     # Get the stress peaks
-    i = find_peaks(d['Sigma_true'])
+    i = cycle_index.find_peaks()
     # Get the strain peak of the first cycle
-    i2 = find_peaks2(d['e_true'], d['Sigma_true'])
-    i2 = i2[0]
+    i2 = int(cycle_index.strain_peaks[0])
     # Get the upper yield point -> maximum stress up-to 0.2% offset point
     em, fym = yield_properties(d)
     fy_limit = 0.2 / 100. + fym / em
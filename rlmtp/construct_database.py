@@ -114,9 +114,9 @@ def write_description_database_csv(parent_directory, output_file):
 
     :param str parent_directory: Path of the database containing each campaign.
     :param str output_file: Path of the file to write the database.
-    :return:
+    :return pd.DataFrame: Description database, see construct_description_database.
     """
 
     database = construct_description_database(parent_directory)
     database.to_csv(output_file, float_format='%g')
-    return
+    return database
@@ -0,0 +1,296 @@
+"""@package curve_store
+Single store for the processed curves of all the specimens, keyed by the DB tag.
+
+The processed data of a database is spread over one file per specimen, so any sweep over all the specimens parses
+hundreds of files. The store holds the same curves in a directory of raw binary arrays that are memory-mapped when the
+store is opened: the curve of a specimen is a contiguous slice of each column, found in O(1) from the DB tag, and the
+arrays returned are views of the mapped files (nothing is parsed or copied).
+
+Layout of the store directory:
+    - [column].f8: float64 values of the column for all the specimens, one curve after the other. The columns are
+    STORE_COLUMNS, NaN if the processed data does not have the column (e.g., no temperature).
+    - row.i8: int64 row number of each point in the original data, i.e., the index of the processed data.
+    - index.json: DB tags, offsets (the curve of tags[i] is rows offsets[i]:offsets[i + 1]), and source files.
+
+Build the store from the DB tag map written by gen_clean_data:
+>>> build_curve_store(read_tag_map('Clean_Data/db_tag_clean_data_map.csv'), 'Clean_Data/curve_store')
+>>> store = CurveStore('Clean_Data/curve_store')
+>>> curve = store.curve(12, columns=['e_true', 'Sigma_true'])
+
+Can be called as a script to build the store of a processed data root, e.g., for the unreduced data:
+>>> python -m rlmtp.curve_store build ./Unreduced_Data
+"""
+import os
+import sys
+import json
+import argparse
+import shutil
+import warnings
+import numpy as np
+import pandas as pd
+from .processed_data import read_processed_data, file_format, csv_has_index
+
+# Column name and file name of the columns in the store
+STORE_COLUMNS = {'Time[s]': 'time', 'e_true': 'e_true', 'Sigma_true': 'sigma_true', 'Temperature[C]': 'temperature'}
+ROW_FILE = 'row.i8'
+MAP_FILE = 'db_tag_clean_data_map.csv'
+DEFAULT_STORE_NAME = 'curve_store'
+INDEX_FILE = 'index.json'
+STORE_VERSION = 1
+
+
+def _column_file(store_dir, column):
+    return os.path.join(store_dir, STORE_COLUMNS[column] + '.f8')
+
+
+def _map_array(file, dtype, n):
+    """ Returns the read-only memory map of the n values in file, an empty array if n is 0 (mmap needs bytes). """
+    if n == 0:
+        return np.zeros(0, dtype=dtype)
+    return np.memmap(file, dtype=dtype, mode='r', shape=(n,))
+
+
+class CurveStoreWriter:
+    """ Writes the curves of the specimens to a new store, one specimen at a time.
+
+    Notes:
+    ======
+        - The store is written to store_dir + '.tmp' and only replaces store_dir when the writer is closed, so readers
+        never see a partial store. The temporary directory is removed if an exception occurs in a with block.
+        - Only the curve being added is in memory, the columns are appended to the files.
+    """
+    __slots__ = ('store_dir', '_tmp_dir', '_files', '_tags', '_offsets', '_sources')
+
+    def __init__(self, store_dir):
+        """ Constructor.
+
+        :param str store_dir: Directory of the store, replaced when the writer is closed.
+        """
+        self.store_dir = os.path.normpath(store_dir)
+        self._tmp_dir = self.store_dir + '.tmp'
+        if os.path.isdir(self._tmp_dir):
+            shutil.rmtree(self._tmp_dir)
+        os.makedirs(self._tmp_dir)
+        self._files = dict((c, open(_column_file(self._tmp_dir, c), 'wb')) for c in STORE_COLUMNS)
+        self._files[None] = open(os.path.join(self._tmp_dir, ROW_FILE), 'wb')
+        self._tags = []
+        self._offsets = [0]
+        self._sources = []
+
+    def add(self, db_tag, data, source=None):
+        """ Appends the curve of a specimen.
+
+        :param int db_tag: DB tag of the specimen, must be unique in the store.
+        :param pd.DataFrame data: Processed data, see rlmtp.processed_data.read_processed_data.
+        :param str source: File of the processed data, kept in the index.
+
+        - The row numbers are the index of data.
+        """
+        db_tag = int(db_tag)
+        if db_tag in self._tags:
+            raise ValueError('DB tag {0} is already in the store.'.format(db_tag))
+        rows = data.index.to_numpy(dtype=np.int64)
+        n = len(data)
+        for c, f in self._files.items():
+            if c is None:
+                f.write(np.ascontiguousarray(rows).tobytes())
+            elif c in data.columns:
+                f.write(np.ascontiguousarray(data[c].to_numpy(dtype=np.float64)).tobytes())
+            else:
+                f.write(np.full(n, np.nan).tobytes())
+        self._tags.append(db_tag)
+        self._offsets.append(self._offsets[-1] + n)
+        self._sources.append(source)
+        return
+
+    def close(self):
+        """ Writes the index and replaces the store directory with the new store. """
+        for f in self._files.values():
+            f.close()
+        index = {'version': STORE_VERSION, 'columns': list(STORE_COLUMNS), 'tags': self._tags,
+                 'offsets': self._offsets, 'sources': self._sources}
+        with open(os.path.join(self._tmp_dir, INDEX_FILE), 'w') as f:
+            json.dump(index, f)
+        old_dir = self.store_dir + '.old'
+        if os.path.isdir(self.store_dir):
+            os.replace(self.store_dir, old_dir)
+        os.replace(self._tmp_dir, self.store_dir)
+        if os.path.isdir(old_dir):
+            shutil.rmtree(old_dir)
+        return
+
+    def abort(self):
+        """ Removes the partial store, the existing store is not changed. """
+        for f in self._files.values():
+            f.close()
+        shutil.rmtree(self._tmp_dir, ignore_errors=True)
+        return
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
+
+
+class CurveStore:
+    """ Read-only access to the curves in a store written by CurveStoreWriter.
+
+    Notes:
+    ======
+        - The column files are memory-mapped when the store is opened, the curves returned are views of the maps. The
+        pages are only read when the values are used, and are shared by all the processes that open the same store.
+        - The views are read-only, copy them to modify the values.
+    """
+    __slots__ = ('store_dir', 'tags', 'offsets', 'sources', '_columns', '_rows', '_position')
+
+    def __init__(self, store_dir):
+        """ Constructor.
+
+        :param str store_dir: Directory of the store.
+        """
+        self.store_dir = store_dir
+        with open(os.path.join(store_dir, INDEX_FILE), 'r') as f:
+            index = json.load(f)
+        if index['version'] != STORE_VERSION:
+            raise ValueError('Store {0} has version {1}, expected {2}, build it again.'.format(
+                store_dir, index['version'], STORE_VERSION))
+        self.tags = index['tags']
+        self.offsets = np.array(index['offsets'], dtype=np.int64)
+        self.sources = dict(zip(self.tags, index['sources']))
+        n = int(self.offsets[-1])
+        self._columns = dict((c, _map_array(_column_file(store_dir, c), np.float64, n)) for c in index['columns'])
+        self._rows = _map_array(os.path.join(store_dir, ROW_FILE), np.int64, n)
+        self._position = dict((tag, i) for i, tag in enumerate(self.tags))
+
+    def __len__(self):
+        return len(self.tags)
+
+    def __contains__(self, db_tag):
+        return db_tag in self._position
+
+    def _slice(self, db_tag):
+        try:
+            i = self._position[db_tag]
+        except KeyError:
+            raise KeyError('DB tag {0} is not in the store {1}.'.format(db_tag, self.store_dir))
+        return slice(self.offsets[i], self.offsets[i + 1])
+
+    @property
+    def columns(self):
+        return list(self._columns)
+
+    def column(self, column):
+        """ Returns the values of the column for all the specimens, in the order of the tags. """
+        return self._columns[column]
+
+    def curve(self, db_tag, columns=None):
+        """ Returns the curve of a specimen.
+
+        :param int db_tag: DB tag of the specimen.
+        :param list columns: (str) Columns to return, if None then all the columns.
+        :return dict: Column name -> np.ndarray view of the values.
+        """
+        s = self._slice(db_tag)
+        if columns is None:
+            columns = self._columns
+        return dict((c, self._columns[c][s]) for c in columns)
+
+    def rows(self, db_tag):
+        """ Returns the row numbers of the curve of a specimen in the original data. """
+        return self._rows[self._slice(db_tag)]
+
+    def frame(self, db_tag, columns=None):
+        """ Returns the curve of a specimen as a pd.DataFrame (a copy) indexed by the row numbers.
+
+        - The columns that are all NaN for the specimen are dropped, as they are not in the processed data.
+        """
+        curve = self.curve(db_tag, columns)
+        data = pd.DataFrame(curve, index=pd.Index(self.rows(db_tag)), columns=list(curve))
+        if columns is None:
+            data = data.loc[:, data.notna().any(axis=0) | (len(data) == 0)]
+        return data
+
+
+def read_tag_map(map_file):
+    """ Returns the map from the DB tag to the processed data file written by gen_clean_data.
+
+    :param str map_file: Path to the db_tag_clean_data_map.csv file, one "tag,file" line per specimen.
+    :return dict: DB tag (int) -> processed data file.
+    """
+    tag_map = dict()
+    with open(map_file, 'r') as f:
+        for line in f:
+            if line.strip():
+                tag, file = line.rstrip('\n').split(',', 1)
+                tag_map[int(tag)] = file
+    return tag_map
+
+
+def build_curve_store(db_tag_to_file, store_dir):
+    """ Writes the curves of all the specimens in the map to a new store.
+
+    :param dict db_tag_to_file: DB tag -> processed data file (any format, see rlmtp.processed_data).
+    :param str store_dir: Directory of the store, replaced if it exists.
+    :return CurveStore: The new store.
+
+    - The files are read one at a time, so the memory use does not depend on the size of the database.
+    """
+    print('Building the curve store {0} from {1} files'.format(store_dir, len(db_tag_to_file)))
+    with CurveStoreWriter(store_dir) as writer:
+        for db_tag, file in db_tag_to_file.items():
+            # The map has both the RLMTP and non-RLMTP data, only the RLMTP .csv files have an index
+            has_index = file_format(file) != 'csv' or csv_has_index(file)
+            writer.add(db_tag, read_processed_data(file, has_index=has_index), source=file)
+    return CurveStore(store_dir)
+
+
+def default_store_dir(processed_data_root):
+    """ Returns the directory of the store of the processed data root. """
+    return os.path.join(processed_data_root, DEFAULT_STORE_NAME)
+
+
+def open_default_store(processed_data_root):
+    """ Returns the CurveStore of the processed data root, or None if it has not been built or is out-of-date.
+
+    - The store is out-of-date if the DB tag map was written after the store, i.e., the processed data was generated
+    again without building the store.
+    """
+    store_dir = default_store_dir(processed_data_root)
+    index_file = os.path.join(store_dir, INDEX_FILE)
+    if not os.path.isfile(index_file):
+        return None
+    map_file = os.path.join(processed_data_root, MAP_FILE)
+    if os.path.isfile(map_file) and os.path.getmtime(map_file) > os.path.getmtime(index_file):
+        warnings.warn('The curve store {0} is older than {1}, build it again to use it.'.format(store_dir, map_file))
+        return None
+    return CurveStore(store_dir)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Manage the rlmtp curve stores.')
+    subparsers = parser.add_subparsers(dest='command')
+    build_parser = subparsers.add_parser('build', help='Pack the processed data of a root directory into a store.')
+    build_parser.add_argument('processed_data_root', help='Directory with the processed data and the DB tag map.')
+    build_parser.add_argument('--store-dir', default=None,
+                              help='Directory of the store (default: processed_data_root/curve_store).')
+    args = parser.parse_args(argv)
+    if args.command == 'build':
+        store_dir = args.store_dir
+        if store_dir is None:
+            store_dir = default_store_dir(args.processed_data_root)
+        tag_map = read_tag_map(os.path.join(args.processed_data_root, MAP_FILE))
+        store = build_curve_store(tag_map, store_dir)
+        print('Stored {0} curves with {1} points.'.format(len(store), int(store.offsets[-1])))
+        return 0
+    parser.print_help()
+    return 1
+
+
+# If called as a script
+if __name__ == '__main__':
+    sys.exit(main())
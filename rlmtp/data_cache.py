@@ -0,0 +1,305 @@
+"""@package data_cache
+On-disk cache for the TimedData objects created by the readers.
+
+Parsing the Excel workbooks is by far the slowest step of processing a specimen. The cache stores the columns of the
+already-normalized TimedData in a binary columnar format (one uncompressed .npz file per input file) so that repeated
+runs only need to load the arrays.
+
+Can be called as a script to warm the cache for a whole database:
+>>> python -m rlmtp.data_cache warm ./RESSLab_Material_DB --jobs 4
+"""
+import os
+import sys
+import json
+import hashlib
+import datetime
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from .timed_data import TimedData
+from .readers import READER_VERSION, dion7_reader, catman_reader
+
+CACHE_DIR_NAME = '.rlmtp_cache'
+CACHE_EXTENSION = '.npz'
+DEFAULT_MAX_CACHE_BYTES = 4 * 1024 ** 3
+
+
+def default_cache_dir(file):
+    """ Returns the cache directory next to the specimen directory that contains file.
+
+    :param str file: Path to a data file, e.g., [specimen_directory]/Excel/testData_[test_id].xlsx.
+    :return str: Path to [specimen_directory]/.rlmtp_cache.
+    """
+    specimen_dir = os.path.dirname(os.path.dirname(os.path.abspath(file)))
+    return os.path.join(specimen_dir, CACHE_DIR_NAME)
+
+
+def file_digest(file, block_size=2 ** 20):
+    """ Returns the SHA-1 hex digest of the contents of file. """
+    h = hashlib.sha1()
+    with open(file, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def cached_file_digest(file, cache_dir):
+    """ Returns the digest of file, only re-hashing the contents if the size or modification time changed.
+
+    :param str file: Path to the file.
+    :param str cache_dir: Cache directory, the digests are stored in the "stat" subdirectory.
+    :return str: SHA-1 hex digest of the file contents.
+    """
+    st = os.stat(file)
+    stat_str = '{0}|{1}|{2}'.format(os.path.abspath(file), st.st_size, st.st_mtime_ns)
+    stat_file = os.path.join(cache_dir, 'stat', hashlib.sha1(stat_str.encode('utf-8')).hexdigest())
+    if os.path.isfile(stat_file):
+        with open(stat_file, 'r') as f:
+            return f.read().strip()
+    digest = file_digest(file)
+    os.makedirs(os.path.dirname(stat_file), exist_ok=True)
+    _atomic_write_text(stat_file, digest)
+    return digest
+
+
+def cache_key(file, reader, cache_dir):
+    """ Returns the key of the cache entry for file read with reader.
+
+    The key depends on the contents of the file, the reader type, the reader header rows, and READER_VERSION.
+    Therefore, changing the input file or the reader implementation invalidates the entry.
+    """
+    key_str = '|'.join([cached_file_digest(file, cache_dir), type(reader).__name__, str(reader.header_rows),
+                        str(READER_VERSION)])
+    return hashlib.sha1(key_str.encode('utf-8')).hexdigest()
+
+
+def _atomic_write_text(path, text):
+    """ Writes text to path through a temporary file so that readers never see a partial file. """
+    tmp_path = '{0}.{1}.tmp'.format(path, os.getpid())
+    with open(tmp_path, 'w') as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+    return
+
+
+def save_timed_data(timed_data, path):
+    """ Writes the TimedData to path in the cache format.
+
+    :param TimedData timed_data: Data to save.
+    :param str path: Path of the .npz file.
+
+    - Each column is stored as a contiguous array, the column names and the time information are stored as json.
+    - Object columns are stored as floats if possible, else as strings, and are converted back to object on load.
+    """
+    data = timed_data.data
+    arrays = dict()
+    kinds = []
+    for i, c in enumerate(data.columns):
+        col = data.iloc[:, i]
+        if col.dtype == object:
+            try:
+                arrays['col_{0}'.format(i)] = np.asarray(col, dtype=float)
+                kinds.append('object_float')
+            except (TypeError, ValueError):
+                arrays['col_{0}'.format(i)] = col.to_numpy(dtype=str)
+                kinds.append('object_str')
+        else:
+            arrays['col_{0}'.format(i)] = col.to_numpy()
+            kinds.append('native')
+    arrays['index'] = data.index.to_numpy(dtype=str)
+    sample_rate = timed_data.sample_rate_ms
+    meta = {
+        'columns': [str(c) for c in data.columns],
+        'kinds': kinds,
+        'start_time': timed_data.start_time.isoformat(),
+        'sample_rate_ns': int(pd.Timedelta(sample_rate).value),
+        'sample_rate_is_pandas': isinstance(sample_rate, pd.Timedelta),
+        'reader_version': READER_VERSION
+    }
+    arrays['meta'] = np.array(json.dumps(meta))
+    tmp_path = '{0}.{1}.tmp'.format(path, os.getpid())
+    with open(tmp_path, 'wb') as f:
+        np.savez(f, **arrays)
+    os.replace(tmp_path, path)
+    return
+
+
+def load_timed_data(path):
+    """ Returns the TimedData stored at path by save_timed_data. """
+    with np.load(path, allow_pickle=False) as npz:
+        meta = json.loads(str(npz['meta']))
+        columns = dict()
+        for i, (name, kind) in enumerate(zip(meta['columns'], meta['kinds'])):
+            values = npz['col_{0}'.format(i)]
+            if kind != 'native':
+                values = values.astype(object)
+            columns[name] = values
+        index = pd.Index(npz['index'].astype(object), dtype=object)
+    data = pd.DataFrame(columns, index=index)
+    start_time = datetime.datetime.fromisoformat(meta['start_time'])
+    if meta['sample_rate_is_pandas']:
+        sample_rate = pd.Timedelta(meta['sample_rate_ns'], unit='ns')
+    else:
+        sample_rate = datetime.timedelta(microseconds=meta['sample_rate_ns'] // 1000)
+    return TimedData(data, start_time, sample_rate)
+
+
+def cached_read(reader, file, cache_dir=None, max_bytes=DEFAULT_MAX_CACHE_BYTES):
+    """ Returns the TimedData from file, using the cached copy if it exists.
+
+    :param Reader reader: Reader used to parse the file if it is not in the cache.
+    :param str file: Path to the input file.
+    :param str cache_dir: Cache directory, if None then uses the ".rlmtp_cache" directory in the specimen directory.
+    :param int max_bytes: Maximum total size of the cache directory, if None then no eviction is done.
+    :return TimedData: Object containing the data in the input file.
+
+    - Raises FileNotFoundError if file does not exist, consistent with the readers.
+    """
+    if not os.path.isfile(file):
+        raise FileNotFoundError('No such file: {0}'.format(file))
+    if cache_dir is None:
+        cache_dir = default_cache_dir(file)
+    os.makedirs(cache_dir, exist_ok=True)
+    entry = os.path.join(cache_dir, cache_key(file, reader, cache_dir) + CACHE_EXTENSION)
+    if os.path.isfile(entry):
+        try:
+            timed_data = load_timed_data(entry)
+            # Update the modification time so that the eviction is least-recently-used
+            os.utime(entry, None)
+            return timed_data
+        except (OSError, ValueError, KeyError):
+            # Corrupt entry, re-read the file below
+            os.remove(entry)
+    timed_data = reader.read(file)
+    save_timed_data(timed_data, entry)
+    if max_bytes is not None:
+        evict(cache_dir, max_bytes)
+    return timed_data
+
+
+def cache_entries(cache_dir):
+    """ Returns a list of (path, size, mtime) for every entry in the cache directory. """
+    entries = []
+    if not os.path.isdir(cache_dir):
+        return entries
+    for f in os.listdir(cache_dir):
+        if f.endswith(CACHE_EXTENSION):
+            path = os.path.join(cache_dir, f)
+            st = os.stat(path)
+            entries.append((path, st.st_size, st.st_mtime))
+    return entries
+
+
+def evict(cache_dir, max_bytes):
+    """ Removes the least-recently-used entries until the cache is smaller than max_bytes.
+
+    :param str cache_dir: Cache directory.
+    :param int max_bytes: Maximum total size of the entries.
+    :return int: Number of entries removed.
+    """
+    entries = sorted(cache_entries(cache_dir), key=lambda e: e[2])
+    total = sum(e[1] for e in entries)
+    n_removed = 0
+    for path, size, _ in entries:
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+        n_removed += 1
+    return n_removed
+
+
+def clear_cache(cache_dir):
+    """ Removes all the entries and stored digests from the cache directory. """
+    for path, _, _ in cache_entries(cache_dir):
+        os.remove(path)
+    stat_dir = os.path.join(cache_dir, 'stat')
+    if os.path.isdir(stat_dir):
+        for f in os.listdir(stat_dir):
+            os.remove(os.path.join(stat_dir, f))
+    return
+
+
+def find_database_files(database_dir):
+    """ Returns a list of [reader_name, file] for all the Dion7 and catman files in the database. """
+    from .processing import find_dion7_file, find_catman_file
+    files = []
+    for root, dirs, _ in os.walk(database_dir):
+        if 'Excel' in dirs:
+            dion7_file = find_dion7_file(root)
+            if dion7_file is not None:
+                files.append(['Dion7', dion7_file])
+            catman_file = find_catman_file(root)
+            if catman_file is not None:
+                files.append(['catman', catman_file])
+            # Don't walk into the specimen directory
+            del dirs[:]
+    return files
+
+
+def _warm_file(args):
+    """ Reads a single file into the cache, returns [file, error message or None]. """
+    reader_name, file, cache_dir = args
+    try:
+        reader = dion7_reader(file) if reader_name == 'Dion7' else catman_reader(file)
+        cached_read(reader, file, cache_dir=cache_dir, max_bytes=None)
+        return [file, None]
+    except Exception as e:
+        return [file, '{0}: {1}'.format(type(e).__name__, e)]
+
+
+def warm(database_dir, cache_dir=None, jobs=1, max_bytes=DEFAULT_MAX_CACHE_BYTES):
+    """ Converts all the Dion7 and catman files in the database into cache entries.
+
+    :param str database_dir: Root of the database, e.g., ./RESSLab_Material_DB.
+    :param str cache_dir: Shared cache directory, if None then each specimen uses its own cache directory.
+    :param int jobs: Number of worker processes.
+    :param int max_bytes: Maximum size of the shared cache directory, applied after all the files are read.
+    :return list: [file, error message] for each file that could not be read.
+    """
+    files = find_database_files(database_dir)
+    print('Warming the cache for {0} files with {1} job(s)...'.format(len(files), jobs))
+    tasks = [[reader_name, file, cache_dir] for reader_name, file in files]
+    if jobs > 1:
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            results = list(executor.map(_warm_file, tasks))
+    else:
+        results = [_warm_file(t) for t in tasks]
+    failures = [r for r in results if r[1] is not None]
+    for file, message in failures:
+        print('\t Could not read {0} ({1})'.format(file, message))
+    if cache_dir is not None and max_bytes is not None:
+        evict(cache_dir, max_bytes)
+    print('Finished warming the cache, {0} files failed.'.format(len(failures)))
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Manage the rlmtp reader cache.')
+    subparsers = parser.add_subparsers(dest='command')
+    warm_parser = subparsers.add_parser('warm', help='Read all the data files in a database into the cache.')
+    warm_parser.add_argument('database_dir', help='Root directory of the database.')
+    warm_parser.add_argument('--cache-dir', default=None, help='Shared cache directory (default: per specimen).')
+    warm_parser.add_argument('--jobs', type=int, default=os.cpu_count(), help='Number of worker processes.')
+    warm_parser.add_argument('--max-bytes', type=int, default=DEFAULT_MAX_CACHE_BYTES,
+                             help='Maximum size of the shared cache directory.')
+    clear_parser = subparsers.add_parser('clear', help='Remove all the entries from a cache directory.')
+    clear_parser.add_argument('cache_dir', help='Cache directory to clear.')
+    args = parser.parse_args(argv)
+    if args.command == 'warm':
+        failures = warm(args.database_dir, cache_dir=args.cache_dir, jobs=args.jobs, max_bytes=args.max_bytes)
+        return 1 if failures else 0
+    elif args.command == 'clear':
+        clear_cache(args.cache_dir)
+        return 0
+    parser.print_help()
+    return 1
+
+
+# If called as a script
+if __name__ == '__main__':
+    sys.exit(main())
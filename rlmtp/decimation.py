@@ -0,0 +1,82 @@
+"""@package decimation
+Display decimation of long curves for plotting.
+
+The unreduced data has millions of points, far more than the pixels of a figure. Following the curve in the order of
+the samples (i.e., along the accumulated strain or the time), the points are grouped in runs of consecutive points in
+the same pixel column. Only the first, last, minimum, and maximum points of a run are needed to draw the same line: all
+the points of a run are within one pixel in x, so the line drawn through them covers the same pixels as the line
+through the extreme points. The number of points kept depends on the number of columns and cycles, not on the number of
+samples.
+
+The columns are DECIMATION_DPI pixels wide over the range of the data, finer than the pixels of the axes at the usual
+resolutions, so the differences with the full curve are below one pixel. They are smaller than the differences caused
+by the path simplification that matplotlib applies by default.
+
+>>> i = display_indices(data['e_true'], data['Sigma_true'], width_px=1200)
+>>> plt.plot(data['e_true'].values[i], data['Sigma_true'].values[i])
+"""
+import numpy as np
+
+# Curves with more points than this are decimated by the plotters
+DECIMATION_THRESHOLD = 20000
+# Resolution of the decimated figures, the columns are the pixels of the figure width at this resolution
+DECIMATION_DPI = 600
+
+
+def _first_in_run(condition, run):
+    """ Returns the index of the first point of each run where condition is True. """
+    i = np.flatnonzero(condition)
+    return i[np.concatenate([[True], run[i][1:] != run[i][:-1]])] if len(i) > 0 else i
+
+
+def minmax_decimate(x, y, n_columns):
+    """ Returns the indices of the points that draw the same curve with n_columns pixel columns.
+
+    :param np.ndarray x: (n, ) x-values of the curve, need not be monotonic.
+    :param np.ndarray y: (n, ) y-values of the curve.
+    :param int n_columns: Number of pixel columns over the range of x.
+    :return np.ndarray: (m, ) Sorted indices of the points to keep.
+
+    Notes:
+    ======
+        - The range of x is divided in n_columns columns. A run is a sequence of consecutive points in the same
+        column, for a cyclic curve each column is passed by one run per cycle (or more with noise).
+        - In each run the first, last, minimum y, maximum y, minimum x, and maximum x points are kept, so at most 6
+        points per run. The extremes in x keep the data limits of the curve.
+        - All the indices are returned if the values are not finite or if x is constant.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    n = len(x)
+    if n <= 6 or not (np.all(np.isfinite(x)) and np.all(np.isfinite(y))):
+        return np.arange(n)
+    x_min = x.min()
+    width = (x.max() - x_min) / n_columns
+    if width <= 0.:
+        return np.arange(n)
+    column = np.minimum(np.floor((x - x_min) / width).astype(np.int64), n_columns - 1)
+    is_first = np.concatenate([[True], column[1:] != column[:-1]])
+    first = np.flatnonzero(is_first)
+    last = np.concatenate([first[1:], [n]]) - 1
+    run = np.cumsum(is_first) - 1
+    keep = [first, last]
+    for values in [y, x]:
+        keep.append(_first_in_run(values == np.minimum.reduceat(values, first)[run], run))
+        keep.append(_first_in_run(values == np.maximum.reduceat(values, first)[run], run))
+    return np.unique(np.concatenate(keep))
+
+
+def display_indices(x, y, width_px=None):
+    """ Returns the indices of the points to plot, all of them if there are no more than DECIMATION_THRESHOLD.
+
+    :param np.ndarray x: (n, ) x-values of the curve.
+    :param np.ndarray y: (n, ) y-values of the curve.
+    :param int width_px: Number of pixel columns, if None then the default figure width at DECIMATION_DPI.
+    :return np.ndarray: (m, ) Sorted indices of the points to plot.
+    """
+    if len(x) <= DECIMATION_THRESHOLD:
+        return np.arange(len(x))
+    if width_px is None:
+        import matplotlib as mpl
+        width_px = int(np.ceil(mpl.rcParams['figure.figsize'][0] * DECIMATION_DPI))
+    return minmax_decimate(x, y, width_px)
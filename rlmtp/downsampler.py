@@ -1,11 +1,23 @@
 """@package downsampler
 Function to downsample stress-strain data.
 """
+import os
+import math
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
 from scipy.signal import savgol_filter
 import polyprox
-from .find_peaks import find_peaks, find_peaks2
+from .point_ranking import RDPRanking, VWRanking
+from .error_evaluator import EnergyErrorEvaluator
+from .find_peaks import CycleIndex
 from .yield_properties import yield_properties
+from .instrumentation import timed_stage, record_event
+
+# Strain limits in stress_strain_peaks, a bit extra past 2% and the point before 12.5%
+STRAIN_2PRCT = 0.02 * 1.025
+STRAIN_LAST = 0.125 / 1.02
+# Number of peaks above which a test without 2% strain is considered constant amplitude
+LARGE_NUM_CYCLES = 55
 
 
 def downsample_data(data, params):
@@ -15,17 +27,27 @@ def downsample_data(data, params):
     :return pd.DataFrame: Downsampled stress-strain, time, and (temperature if provided).
     """
     ind = rlmtp_downsampler(data, **params)
+    return data[output_columns(data)].loc[ind]
+
+
+def output_columns(data):
+    """ Returns the columns of data that are in the processed data, the temperature is only included if it exists.
+
+    - Only the first temperature channel is in the processed data, the additional thermocouples synced by
+    rlmtp.sync_temperature.sync_temperature are not.
+    """
     cols_to_include = ['C_1_Temps[s]', 'e_true', 'Sigma_true']
     temperature_col = 'Temperature[C]'
     if temperature_col in data.columns:
         cols_to_include += [temperature_col]
-    return data[cols_to_include].loc[ind]
+    return cols_to_include
 
 
 def rlmtp_downsampler(data, use_local_error=True, downsample_tol=0.001, last_ind=None, removal_ranges=[],
                       n_elastic_region=7, f_yn=345.0,
                       apply_filter=True, wl_base_value=5, wl_2prct_factor=1, polyorder=0,
-                      cut_sat_cycles=False, sat_tol=0.99, n_cycles_min=20):
+                      cut_sat_cycles=False, sat_tol=0.99, n_cycles_min=20, use_ranking=True, backend='polyprox',
+                      n_points=None, n_jobs=1, segment_length=None):
     """ Returns the indices of data to keep.
     :param data pd.DataFrame: Contains the true stress-strain data.
     :param use_local_error bool: If True, then downsample_tol is applied to the local criteria.
@@ -42,13 +64,22 @@ def rlmtp_downsampler(data, use_local_error=True, downsample_tol=0.001, last_ind
     :param cut_sat_cycles bool: If True, then cut cycles after saturation in constant amplitude loading.
     :param sat_tol float: Proportion of maximum stress to consider saturated under constant amplitude loading.
     :param n_cycles_min int: Minimum number of cycles to use in constant amplitude tests.
+    :param use_ranking bool: If True, the global criteria uses a ranking of the points by RDP significance, else the
+                             RDP algorithm is repeated for each trial local epsilon. Only used with the global criteria.
+    :param backend str: Downsampler used between the peaks, see DOWNSAMPLER_BACKENDS.
+    :param n_points int: If not None, then exactly n_points are kept (point budget), requires backend='visvalingam'.
+    :param n_jobs int: Number of processes used to downsample segments of the data, None uses all the CPUs.
+    :param segment_length int: If not None, the data is split at the peaks into segments of at most segment_length
+                               points, see bounded_segment_breaks.
     :return list: Indices in data to keep.
 
     Notes:
     ======
         - Uses two downsampling strategies:
             1. Keep the "peaks" of the stress-strain data
-            2. Ramer–Douglas–Peucker (RDP) algorithm to remove points inbetween peaks
+            2. Ramer–Douglas–Peucker (RDP) algorithm to remove points inbetween peaks (backend='polyprox'), or the
+            max deviation downsampler (backend='max_deviation'), or the Visvalingam-Whyatt algorithm
+            (backend='visvalingam')
         - Can specify where the data should end with last_ind
         - Can specify ranges of indices to remove with removal_ranges as follows:
             - removal_ranges = [[i_0, i_1], [i_2, i_3], ...]
@@ -57,6 +88,9 @@ def rlmtp_downsampler(data, use_local_error=True, downsample_tol=0.001, last_ind
         - The local criteria uses downsample_tol as the local epsilon.
         - The global criteria iterates the local epsilon until the global criteria on all the sampled
           data and the original data is satisfied.
+        - With use_ranking=True, the local epsilon at which each point is retained by RDP is computed (see
+          rlmtp.point_ranking.RDPRanking) and each trial local epsilon is a threshold on these significances
+          instead of a new run of the RDP algorithm. The selected points are identical.
         - Samples additional points in the initial elastic region to have fidelity in this area
         - If apply_filter=True, a moving average filter is applied to the stress after the
         peaks have been selected, but before the RDP downsampler is applied. Therefore,
@@ -66,29 +100,58 @@ def rlmtp_downsampler(data, use_local_error=True, downsample_tol=0.001, last_ind
         - Cycle cutting with sat_tol takes cycles up to and including when stress > sat_tol*max(stress)
           and stress < sat_tol*min(stress). This assumes a cyclic hardening behavior
         - The value of sat_tol should be: 0.0 < sat_tol <= 1.0.
+        - With backend='visvalingam', downsample_tol is the minimum effective triangle area of the scaled data
+          instead of a distance.
+        - With n_points, the tolerance and the global criteria are not used. The peaks, the ends of the removal
+          ranges, and the elastic region points are forced, then the most significant points for the
+          Visvalingam-Whyatt algorithm are added up to n_points in total (see rlmtp.point_ranking.VWRanking). The
+          points in the removal ranges are removed from the curve before ranking the points.
+        - With n_jobs != 1, the data is split at the peaks into segments of similar length that are downsampled in a
+          process pool, see segment_downsampler. The points are not identical to n_jobs=1 because the ends of the
+          segments are forced, but the tolerance (local criteria) or the global criteria is still satisfied.
+        - With segment_length, the segments have a bounded length instead (used by rlmtp.streaming).
     """
-    # Obtain the "peaks" in the stress-strain data
-    ind_ss, ind_2prct = stress_strain_peaks(data, last_ind=last_ind, f_yn=f_yn)
-    # Remove any duplicates and sort
-    ind_ss = sorted(list(set(ind_ss)))
-
-    # Only use cycles up to saturation for constant amplitude tests
-    # Constant amplitude if ind_2prct=None and many peaks found
-    large_num_cycles = 55
-    if ind_2prct is None and len(ind_ss) > large_num_cycles and cut_sat_cycles:
-        ind_ss = keep_upto_saturation(data, ind_ss, sat_tol=sat_tol, n_cycles_min=n_cycles_min)
+    # Obtain the "peaks" in the stress-strain data, the half-cycles are only found once
+    with timed_stage('peaks') as info:
+        cycle_index = CycleIndex.from_data(data)
+        ind_ss, ind_2prct = stress_strain_peaks(data, last_ind=last_ind, f_yn=f_yn, cycle_index=cycle_index)
+        # Remove any duplicates and sort
+        ind_ss = sorted(list(set(ind_ss)))
+
+        # Only use cycles up to saturation for constant amplitude tests
+        # Constant amplitude if ind_2prct=None and many peaks found
+        if ind_2prct is None and len(ind_ss) > LARGE_NUM_CYCLES and cut_sat_cycles:
+            ind_ss = keep_upto_saturation(data, ind_ss, sat_tol=sat_tol, n_cycles_min=n_cycles_min,
+                                          cycle_index=cycle_index)
+        info['n_peaks'] = len(ind_ss)
 
     # Run downsampler
     # Remove noise in the stress with a moving average filter
     d = np.array(data[['e_true', 'Sigma_true']])
     d0 = d.copy()
     if apply_filter:
-        d[:, 1] = filter_stress(d, ind_2prct, wl_base=wl_base_value, wl_factor=wl_2prct_factor,
-                                poly_order=polyorder)
-    if use_local_error:
-        ind_downsampler = apply_downsampler(d, ind_ss[-1], downsample_tol)
-    else:
-        ind_downsampler = downsample_loop(d, ind_ss[-1], downsample_tol, removal_ranges=removal_ranges)
+        with timed_stage('filter', n_points=len(d)):
+            d[:, 1] = filter_stress(d, ind_2prct, wl_base=wl_base_value, wl_factor=wl_2prct_factor,
+                                    poly_order=polyorder)
+    if n_points is not None:
+        if backend != 'visvalingam':
+            raise ValueError('n_points requires backend="visvalingam".')
+        with timed_stage('downsample_search', backend=backend, n_points=ind_ss[-1] + 1):
+            return budget_downsampler(d, d0, ind_ss, n_points, removal_ranges, f_yn, n_elastic_region)
+    with timed_stage('downsample_search', backend=backend, n_points=ind_ss[-1] + 1) as info:
+        if n_jobs != 1 or segment_length is not None:
+            if segment_length is not None:
+                breaks = bounded_segment_breaks(ind_ss, segment_length)
+            else:
+                breaks = segment_breaks(ind_ss, 2 * (n_jobs or os.cpu_count()))
+            ind_downsampler = segment_downsampler(d, breaks, downsample_tol, use_global=not use_local_error,
+                                                  n_jobs=n_jobs, backend=backend, use_ranking=use_ranking)
+        elif use_local_error:
+            ind_downsampler = apply_downsampler(d, ind_ss[-1], downsample_tol, backend=backend)
+        else:
+            ind_downsampler = downsample_loop(d, ind_ss[-1], downsample_tol, removal_ranges=removal_ranges,
+                                              use_ranking=use_ranking, backend=backend)
+        info['n_points_kept'] = len(ind_downsampler)
 
     # Combine the points, remove any points that lie between the removal ranges
     ind_final = ind_ss + ind_downsampler
@@ -111,21 +174,145 @@ def scale_data(d):
     return d, e_range, s_range
 
 
-def apply_downsampler(d, last_ind, tol):
+def budget_downsampler(d, d0, ind_ss, n_points, removal_ranges, f_yn, n_elastic_region):
+    """ Returns n_points indices to keep in d using the Visvalingam-Whyatt ranking.
+    :param d np.array: (n, 2) Filtered stress-strain data.
+    :param d0 np.array: (n, 2) Stress-strain data.
+    :param ind_ss list: Sorted indices of the peaks, the last entry is the last index to keep.
+    :param n_points int: Number of points to keep.
+    :param removal_ranges list: (list) Each list specifies ranges of indices to remove.
+    :param f_yn float: Nominal yield stress.
+    :param n_elastic_region int: Number of extra points to keep in the initial elastic region.
+    :return list: Indices to keep.
+    """
+    forced = sorted(set(apply_removal_ranges(list(ind_ss), removal_ranges)))
+    forced = sorted(set(forced + add_to_elastic(d0, forced, f_yn, n_elastic_region)))
+    last_ind = ind_ss[-1]
+    excluded = [i for rr in removal_ranges for i in range(rr[0] + 1, min(rr[1], last_ind + 1))]
+    d, _, _ = scale_data(d[0:last_ind + 1, :])
+    forced = [i for i in forced if i <= last_ind]
+    ranking = VWRanking(d, forced=forced, excluded=excluded)
+    return ranking.budget_indices(n_points).tolist()
+
+
+def apply_downsampler(d, last_ind, tol, backend='polyprox'):
     """ Returns the indices to keep in d.
     :param d np.array: x-y data.
     :param last_ind int: Only considers d[0:last_ind+1].
     :param tol float: Threshold to use in the downsampler.
+    :param backend str: Downsampler to use, see DOWNSAMPLER_BACKENDS.
     :return list: Indices to keep.
     """
     # Only use the data up to the last index from the stress-strain peaks
     d = d[0:last_ind+1, :]
     d, _, _ = scale_data(d)
-    # ind_ds = max_deviation_downsampler(d, tol)
-    ind_ds = list(polyprox.min_num(d, epsilon=tol, return_index=True))
+    ind_ds = get_backend(backend)(d, tol)
     return ind_ds
 
 
+def segment_breaks(ind_ss, n_segments, min_length=1000):
+    """ Returns the peaks that split the data into about n_segments of similar length.
+    :param ind_ss list: Sorted indices of the peaks, the last entry is the last index to keep.
+    :param n_segments int: Target number of segments.
+    :param min_length int: Minimum number of points between two break points.
+    :return list: Sorted break points, the first is 0 and the last is ind_ss[-1].
+    """
+    peaks = np.asarray(ind_ss)
+    last_ind = int(peaks[-1])
+    # Peaks closest to equally spaced targets
+    targets = np.linspace(0, last_ind, n_segments + 1)[1:-1]
+    j = np.clip(np.searchsorted(peaks, targets), 1, len(peaks) - 1)
+    closest = np.where(targets - peaks[j - 1] < peaks[j] - targets, peaks[j - 1], peaks[j])
+    breaks = [0]
+    for b in closest.tolist():
+        if b - breaks[-1] >= min_length and last_ind - b >= min_length:
+            breaks.append(b)
+    breaks.append(last_ind)
+    return breaks
+
+
+def bounded_segment_breaks(ind_ss, max_length):
+    """ Returns the peaks that split the data into segments of at most max_length points.
+    :param ind_ss list: Sorted indices of the peaks, the last entry is the last index to keep.
+    :param max_length int: Maximum number of points between two break points.
+    :return list: Sorted break points, the first is 0 and the last is ind_ss[-1].
+
+    - The farthest peak within max_length of the previous break is used. If there is none, then the next peak is used
+    and the segment is longer than max_length.
+    """
+    peaks = np.unique(np.append(ind_ss, 0))
+    breaks = [0]
+    last_ind = int(peaks[-1])
+    while breaks[-1] < last_ind:
+        j = np.searchsorted(peaks, breaks[-1] + max_length, side='right') - 1
+        if peaks[j] <= breaks[-1]:
+            j = np.searchsorted(peaks, breaks[-1], side='right')
+        breaks.append(int(peaks[j]))
+    return breaks
+
+
+def segment_downsampler(d, breaks, tol, use_global=False, n_jobs=None, backend='polyprox', use_ranking=True):
+    """ Returns the indices to keep in d, the segments between the break points are downsampled in parallel.
+    :param d np.array: (n, 2) x-y data.
+    :param breaks list: Sorted break points, see segment_breaks. Only considers d[0:breaks[-1]+1].
+    :param tol float: Local tolerance of the backend, or global tolerance if use_global is True.
+    :param use_global bool: If True, each segment is downsampled with downsample_loop, else with the backend.
+    :param n_jobs int: Number of processes, None uses all the CPUs, 1 runs the segments sequentially.
+    :param backend str: Downsampler to use, see DOWNSAMPLER_BACKENDS.
+    :param use_ranking bool: Used by downsample_loop if use_global is True.
+    :return list: Sorted indices to keep, includes all the break points.
+
+    Notes:
+    ======
+        - With the local criteria, the data is scaled once so that tol has the same meaning in all the segments.
+        - With the global criteria, each segment is downsampled to the global tolerance on its own energy. The squared
+        error of the data is the energy-weighted sum of the squared errors of the segments, so the error budget is
+        distributed in proportion to the energy of each segment and the global tolerance is satisfied.
+    """
+    last_ind = breaks[-1]
+    if use_global:
+        d = d[0:last_ind + 1, :]
+    else:
+        d, _, _ = scale_data(d[0:last_ind + 1, :])
+    tasks = [(d[b0:b1 + 1], tol, use_global, backend, use_ranking) for b0, b1 in zip(breaks[:-1], breaks[1:])]
+    if n_jobs == 1 or len(tasks) == 1:
+        results = [_downsample_segment(t) for t in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs) as pool:
+            results = list(pool.map(_downsample_segment, tasks))
+    ind = set(breaks)
+    for b0, ind_segment in zip(breaks[:-1], results):
+        ind.update(b0 + i for i in ind_segment)
+    return sorted(ind)
+
+
+def _downsample_segment(task):
+    """ Returns the indices to keep in a segment, task is (d, tol, use_global, backend, use_ranking). """
+    d, tol, use_global, backend, use_ranking = task
+    if use_global:
+        return downsample_loop(d.copy(), len(d) - 1, tol, use_ranking=use_ranking, backend=backend)
+    return [int(i) for i in get_backend(backend)(d, tol)]
+
+
+def polyprox_downsampler(d, tol):
+    """ Returns the indices of the points kept by the RDP algorithm of polyprox. """
+    return list(polyprox.min_num(d, epsilon=tol, return_index=True))
+
+
+def visvalingam_downsampler(d, tol):
+    """ Returns the indices of the points kept by the Visvalingam-Whyatt algorithm, tol is the triangle area. """
+    return VWRanking(d).indices(tol).tolist()
+
+
+def get_backend(backend):
+    """ Returns the downsampler function with the name backend, see DOWNSAMPLER_BACKENDS. """
+    try:
+        return DOWNSAMPLER_BACKENDS[backend]
+    except KeyError:
+        raise ValueError('Unknown downsampler backend "{0}", use one of {1}.'.format(backend,
+                                                                                    list(DOWNSAMPLER_BACKENDS)))
+
+
 def apply_removal_ranges(ind_final, removal_ranges):
     """ Removes any points contained in any of the removal ranges. """
     for rr in removal_ranges:
@@ -170,6 +357,35 @@ def filter_stress(d, ind_2prct, wl_base=5, wl_factor=11, poly_order=1):
     return s_final
 
 
+def filter_stress_window(s, i0, i1, ind_2prct, wl_base=5, wl_factor=11, poly_order=1):
+    """ Returns filter_stress(d, ...)[i0:i1] for d[:, 1] = s, only the entries of s near [i0, i1) are read.
+    :param s np.array: (n, ) Stress data, e.g., a np.memmap.
+    :param i0 int: First index of the window.
+    :param i1 int: Index past the last index of the window.
+    :param ind_2prct int: Index for the switch for greater / less than 2 % strain, or None.
+    :return np.array: (i1 - i0, ) Filtered stress.
+
+    - Each entry is filtered with the same neighbors as in filter_stress, the window is extended to the end of the
+    pre- or post- 2% data if it is close to it since the filter fits a polynomial to the last entries at the ends.
+    """
+    n = len(s)
+    if ind_2prct is not None:
+        pieces = [(0, ind_2prct, wl_base * wl_factor), (ind_2prct, n, wl_base)]
+    else:
+        pieces = [(0, n, wl_base * wl_factor)]
+    s_final = np.empty(i1 - i0)
+    for p0, p1, wl in pieces:
+        j0, j1 = max(i0, p0), min(i1, p1)
+        if j0 >= j1:
+            continue
+        # Read the window with a margin of wl, or to the end of the piece
+        lo = j0 - wl if j0 - wl - p0 >= wl else p0
+        hi = j1 + wl if p1 - (j1 + wl) >= wl else p1
+        filtered = savgol_filter(np.asarray(s[lo:hi], dtype=float), wl, poly_order)
+        s_final[j0 - i0:j1 - i0] = filtered[j0 - lo:j1 - lo]
+    return s_final
+
+
 def add_to_elastic(d, selected_pts, fy, n_elastic_region):
     """ Adds indices to the elastic region.
     :param np.array d: (n, 2) Stress-strain data.
@@ -232,32 +448,156 @@ def max_deviation_downsampler(pos, thresh=0.001, use_midpoint_method=False):
         - Keeps the first point
         - Later points are kept if the perpindicular distance between points are outside of "thresh"
         - Keeps more points in regions of higher curvature, and less otherwise
+        - The max distance method is O(n): the directions of the lines from the last kept point that are within
+        "thresh" of all the points since the last kept point form a cone, a new point is only kept if the direction
+        to the next point is outside of the cone. The cone is updated once per point, see max_deviation_cone.
 
     References:
     ===========
         - https://kaushikghose.wordpress.com/2017/11/25/adaptively-downsampling-a-curve/
         - https://github.com/kghose/groho/blob/stable/docs/dev/adaptive-display-points.ipynb
     """
-    # Metric to use in the deviation distance
-    if use_midpoint_method:
-        dist_fun = mid_dist
-    else:
-        dist_fun = max_dist
+    if not use_midpoint_method:
+        return max_deviation_cone(pos, thresh)
 
     adaptive_ind = [0]
     last_n = 0
     for n in range(1, pos.shape[0]):
-        if dist_fun(pos, last_n, n) > thresh:
+        if mid_dist(pos, last_n, n) > thresh:
             adaptive_ind.append(n - 1)
             last_n = n - 1
     return adaptive_ind
 
 
-def stress_strain_peaks(d, last_ind=None, f_yn=345.0):
+# Relative tolerance on thresh in max_deviation_cone, distances equal to thresh up to round-off are accepted
+TIE_RTOL = 1.e-9
+# Number of points of a segment in max_deviation_cone that are scanned one at a time before using numpy windows
+CONE_SCALAR_POINTS = 64
+
+
+def max_deviation_cone(pos, thresh):
+    """ Returns the indices of max_deviation_downsampler with the max distance method in O(n).
+    :param pos np.array: (n, 2) Set of 2-dimensional points.
+    :param thresh float: Maximum allowable perpindicular distance between sampled points.
+    :return list: Indices of points to keep.
+
+    Notes:
+    ======
+        - A point p at a distance r > thresh from the last kept point (the anchor) is within "thresh" of the line from
+        the anchor with direction theta if |sin(theta - theta_p)| * r <= thresh, i.e., the feasible directions are
+        theta_p +/- arcsin(thresh / r) (mod pi). Points with r <= thresh don't constrain the direction.
+        - The directions are measured from the first point that constrains the direction, and the feasible directions
+        of all the points since the anchor are kept as one interval [lo, hi]. Each point is visited once: if its
+        direction is outside of the interval then the previous point is kept and becomes the anchor, else the
+        interval is narrowed by its feasible directions.
+        - Points close to the anchor (thresh < r < sqrt(2) * thresh) can make the feasible directions two intervals,
+        only the one in the frame of the first point is kept. Therefore, some points may be kept that the original
+        max_dist criteria would remove, but the removed points are always within thresh of the lines.
+        - thresh is increased by TIE_RTOL, so distances equal to thresh are accepted (e.g., with quantized data).
+        - The first CONE_SCALAR_POINTS points of each segment are scanned one at a time, the rest of long segments are
+        scanned in numpy windows of doubling size, see _cone_window.
+    """
+    t = thresh * (1. + TIE_RTOL)
+    x = pos[:, 0].tolist()
+    y = pos[:, 1].tolist()
+    n_pts = len(x)
+    adaptive_ind = [0]
+    anchor = 0
+    ref = None
+    lo, hi = -math.inf, math.inf
+    j = 1
+    while j < n_pts:
+        if j - anchor > CONE_SCALAR_POINTS:
+            # Long segment, scan the rest of it in windows
+            size = CONE_SCALAR_POINTS
+            infeasible = None
+            while infeasible is None and j < n_pts:
+                end = min(j + size, n_pts)
+                infeasible, ref, lo, hi = _cone_window(pos, anchor, j, end, t, ref, lo, hi)
+                if infeasible is None:
+                    j = end
+                    size *= 2
+            if infeasible is None:
+                break
+            j = infeasible
+        else:
+            dx = x[j] - x[anchor]
+            dy = y[j] - y[anchor]
+            r = math.hypot(dx, dy)
+            if ref is None:
+                if r > t:
+                    ref = math.atan2(dy, dx)
+                    w = math.asin(t / r)
+                    lo, hi = -w, w
+                j += 1
+                continue
+            if r > 0.:
+                phi = (math.atan2(dy, dx) - ref + math.pi / 2.) % math.pi - math.pi / 2.
+                if lo <= phi <= hi:
+                    if r > t:
+                        w = math.asin(t / r)
+                        lo = max(lo, phi - w)
+                        hi = min(hi, phi + w)
+                    j += 1
+                    continue
+        # Keep the point before the first infeasible end point, it is the new anchor
+        anchor = j - 1
+        adaptive_ind.append(anchor)
+        ref = None
+        lo, hi = -math.inf, math.inf
+    return adaptive_ind
+
+
+def _cone_window(pos, anchor, start, end, t, ref, lo, hi):
+    """ Continues the scan of max_deviation_cone over the points pos[start:end].
+
+    :param pos np.array: (n, 2) Set of 2-dimensional points.
+    :param anchor int: Index of the last kept point.
+    :param start int: First point of the window, the points anchor + 1, ..., start - 1 are feasible.
+    :param end int: End of the window.
+    :param t float: Maximum allowable perpindicular distance, including the tolerance.
+    :param ref float: Reference direction, or None if no point constrains the direction yet.
+    :param lo float: Lower bound of the feasible directions relative to ref.
+    :param hi float: Upper bound of the feasible directions relative to ref.
+    :return list: [infeasible, ref, lo, hi] The index of the first infeasible end point (None if all are feasible),
+        and the reference and bounds after the window.
+    """
+    rel = pos[start:end] - pos[anchor]
+    r = np.hypot(rel[:, 0], rel[:, 1])
+    constrains = r > t
+    if ref is None:
+        first = np.flatnonzero(constrains)
+        if len(first) == 0:
+            return [None, ref, lo, hi]
+        ref = math.atan2(rel[first[0], 1], rel[first[0], 0])
+    phi = np.mod(np.arctan2(rel[:, 1], rel[:, 0]) - ref + np.pi / 2., np.pi) - np.pi / 2.
+    half_width = np.full(len(r), np.inf)
+    half_width[constrains] = np.arcsin(t / r[constrains])
+    # Bounds before each point
+    lower = np.maximum.accumulate(np.concatenate(([lo], phi - half_width)))
+    upper = np.minimum.accumulate(np.concatenate(([hi], phi + half_width)))
+    feasible = (lower[:-1] <= phi) & (phi <= upper[:-1])
+    # An end point at the anchor is feasible only if no point constrains the direction before it
+    at_anchor = r == 0.
+    feasible[at_anchor] = np.isinf(lower[:-1][at_anchor])
+    infeasible = np.flatnonzero(~feasible)
+    if len(infeasible) > 0:
+        return [start + int(infeasible[0]), ref, lo, hi]
+    return [None, ref, float(lower[-1]), float(upper[-1])]
+
+
+# Downsamplers of scaled x-y data, all have the signature f(d, tol) -> list of indices to keep
+DOWNSAMPLER_BACKENDS = {'polyprox': polyprox_downsampler,
+                        'max_deviation': max_deviation_downsampler,
+                        'visvalingam': visvalingam_downsampler}
+
+
+def stress_strain_peaks(d, last_ind=None, f_yn=345.0, cycle_index=None):
     """ Returns the indicies of the initial elastic region and stress-strain peaks.
     :param d pd.DataFrame: Stress-strain data.
     :param last_ind int: Only consider the data d[:last_ind+1].
     :param f_yn float: Nominal yield stress.
+    :param cycle_index CycleIndex: Optional, half-cycles of d, computed from d if not provided.
     :return list: [i_final, i_2prct]:
         - i_final is a list of the indices
         - i_2prct is an int for the index at which crosses to 2% strain, or None if it doesn't cross
@@ -267,37 +607,55 @@ def stress_strain_peaks(d, last_ind=None, f_yn=345.0):
         - Extracted from rlmtp.auto_filter_file.py.
         - Contains the starting point also.
     """
+    if cycle_index is None:
+        cycle_index = CycleIndex.from_data(d)
     # Get the stress peaks
-    i = find_peaks(d['Sigma_true'])
+    i = cycle_index.find_peaks()
     # Get the strain peak of the first cycle
-    i2 = find_peaks2(d['e_true'], d['Sigma_true'])
-    i2 = i2[0]
+    i2 = int(cycle_index.strain_peaks[0])
     # Get the upper yield point -> maximum stress up-to 0.2% offset point
     em, fym = yield_properties(d, f_yn=f_yn)
     fy_limit = 0.2 / 100. + fym / em
     i_plateau = d[d['e_true'].gt(fy_limit)].index[0]
     i_fyupper = int(d['Sigma_true'].loc[:i_plateau].idxmax())
     # Locate the points crossing 2% strain amplitude
-    # Use a bit extra past the point
-    amp_limit = 0.02 * 1.025
-    i_2prct = d[d['e_true'].gt(amp_limit)]
-    # Find the point before 12.5%
-    amp_limit = 0.125 / 1.02
-    ilast = d[d['e_true'].gt(amp_limit)]
+    i_2prct = d[d['e_true'].gt(STRAIN_2PRCT)]
     if len(i_2prct) > 0:
         i_2prct = i_2prct.index[0]
-        i_final = [0] + i + [i2, i_fyupper, int(i_2prct)]
     else:
         i_2prct = None
+    # Find the point before 12.5%
+    ilast = d[d['e_true'].gt(STRAIN_LAST)]
+    if len(ilast) > 0:
+        ilast = ilast.index[0]
+    else:
+        ilast = None
+    return combine_peaks(i, i2, i_fyupper, i_2prct, ilast, len(d), last_ind=last_ind), i_2prct
+
+
+def combine_peaks(i, i2, i_fyupper, i_2prct, ilast, n, last_ind=None):
+    """ Returns the indices of stress_strain_peaks from the individual points.
+    :param i list: Stress peaks.
+    :param i2 int: Strain peak of the first cycle.
+    :param i_fyupper int: Upper yield point.
+    :param i_2prct int: First point past 2% strain, or None.
+    :param ilast int: First point past 12.5% strain, or None.
+    :param n int: Number of points in the data.
+    :param last_ind int: Last index to keep, or None.
+    :return list: Indices of the initial elastic region and stress-strain peaks.
+    """
+    if i_2prct is not None:
+        i_final = [0] + i + [i2, i_fyupper, int(i_2prct)]
+    else:
         i_final = [0] + i + [i2, i_fyupper]
     # Remove data past 12.5% and remove after the last specified index
-    if len(ilast) > 0 or last_ind is not None:
+    if ilast is not None or last_ind is not None:
         # Use either the point at 12.5% or the last_ind
-        if len(ilast) > 0:
-            i_ult = ilast.index[0]
+        if ilast is not None:
+            i_ult = ilast
         else:
             i_ult = last_ind
-        if last_ind is not None and len(ilast) > 0:
+        if last_ind is not None and ilast is not None:
             # Use the specified last index if it is less than the auto determined one
             if last_ind < i_ult:
                 i_ult = last_ind
@@ -305,8 +663,8 @@ def stress_strain_peaks(d, last_ind=None, f_yn=345.0):
         i_final.append(i_ult)
     else:
         # Go until the end of the data
-        i_final.append(len(d) - 1)
-    return i_final, i_2prct
+        i_final.append(n - 1)
+    return i_final
 
 
 def downsample_error(d, ind, removal_ranges=[], e_scale=1.0, s_scale=1.0):
@@ -328,11 +686,16 @@ def downsample_error(d, ind, removal_ranges=[], e_scale=1.0, s_scale=1.0):
     return np.sqrt(np.trapz((y - y2)**2, x=x) / e1)
 
 
-def keep_upto_saturation(data, ind_ss, sat_tol, n_cycles_min=10, extra_pts=5):
-    """ Removes indices past the saturation index. """
+def keep_upto_saturation(data, ind_ss, sat_tol, n_cycles_min=10, extra_pts=5, cycle_index=None):
+    """ Removes indices past the saturation index, see find_saturation_index for cycle_index. """
     # Number of cycles is (num peaks - extra_pts) / 2
     # Extra points may vary from test to test, but hopefully not...
-    sat_ind = find_saturation_index(data, sat_tol)
+    sat_ind = find_saturation_index(data, sat_tol, cycle_index=cycle_index)
+    return cut_at_saturation(ind_ss, sat_ind, n_cycles_min=n_cycles_min, extra_pts=extra_pts)
+
+
+def cut_at_saturation(ind_ss, sat_ind, n_cycles_min=10, extra_pts=5):
+    """ Removes indices past the saturation index sat_ind, see keep_upto_saturation. """
     cycles_to_sat = int(next(i for i, v in enumerate(ind_ss) if v > sat_ind) - extra_pts) // 2
     if cycles_to_sat < n_cycles_min:
         cycles_to_sat = n_cycles_min
@@ -347,12 +710,18 @@ def keep_upto_saturation(data, ind_ss, sat_tol, n_cycles_min=10, extra_pts=5):
     return ind_ss
 
 
-def find_saturation_index(d, sat_tol=0.99):
+def find_saturation_index(d, sat_tol=0.99, cycle_index=None):
     """ Returns the index of the first instance that reaches saturation.
 
     Saturation is defined by sat_tol and must be satisfied in both positive and negative
     loading directions.
+
+    If the CycleIndex of d is provided, then the extremes are taken from the half-cycles and only the first half-cycle
+    that reaches saturation is searched in each direction.
     """
+    if cycle_index is not None:
+        i_sat1, i_sat2 = saturation_positions(cycle_index, d['Sigma_true'], sat_tol)
+        return int(max(d.index[i_sat1], d.index[i_sat2]))
     # Check the positive loading direction
     s_max = d['Sigma_true'].max()
     i_sat1 = d[d['Sigma_true'].gt(sat_tol * s_max)].index[0]
@@ -364,16 +733,31 @@ def find_saturation_index(d, sat_tol=0.99):
     return i_sat
 
 
+def saturation_positions(cycle_index, s, sat_tol):
+    """ Returns the positions of the first saturated points in the positive and negative directions.
+    :param CycleIndex cycle_index: Half-cycles of the stress.
+    :param pd.Series s: Stress.
+    :param float sat_tol: Proportion of maximum stress to consider saturated.
+    :return list: [int, int] Positions in the positive and negative loading directions.
+    """
+    i_sat1 = cycle_index.first_exceedance(s, sat_tol * np.max(cycle_index.cycle_max), above=True)
+    i_sat2 = cycle_index.first_exceedance(s, sat_tol * np.min(cycle_index.cycle_min), above=False)
+    if i_sat1 is None or i_sat2 is None:
+        raise IndexError('Saturation is not reached in both loading directions.')
+    return [i_sat1, i_sat2]
+
+
 def read_downsample_props(fpath):
     """ Parses downsampler_props.txt files.
     :param str fpath: Path to the file.
     :return dict: Parsed properties.
     """
     # To sanitize inputs
-    type_map = {'use_local_error': bool, 'downsample_tol': float, 'last_ind': int, 'removal_range': int,
+    type_map = {'use_local_error': parse_bool, 'downsample_tol': float, 'last_ind': int, 'removal_range': int,
                 'n_elastic_region': int, 'f_yn': float,
-                'apply_filter': bool, 'wl_base_value': int, 'wl_2prct_factor': int, 'polyorder': int,
-                'cut_sat_cycles': bool, 'sat_tol': float, 'n_cycles_min': int}
+                'apply_filter': parse_bool, 'wl_base_value': int, 'wl_2prct_factor': int, 'polyorder': int,
+                'cut_sat_cycles': parse_bool, 'sat_tol': float, 'n_cycles_min': int, 'use_ranking': parse_bool,
+                'backend': str, 'n_points': int}
     # Deprecated parameters
     old_parameters = ['max_dev_tol', 'use_midpoint_method', 'wl_base_factor']
 
@@ -405,11 +789,43 @@ def read_downsample_props(fpath):
     return properties
 
 
-def downsample_loop(d, last_ind, global_tol, local_tol_0=0.1, max_its=50, removal_ranges=[]):
-    """ Runs downsampler until a global tolerance is reached. """
+def parse_bool(x):
+    """ Returns True if the string x is "True", "1", or "yes" (case insensitive), else False.
+
+    - bool(x) is True for any non-empty string, including "False".
+    """
+    return x.strip().lower() in ('true', '1', 'yes')
+
+
+def downsample_loop(d, last_ind, global_tol, local_tol_0=0.1, max_its=50, removal_ranges=[], use_ranking=False,
+                    backend='polyprox'):
+    """ Runs downsampler until a global tolerance is reached.
+
+    If use_ranking is True, then each trial local tolerance is a threshold on the RDP significance of the points
+    instead of a new run of polyprox, see rlmtp.point_ranking.RDPRanking. The selected points are identical.
+    use_ranking is only used with backend='polyprox'. backend='visvalingam' always uses a ranking (see
+    rlmtp.point_ranking.VWRanking), the other backends are run for each trial local tolerance.
+
+    The error of each trial is computed with an EnergyErrorEvaluator, only the segments between retained points that
+    were not in a previous trial are integrated. removal_ranges is unused, as in downsample_error.
+    """
     # Only use the data up to the last index from the stress-strain peaks
     d = d[0:last_ind+1, :]
     d, e_range, s_range = scale_data(d)
+    evaluator = EnergyErrorEvaluator(d, e_range, s_range)
+    downsampler = get_backend(backend)
+    if backend == 'visvalingam':
+        ranking = VWRanking(d)
+        use_ranking = True
+    elif use_ranking and backend == 'polyprox':
+        ranking = RDPRanking(d, min_significance=local_tol_0)
+    else:
+        use_ranking = False
+
+    def downsample(tol):
+        if use_ranking:
+            return ranking.indices(tol)
+        return downsampler(d, tol)
 
     ds_tol = local_tol_0
     e = 10 * global_tol
@@ -419,9 +835,10 @@ def downsample_loop(d, last_ind, global_tol, local_tol_0=0.1, max_its=50, remova
 
     # Get below the global tolerance
     while e > global_tol and it < max_its:
-        ind = polyprox.min_num(d, epsilon=ds_tol, return_index=True)
-        e = downsample_error(d, ind, removal_ranges, e_range, s_range)
+        ind = downsample(ds_tol)
+        e = evaluator.error(ind)
         print('Current error = {0:0.2%}, # points = {1}, current tol = {2:0.3e}'.format(e, len(ind), ds_tol))
+        record_event('downsample_iteration', iteration=it, error=float(e), n_points=len(ind), tol=float(ds_tol))
         # Update upper and lower bounds on local epsilon
         if it == 0:
             upper_bound = [ds_tol, e, len(ind), ind]
@@ -440,9 +857,10 @@ def downsample_loop(d, last_ind, global_tol, local_tol_0=0.1, max_its=50, remova
     lower_target = 0.98 * global_tol
     while it < max_its:
         ds_tol = np.interp(lower_target, [lower_bound[1], upper_bound[1]], [lower_bound[0], upper_bound[0]])
-        ind = polyprox.min_num(d, epsilon=ds_tol, return_index=True)
-        e = downsample_error(d, ind, removal_ranges, e_range, s_range)
+        ind = downsample(ds_tol)
+        e = evaluator.error(ind)
         print('Current error = {0:0.2%}, # points = {1}, current tol = {2:0.3e}'.format(e, len(ind), ds_tol))
+        record_event('downsample_iteration', iteration=it, error=float(e), n_points=len(ind), tol=float(ds_tol))
         # Check convergence
         if global_tol_lower_bound < e < global_tol:
             # Found good local tolerance
@@ -0,0 +1,139 @@
+"""@package error_evaluator
+Incremental evaluation of the downsampling error.
+
+The error of downsampled data (see rlmtp.downsampler.downsample_error) is a sum of contributions from the segments
+between consecutive retained points. The contributions are cached, so evaluating a new set of retained points only
+computes the segments that changed.
+"""
+import numpy as np
+
+
+class EnergyErrorEvaluator:
+    """ Accumulated relative energy error between the original and downsampled stress-strain data.
+
+    Notes:
+    ======
+        - The accumulated strain axis, the stress, and the cumulative reference energy are computed once.
+        - The squared error of the segment between the retained points a < b is the trapezoidal integral of
+        (y - y_interp)^2 over the pieces a, a+1, ..., b. The interpolated value at x == x[b] is the value of the last
+        retained point with the same x (c), as for np.interp, so each contribution is cached with the key a * n + b
+        and is only valid for the same c.
+        - The cache is stored in sorted arrays and all the lookups of an evaluation are done with np.searchsorted.
+        - error(ind) is equal to downsample_error(d, ind, e_scale=e_scale, s_scale=s_scale) up to round-off.
+    """
+    __slots__ = ('x', 'y', 'cumulative_energy', '_keys', '_c', '_values')
+
+    def __init__(self, d, e_scale=1.0, s_scale=1.0):
+        """ Constructor.
+
+        :param np.array d: (n, 2) Strain-stress data.
+        :param float e_scale: Factor applied to the strain.
+        :param float s_scale: Factor applied to the stress.
+        """
+        e = d[:, 0] * e_scale
+        self.y = np.ascontiguousarray(d[:, 1] * s_scale, dtype=float)
+        self.x = np.concatenate(([0.], np.cumsum(np.abs(np.diff(e)))))
+        y2 = self.y ** 2
+        self.cumulative_energy = np.concatenate(([0.], np.cumsum(np.diff(self.x) * (y2[1:] + y2[:-1]) / 2.)))
+        self.clear()
+
+    def __len__(self):
+        return len(self.x)
+
+    @property
+    def n_cached(self):
+        """ int: Number of segment contributions in the cache. """
+        return len(self._keys)
+
+    def clear(self):
+        """ Removes all the cached segment contributions. """
+        self._keys = np.zeros(0, dtype=np.int64)
+        self._c = np.zeros(0, dtype=np.int64)
+        self._values = np.zeros(0)
+
+    def error(self, ind):
+        """ Returns the accumulated relative energy error of the downsampled data.
+
+        :param list ind: (int) Sorted indices of the retained points.
+        :return float: Error, see rlmtp.downsampler.downsample_error.
+        """
+        ind = np.asarray(ind, dtype=np.int64)
+        last = ind[-1]
+        reference_energy = self.cumulative_energy[last]
+        # Last retained point with the same x as each retained point
+        x_ind = self.x[ind]
+        c = ind[np.searchsorted(x_ind, x_ind, side='right') - 1]
+        squared_error = self.segment_errors(ind[:-1], ind[1:], c[1:]).sum()
+        if ind[0] > 0:
+            squared_error += self._head_error(ind[0], c[0])
+        return np.sqrt(squared_error / reference_energy)
+
+    def segment_errors(self, a, b, c):
+        """ Returns the squared error of the segments between the retained points a and b, using the cache.
+
+        :param np.ndarray a: (m, ) First point of each segment.
+        :param np.ndarray b: (m, ) Last point of each segment, b > a.
+        :param np.ndarray c: (m, ) Last retained point with x == x[b].
+        :return np.ndarray: (m, ) Squared error of each segment.
+        """
+        keys = a * len(self.x) + b
+        errors = np.empty(len(keys))
+        if len(self._keys) > 0:
+            pos = np.minimum(np.searchsorted(self._keys, keys), len(self._keys) - 1)
+            hit = (self._keys[pos] == keys) & (self._c[pos] == c)
+            errors[hit] = self._values[pos[hit]]
+            missing = np.flatnonzero(~hit)
+        else:
+            missing = np.arange(len(keys))
+        if len(missing) > 0:
+            errors[missing] = self._compute_segment_errors(a[missing], b[missing], c[missing])
+            self._insert(keys[missing], c[missing], errors[missing])
+        return errors
+
+    def _insert(self, keys, c, values):
+        """ Adds the entries to the cache, replaces the existing entries with the same keys. """
+        all_keys = np.concatenate((self._keys, keys))
+        order = np.argsort(all_keys, kind='stable')
+        sorted_keys = all_keys[order]
+        # Keep the last of the duplicate keys, i.e., the new entry
+        keep = order[np.append(sorted_keys[1:] != sorted_keys[:-1], True)]
+        self._keys = all_keys[keep]
+        self._c = np.concatenate((self._c, c))[keep]
+        self._values = np.concatenate((self._values, values))[keep]
+
+    def _compute_segment_errors(self, a, b, c):
+        """ Returns the squared error of the segments, all the segments are computed together. """
+        x, y = self.x, self.y
+        lengths = b - a
+        offsets = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+        # Flat array of the pieces [i, i + 1] of all the segments
+        i = np.arange(offsets[-1] + lengths[-1]) + np.repeat(a - offsets, lengths)
+        xa = np.repeat(x[a], lengths)
+        xb = np.repeat(x[b], lengths)
+        ya = np.repeat(y[a], lengths)
+        slope = np.repeat(_safe_slope(x[a], x[b], y[a], y[b]), lengths)
+        yc = np.repeat(y[c], lengths)
+        f0 = (y[i] - _interp_value(x[i], xa, xb, ya, slope, yc)) ** 2
+        f1 = (y[i + 1] - _interp_value(x[i + 1], xa, xb, ya, slope, yc)) ** 2
+        dx = x[i + 1] - x[i]
+        pieces = np.where(dx == 0., 0., dx * (f0 + f1) / 2.)
+        return np.add.reduceat(pieces, offsets)
+
+    def _head_error(self, first, c):
+        """ Returns the squared error before the first retained point, where the interpolation is constant. """
+        x, y = self.x[:first + 1], self.y[:first + 1]
+        y_interp = np.full(len(x), y[-1])
+        y_interp[x == x[-1]] = self.y[c]
+        return np.trapz((y - y_interp) ** 2, x=x)
+
+
+def _safe_slope(xa, xb, ya, yb):
+    """ Returns the slope of the segments, 0 for segments with no length in x. """
+    dx = xb - xa
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(dx == 0., 0., (yb - ya) / dx)
+
+
+def _interp_value(x, xa, xb, ya, slope, yc):
+    """ Returns the interpolated values in the segments, equivalent to np.interp on the retained points. """
+    return np.where(x == xb, yc, slope * (x - xa) + ya)
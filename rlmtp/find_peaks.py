@@ -1,91 +1,322 @@
 """@package find_peaks
 Functions to find peaks in cyclic data.
+
+The data is split into runs of consecutive entries with the same sign (half-cycles), the extreme of each run is found
+with np.maximum.reduceat / np.minimum.reduceat instead of a loop over the entries. The half-cycles can be computed
+once per specimen and reused with a CycleIndex.
 """
+import numpy as np
+
+# Index used before any peak is found, the original implementations return 0 in this case
+_NO_PEAK = -1
+
+
+class CycleIndex:
+    """ Half-cycles of cyclic data, defined by the sign of the stress (or any other signal).
+
+    Notes:
+    ======
+        - Half-cycle k contains the positions starts[k] <= i < ends[k], direction[k] is +1 if the signal is > 0 in
+        the half-cycle and -1 otherwise (i.e., zero and NaN entries are in negative half-cycles).
+        - cycle_max, cycle_min, arg_max, and arg_min are the extreme values of the signal in each half-cycle and their
+        first positions, NaN entries are ignored.
+        - peaks are the indices returned by find_peaks for the signal, strain_peaks are the indices returned by
+        find_peaks2 for the strain (None if the strain is not provided).
+        - All the per-half-cycle quantities are arrays of length n_half_cycles, so analytics over the cycles only
+        require O(n_half_cycles) operations.
+    """
+    __slots__ = ('starts', 'ends', 'direction', 'cycle_max', 'cycle_min', 'arg_max', 'arg_min', 'peaks',
+                 'strain_peaks', 'is_positive_0')
+
+    def __init__(self, y, x=None, is_positive_0=None):
+        """ Constructor.
+
+        :param pd.Series y: Signal that defines the half-cycles, e.g., the true stress.
+        :param pd.Series x: Optional, signal to find the peaks of with find_peaks2, e.g., the true strain.
+        :param bool is_positive_0: Sign assumed before the first entry, if None then the sign of the first entry.
+        """
+        values = np.asarray(y, dtype=float)
+        if is_positive_0 is None:
+            is_positive_0 = y[y.index[0]] > 0.
+        self.is_positive_0 = bool(is_positive_0)
+        self.starts = _run_starts(values)
+        self.ends = np.append(self.starts[1:], len(values))
+        self.direction = np.where(values[self.starts] > 0., 1, -1).astype(np.int8)
+        self.cycle_max, self.cycle_min, self.arg_max, self.arg_min = _run_extremes(values, self.starts)
+        self.peaks = np.asarray(self._peaks(self.extremes(), None, y.index, seed_with_start=False))
+        if x is not None:
+            self.strain_peaks = np.asarray(self.find_peaks2(x))
+        else:
+            self.strain_peaks = None
+
+    @classmethod
+    def from_runs(cls, starts, n, direction, extremes, is_positive_0, x_extremes=None, x_starts=None):
+        """ Returns the CycleIndex from the half-cycles, see CycleIndexBuilder.
+
+        :param np.ndarray starts: (k, ) First position of each half-cycle.
+        :param int n: Number of entries in the signal.
+        :param np.ndarray direction: (k, ) +1 or -1 for each half-cycle.
+        :param list extremes: [np.ndarray] max, min, arg max, and arg min of the signal in each half-cycle.
+        :param bool is_positive_0: Sign assumed before the first entry.
+        :param list x_extremes: Optional, max, min, arg max, and arg min of the strain in each half-cycle.
+        :param np.ndarray x_starts: Optional, strain at the start of each half-cycle.
+        :return CycleIndex: Half-cycles, the labels of the peaks are the positions in the signal.
+        """
+        cycle_index = cls.__new__(cls)
+        cycle_index.is_positive_0 = bool(is_positive_0)
+        cycle_index.starts = np.asarray(starts, dtype=np.int64)
+        cycle_index.ends = np.append(cycle_index.starts[1:], n)
+        cycle_index.direction = np.asarray(direction, dtype=np.int8)
+        cycle_index.cycle_max, cycle_index.cycle_min, cycle_index.arg_max, cycle_index.arg_min = extremes
+        cycle_index.peaks = np.asarray(cycle_index._peaks(extremes, None, None, seed_with_start=False))
+        if x_extremes is not None:
+            cycle_index.strain_peaks = np.asarray(cycle_index._peaks(x_extremes, x_starts, None,
+                                                                     seed_with_start=True))
+        else:
+            cycle_index.strain_peaks = None
+        return cycle_index
+
+    @classmethod
+    def from_data(cls, d):
+        """ Returns the CycleIndex of stress-strain data with the columns 'Sigma_true' and 'e_true'. """
+        return cls(d['Sigma_true'], d['e_true'])
+
+    def __len__(self):
+        return len(self.starts)
+
+    @property
+    def n_half_cycles(self):
+        """ int: Number of half-cycles. """
+        return len(self.starts)
+
+    @property
+    def n_points(self):
+        """ int: Number of entries in the signal. """
+        return int(self.ends[-1])
+
+    def extremes(self):
+        """ Returns [cycle_max, cycle_min, arg_max, arg_min]. """
+        return [self.cycle_max, self.cycle_min, self.arg_max, self.arg_min]
+
+    def half_cycle_of(self, i):
+        """ Returns the half-cycle that contains each of the positions i. """
+        return np.searchsorted(self.starts, i, side='right') - 1
+
+    def find_peaks(self):
+        """ Returns the peaks of the signal, identical to find_peaks(y). """
+        return self.peaks.tolist()
+
+    def find_peaks2(self, x):
+        """ Returns the peaks of x in the half-cycles, identical to find_peaks2(x, y).
+
+        :param pd.Series x: Data to search for peaks, same length as the signal.
+        :return list: [int] Indicies of the peaks in x.
+        """
+        values = np.asarray(x, dtype=float)
+        if len(values) != self.n_points:
+            raise ValueError('x must have the same length as the signal of the CycleIndex.')
+        return self._peaks(_run_extremes(values, self.starts), values[self.starts], x.index, seed_with_start=True)
+
+    def first_exceedance(self, y, threshold, above=True):
+        """ Returns the first position where y is > threshold (above=True) or < threshold (above=False).
+
+        :param pd.Series y: Signal used to construct the CycleIndex.
+        :param float threshold: Threshold on the signal.
+        :param bool above: Direction of the exceedance.
+        :return int: Position of the first entry that exceeds the threshold, or None if no entry exceeds it.
+
+        - Only the first half-cycle that exceeds the threshold is searched.
+        """
+        if above:
+            k = np.flatnonzero(self.cycle_max > threshold)
+        else:
+            k = np.flatnonzero(self.cycle_min < threshold)
+        if len(k) == 0:
+            return None
+        start = int(self.starts[k[0]])
+        values = np.asarray(y.iloc[start:int(self.ends[k[0]])], dtype=float)
+        if above:
+            return start + int(np.argmax(values > threshold))
+        else:
+            return start + int(np.argmax(values < threshold))
 
+    def _peaks(self, extremes, start_values, index, seed_with_start):
+        """ Returns the peaks of the data in the half-cycles as labels of index.
 
-def find_peaks(x):
+        :param list extremes: [np.ndarray] max, min, arg max, and arg min of the data in each half-cycle.
+        :param np.ndarray start_values: (k, ) Data at the start of each half-cycle, only used if seed_with_start.
+        :param pd.Index index: Labels of the data, if None then the labels are the positions.
+        :param bool seed_with_start: If True, the extreme of each half-cycle after the first is only updated by entries
+            strictly beyond the first entry of the half-cycle (find_peaks2), else by entries strictly beyond 0
+            (find_peaks).
+        :return list: [int] Peaks, the last entry is n - 1.
+
+        Notes:
+        ======
+            - Reproduces the strict comparisons of the running min/max in the original loop implementations: the first
+            occurrence of the extreme is used, NaN entries are never extremes, and a half-cycle without an update
+            keeps the peak of the previous half-cycle in the same direction.
+        """
+        n = self.n_points
+        starts = self.starts
+        run_positive = self.direction > 0
+        run_max, run_min, arg_max, arg_min = extremes
+        # Seed of the running min/max in each half-cycle
+        seeds = np.zeros(len(starts))
+        leading_switch = bool(run_positive[0]) != self.is_positive_0
+        if seed_with_start:
+            seeds[:] = start_values
+            if not leading_switch:
+                seeds[0] = 0.
+        found_max = run_positive & (run_max > seeds)
+        found_min = ~run_positive & (run_min < seeds)
+        # Latest max (min) up to each half-cycle, the indices increase so a running maximum forward fills them
+        max_ind = np.maximum.accumulate(np.where(found_max, arg_max, _NO_PEAK))
+        min_ind = np.maximum.accumulate(np.where(found_min, arg_min, _NO_PEAK))
+        peaks = np.where(run_positive, max_ind, min_ind)[:-1].tolist()
+        if leading_switch:
+            peaks.insert(0, _NO_PEAK)
+        # Add the last peak
+        current_min = run_min[-1] if found_min[-1] else seeds[-1]
+        if run_positive[-1] or current_min == 0.:
+            peaks.append(int(max_ind[-1]))
+        else:
+            peaks.append(int(min_ind[-1]))
+        # Convert to labels, before any peak is found the original implementations return 0
+        if index is None:
+            peaks = [0 if p == _NO_PEAK else int(p) for p in peaks]
+        else:
+            labels = np.asarray(index)
+            peaks = [0 if p == _NO_PEAK else _to_python(labels[p]) for p in peaks]
+        # Add the last point
+        peaks.append(n - 1)
+        return peaks
+
+
+class CycleIndexBuilder:
+    """ Builds a CycleIndex from consecutive chunks of the stress and strain.
+
+    Notes:
+    ======
+        - Only the extremes of each half-cycle are stored, so the memory is O(n_half_cycles) and does not depend on the
+        length of the chunks. A half-cycle that continues in the next chunk is merged with the first half-cycle of the
+        next chunk, the first occurrence of an extreme is kept as in CycleIndex.
+        - build() returns a CycleIndex equal to CycleIndex(y, x) for the concatenated chunks with a RangeIndex.
+    """
+    __slots__ = ('_starts', '_direction', '_y', '_x', '_x_starts', '_n', 'is_positive_0')
+
+    def __init__(self):
+        self._starts = []
+        self._direction = []
+        self._y = [[] for _ in range(4)]
+        self._x = [[] for _ in range(4)]
+        self._x_starts = []
+        self._n = 0
+        self.is_positive_0 = None
+
+    def update(self, y, x):
+        """ Adds the next chunk of the signal y (e.g., the true stress) and strain x. """
+        y = np.asarray(y, dtype=float)
+        x = np.asarray(x, dtype=float)
+        if len(y) == 0:
+            return self
+        if self.is_positive_0 is None:
+            self.is_positive_0 = bool(y[0] > 0.)
+        starts = _run_starts(y)
+        direction = np.where(y[starts] > 0., 1, -1).astype(np.int8)
+        y_extremes = _run_extremes(y, starts)
+        x_extremes = _run_extremes(x, starts)
+        for e in y_extremes[2:] + x_extremes[2:]:
+            e += self._n
+        first = 0
+        if len(self._starts) > 0 and self._direction[-1][-1] == direction[0]:
+            # The last half-cycle continues in this chunk
+            _merge_last(self._y, y_extremes)
+            _merge_last(self._x, x_extremes)
+            first = 1
+        if first < len(starts):
+            # Only non-empty runs are stored, so the last stored run is always the last half-cycle
+            self._starts.append(starts[first:] + self._n)
+            self._direction.append(direction[first:])
+            for stored, e in zip(self._y + self._x, y_extremes + x_extremes):
+                stored.append(e[first:])
+            self._x_starts.append(x[starts[first:]])
+        self._n += len(y)
+        return self
+
+    def build(self):
+        """ Returns the CycleIndex of all the chunks. """
+        def cat(arrays):
+            return np.concatenate(arrays)
+        return CycleIndex.from_runs(cat(self._starts), self._n, cat(self._direction), [cat(e) for e in self._y],
+                                    self.is_positive_0, [cat(e) for e in self._x], cat(self._x_starts))
+
+
+def _merge_last(stored, extremes):
+    """ Merges the first run of extremes into the last stored run, the earlier extreme is kept on ties. """
+    run_max, run_min, arg_max, arg_min = [e[0] for e in extremes]
+    if run_max > stored[0][-1][-1]:
+        stored[0][-1][-1] = run_max
+        stored[2][-1][-1] = arg_max
+    if run_min < stored[1][-1][-1]:
+        stored[1][-1][-1] = run_min
+        stored[3][-1][-1] = arg_min
+
+
+def _run_starts(values):
+    """ Returns the first position of each run of entries with the same sign, zero and NaN entries are negative. """
+    is_positive = values > 0.
+    return np.concatenate(([0], np.flatnonzero(is_positive[1:] != is_positive[:-1]) + 1))
+
+
+def _run_extremes(values, starts):
+    """ Returns the max, min, and first positions of the max and min of values in each run, NaN entries are ignored.
+
+    :param np.ndarray values: (n, ) Data.
+    :param np.ndarray starts: (k, ) First position of each run.
+    :return list: [np.ndarray, np.ndarray, np.ndarray, np.ndarray] (k, ) max, min, arg max, arg min.
+    """
+    n = len(values)
+    positions = np.arange(n)
+    run_lengths = np.diff(np.append(starts, n))
+    is_nan = np.isnan(values)
+    max_values = np.where(is_nan, -np.inf, values)
+    min_values = np.where(is_nan, np.inf, values)
+    run_max = np.maximum.reduceat(max_values, starts)
+    run_min = np.minimum.reduceat(min_values, starts)
+    arg_max = np.minimum.reduceat(np.where(max_values == np.repeat(run_max, run_lengths), positions, n), starts)
+    arg_min = np.minimum.reduceat(np.where(min_values == np.repeat(run_min, run_lengths), positions, n), starts)
+    return [run_max, run_min, arg_max, arg_min]
+
+
+def _to_python(label):
+    """ Returns the NumPy scalar label as a Python scalar, as when iterating over a pd.Index. """
+    if isinstance(label, np.generic):
+        return label.item()
+    return label
+
+
+def find_peaks(x, cycle_index=None):
     """ Gets the 'peaks' in each cycle of the data x.
     :param pd.Series x: Data to search for peaks.
+    :param CycleIndex cycle_index: Optional, half-cycles of x, if provided then x is not scanned again.
     :return list: [int] Indicies of the peaks in x.
     """
+    if cycle_index is None:
+        cycle_index = CycleIndex(x)
+    return cycle_index.find_peaks()
 
-    current_max = 0.
-    max_ind = 0
-    current_min = 0.
-    min_ind = 0
-    if x[x.index[0]] > 0.:
-        is_positive = True
-    else:
-        is_positive = False
-    peaks = []
-    # Keep track of the min/max and after cross-axis then add the min/max as a peak
-    for i, xi in x.items():
-        if xi > 0.:
-            if not is_positive:
-                peaks.append(min_ind)
-                is_positive = True
-                current_min = 0.
-            if xi > current_max:
-                current_max = xi
-                max_ind = i
-        else:
-            if is_positive:
-                peaks.append(max_ind)
-                is_positive = False
-                current_max = 0.
-            if xi < current_min:
-                current_min = xi
-                min_ind = i
-    # Add the last peak + the last point
-    if current_min == 0.:
-        peaks.append(max_ind)
-    else:
-        peaks.append(min_ind)
-    peaks.append(len(x) - 1)
-    return peaks
-
-
-def find_peaks2(x, y):
+
+def find_peaks2(x, y, cycle_index=None):
     """ Gets the 'peaks' in each cycle of the data x with cycles defined by y.
     :param pd.Series x: Data to search for peaks.
     :param pd.Series y: Data to define cycles.
+    :param CycleIndex cycle_index: Optional, half-cycles of y, if provided then y is not scanned again.
     :return list: [int] Indicies of the peaks in x.
     """
-
-    current_max = 0.
-    max_ind = 0
-    current_min = 0.
-    min_ind = 0
-    if y[y.index[0]] > 0.:
-        is_positive = True
-    else:
-        is_positive = False
-    peaks = []
-    # Keep track of the min/max and after cross-axis then add the min/max as a peak
-    for i, xi in x.items():
-        yi = y.loc[i]
-        if yi > 0.:
-            if not is_positive:
-                peaks.append(min_ind)
-                is_positive = True
-                current_min = 0.
-                current_max = xi
-            if xi > current_max:
-                current_max = xi
-                max_ind = i
-        else:
-            if is_positive:
-                peaks.append(max_ind)
-                is_positive = False
-                current_max = 0.
-                current_min = xi
-            if xi < current_min:
-                current_min = xi
-                min_ind = i
-    # Add the last peak + the last point
-    if current_min == 0.:
-        peaks.append(max_ind)
-    else:
-        peaks.append(min_ind)
-    peaks.append(len(x) - 1)
-    return peaks
+    if cycle_index is None:
+        is_positive_0 = y[y.index[0]] > 0.
+        if not y.index.equals(x.index):
+            y = y.loc[x.index]
+        cycle_index = CycleIndex(y, is_positive_0=is_positive_0)
+    return cycle_index.find_peaks2(x)
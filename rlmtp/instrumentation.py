@@ -0,0 +1,197 @@
+"""@package instrumentation
+Timing and memory measurements of the processing stages.
+
+The stages of rlmtp.processing.process_specimen_data are wrapped in timed_stage, which records the wall time, CPU time,
+peak resident memory, and (optionally) the peak traced memory of the stage together with point counts. Nothing is
+recorded unless a Recorder is active, see recording, so the instrumentation has no effect on normal runs.
+
+The records are dictionaries that can be written as JSON lines and summarized for a whole batch of specimens:
+>>> recorder = Recorder(specimen='LP1_S1', output_file='timings.jsonl')
+>>> process_specimen_data(input_dir, output_dir, recorder=recorder)
+>>> print_summary(read_records('timings.jsonl'))
+"""
+import json
+import time
+import contextlib
+import tracemalloc
+import pandas as pd
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows, the peak resident memory is not recorded
+    resource = None
+
+# Recorder that receives the records of timed_stage and record_event
+_active = None
+
+
+class Recorder:
+    """ Collects the records of the stages and events.
+
+    Notes:
+    ======
+        - Each stage record contains: type='stage', specimen, stage, parent (enclosing stage or None), wall_s, cpu_s,
+        max_rss_mb (peak resident memory of the process so far), traced_peak_mb (peak memory allocated by Python and
+        numpy during the stage, only with trace_memory=True), and the information added by the stage (e.g., n_points).
+        - Each event record contains: type='event', specimen, event, stage (enclosing stage or None), and the
+        information of the event.
+        - The records of a stage are added when it ends, so nested stages come before the stage that contains them.
+        - tracemalloc slows down the processing, it is only used with trace_memory=True.
+    """
+    __slots__ = ('specimen', 'output_file', 'trace_memory', 'records', '_stack')
+
+    def __init__(self, specimen=None, output_file=None, trace_memory=False):
+        """ Constructor.
+
+        :param str specimen: Name of the specimen added to the records.
+        :param str output_file: If not None, the records are appended to this file as JSON lines.
+        :param bool trace_memory: If True, then the peak traced memory of each stage is recorded.
+        """
+        self.specimen = specimen
+        self.output_file = output_file
+        self.trace_memory = trace_memory
+        self.records = []
+        # [name, traced peak of the nested stages] of the stages that are running
+        self._stack = []
+
+    @contextlib.contextmanager
+    def stage(self, name, **info):
+        """ Context manager that records the stage, yields a dict to add information to the record. """
+        info = dict(info)
+        parent = self._stack[-1][0] if self._stack else None
+        if self.trace_memory:
+            # Keep the peak of the enclosing stage before it is reset
+            if self._stack:
+                self._stack[-1][1] = max(self._stack[-1][1], tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+        self._stack.append([name, 0])
+        t0 = time.perf_counter()
+        c0 = time.process_time()
+        try:
+            yield info
+        finally:
+            wall = time.perf_counter() - t0
+            cpu = time.process_time() - c0
+            _, nested_peak = self._stack.pop()
+            record = {'type': 'stage', 'specimen': self.specimen, 'stage': name, 'parent': parent,
+                      'wall_s': wall, 'cpu_s': cpu, 'max_rss_mb': max_rss_mb()}
+            if self.trace_memory:
+                peak = max(tracemalloc.get_traced_memory()[1], nested_peak)
+                record['traced_peak_mb'] = peak / 2. ** 20
+                if self._stack:
+                    self._stack[-1][1] = max(self._stack[-1][1], peak)
+            record.update(info)
+            self._add(record)
+
+    def event(self, name, **info):
+        """ Records an event in the current stage, e.g., an iteration of a search. """
+        record = {'type': 'event', 'specimen': self.specimen, 'event': name,
+                  'stage': self._stack[-1][0] if self._stack else None}
+        record.update(info)
+        self._add(record)
+
+    def _add(self, record):
+        self.records.append(record)
+        if self.output_file is not None:
+            write_records([record], self.output_file)
+
+
+@contextlib.contextmanager
+def recording(recorder):
+    """ Context manager that makes recorder receive the records of timed_stage and record_event.
+
+    - If recorder is None, then nothing is recorded.
+    """
+    global _active
+    previous = _active
+    _active = recorder
+    started_tracing = recorder is not None and recorder.trace_memory and not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+    try:
+        yield recorder
+    finally:
+        if started_tracing:
+            tracemalloc.stop()
+        _active = previous
+
+
+@contextlib.contextmanager
+def timed_stage(name, **info):
+    """ Records the stage with the active Recorder, yields a dict to add information to the record.
+
+    - Does nothing if no Recorder is active, the dict is still yielded.
+    """
+    if _active is None:
+        yield dict(info)
+    else:
+        with _active.stage(name, **info) as stage_info:
+            yield stage_info
+
+
+def record_event(name, **info):
+    """ Records the event with the active Recorder, does nothing if no Recorder is active. """
+    if _active is not None:
+        _active.event(name, **info)
+    return
+
+
+def max_rss_mb():
+    """ Returns the peak resident memory of the process in MB, or None if it is not available. """
+    if resource is None:
+        return None
+    # ru_maxrss is in kB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.
+
+
+def write_records(records, file):
+    """ Appends the records to file as JSON lines. """
+    with open(file, 'a') as f:
+        for r in records:
+            f.write(json.dumps(r) + '\n')
+    return
+
+
+def read_records(file):
+    """ Returns the records in the JSON lines file. """
+    with open(file, 'r') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def summarize(records):
+    """ Returns the totals of each stage over all the specimens.
+
+    :param list records: (dict) Records of one or more specimens.
+    :return pd.DataFrame: Index is the stage, columns are count, wall_s, cpu_s, max_wall_s, max_rss_mb, and
+        traced_peak_mb if recorded. Sorted by wall_s, largest first.
+    """
+    stages = pd.DataFrame([r for r in records if r['type'] == 'stage'])
+    if len(stages) == 0:
+        return pd.DataFrame()
+    aggregations = {'count': ('wall_s', 'size'), 'wall_s': ('wall_s', 'sum'), 'cpu_s': ('cpu_s', 'sum'),
+                    'max_wall_s': ('wall_s', 'max'), 'max_rss_mb': ('max_rss_mb', 'max')}
+    if 'traced_peak_mb' in stages.columns:
+        aggregations['traced_peak_mb'] = ('traced_peak_mb', 'max')
+    return stages.groupby('stage').agg(**aggregations).sort_values('wall_s', ascending=False)
+
+
+def print_summary(records, n_top=5, total_stage='process_specimen'):
+    """ Prints the totals of each stage and the specimens that took the longest.
+
+    :param list records: (dict) Records of one or more specimens.
+    :param int n_top: Number of specimens to list.
+    :param str total_stage: Stage that contains all the processing of a specimen.
+    """
+    summary = summarize(records)
+    if len(summary) == 0:
+        print('No stages were recorded.')
+        return
+    print('Time and memory of each stage:')
+    print(summary.to_string(float_format=lambda x: '{0:0.2f}'.format(x)))
+    totals = [r for r in records if r['type'] == 'stage' and r['stage'] == total_stage]
+    if len(totals) > 0:
+        print('Slowest specimens:')
+        for r in sorted(totals, key=lambda r: r['wall_s'], reverse=True)[:n_top]:
+            print('\t {0}: {1:0.2f} s'.format(r['specimen'], r['wall_s']))
+    return
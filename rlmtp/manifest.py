@@ -0,0 +1,102 @@
+"""@package manifest
+Manifests of the processed data for incremental rebuilds.
+
+Each processed data file has a manifest next to it ([output_file_name].manifest.json) that records what the output
+was generated from: the digests of the input files, the processing and downsampling parameters, and the rlmtp
+version. An output is only up-to-date if the manifest of the current inputs is identical to the stored manifest, so
+changing the raw data, the downsampler_props.txt file, or the parameters rebuilds exactly the affected specimens.
+"""
+import os
+import json
+import datetime
+from . import __version__
+from .readers import READER_VERSION
+from .data_cache import file_digest, cached_file_digest, _atomic_write_text
+
+# Increment when a change to the processing changes the processed data, invalidates all the manifests
+PROCESSING_VERSION = 1
+MANIFEST_EXTENSION = '.manifest.json'
+# Entries of the manifest that must match for the output to be up-to-date
+FINGERPRINT_KEYS = ['inputs', 'parameters', 'rlmtp_version', 'processing_version', 'reader_version']
+
+
+def manifest_file_name(output_file):
+    """ Returns the path of the manifest for the processed data file. """
+    return os.path.splitext(output_file)[0] + MANIFEST_EXTENSION
+
+
+def build_manifest(input_files, parameters, cache_dir=None):
+    """ Returns the manifest of an output generated from the input files with the parameters.
+
+    :param dict input_files: {name: path} Input files of the output, None paths are skipped.
+    :param dict parameters: Parameters of the processing, must be json serializable.
+    :param str cache_dir: Cache directory of the digests, see rlmtp.data_cache.cached_file_digest. If None, then the
+        files are hashed on each call.
+    :return dict: Manifest.
+
+    - The files are identified by their name and SHA-1 digest, so moving the database does not invalidate the
+    manifests.
+    - With a cache directory the files are only hashed again if their size or modification time changed.
+    """
+    inputs = dict()
+    for name, file in input_files.items():
+        if file is not None:
+            inputs[name] = {'file': os.path.basename(file), 'sha1': _digest(file, cache_dir)}
+    return {
+        'inputs': inputs,
+        # Round-trip so that the parameters compare equal to the ones read from file
+        'parameters': json.loads(json.dumps(parameters)),
+        'rlmtp_version': __version__,
+        'processing_version': PROCESSING_VERSION,
+        'reader_version': READER_VERSION
+    }
+
+
+def _digest(file, cache_dir):
+    """ Returns the digest of file, memoized in cache_dir if possible. """
+    if cache_dir is None:
+        return file_digest(file)
+    try:
+        return cached_file_digest(file, cache_dir)
+    except OSError:
+        # E.g., the database is read-only
+        return file_digest(file)
+
+
+def read_manifest(output_file):
+    """ Returns the manifest stored for the processed data file, or None if it does not exist or is corrupt. """
+    try:
+        with open(manifest_file_name(output_file), 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def write_manifest(output_file, manifest):
+    """ Stores the manifest for the processed data file. """
+    manifest = dict(manifest)
+    manifest['created'] = datetime.datetime.now().isoformat()
+    _atomic_write_text(manifest_file_name(output_file), json.dumps(manifest, indent=2, sort_keys=True))
+    return
+
+
+def stale_reason(output_file, manifest):
+    """ Returns why the processed data file needs to be rebuilt, or None if it is up-to-date.
+
+    :param str output_file: Path to the processed data file.
+    :param dict manifest: Manifest of the current inputs, see build_manifest.
+    :return str: Reason for the rebuild, or None.
+    """
+    if not os.path.isfile(output_file):
+        return 'no output'
+    stored = read_manifest(output_file)
+    if stored is None:
+        return 'no manifest'
+    changed_inputs = sorted(name for name in set(manifest['inputs']) | set(stored.get('inputs', dict()))
+                            if manifest['inputs'].get(name) != stored.get('inputs', dict()).get(name))
+    if len(changed_inputs) > 0:
+        return 'changed inputs: {0}'.format(', '.join(changed_inputs))
+    for key in FINGERPRINT_KEYS[1:]:
+        if manifest[key] != stored.get(key):
+            return 'changed {0}'.format(key.replace('_', ' '))
+    return None
@@ -1,23 +1,65 @@
+import contextlib
 import matplotlib as mpl
-import matplotlib.pyplot as plt
 
 MPL_LINE_WIDTH = 0.55
 MPL_FONT_SIZE = 9.0
 MPL_LEG_FONT_SIZE = 8.0
+# Text rendering modes: 'mathtext' uses the fast built-in renderer, 'latex' runs LaTeX for each figure
+TEXT_MODES = ('mathtext', 'latex')
+DEFAULT_TEXT_MODE = 'mathtext'
 
-mpl.rcParams['axes.linewidth'] = 0.5
-mpl.rcParams['xtick.major.width'] = 0.25
-mpl.rcParams['xtick.minor.width'] = 0.25
-mpl.rcParams['xtick.labelsize'] = MPL_LEG_FONT_SIZE
-mpl.rcParams['ytick.major.width'] = 0.25
-mpl.rcParams['ytick.minor.width'] = 0.25
-mpl.rcParams['ytick.labelsize'] = MPL_LEG_FONT_SIZE
-
-plt.rc('text', usetex=True)
-plt.rc('font', **{'family': 'serif', 'serif': 'Computer Modern Roman', 'size': MPL_FONT_SIZE})
-plt.rc('lines', **{'linewidth': MPL_LINE_WIDTH})
-plt.rc('axes', **{'labelsize': MPL_FONT_SIZE})
-plt.rc('legend', **{'frameon': False, 'fontsize': MPL_LEG_FONT_SIZE})
+# Style of the figures, only applied while plotting, see plot_style
+MPL_STYLE = {
+    'axes.linewidth': 0.5,
+    'xtick.major.width': 0.25,
+    'xtick.minor.width': 0.25,
+    'xtick.labelsize': MPL_LEG_FONT_SIZE,
+    'ytick.major.width': 0.25,
+    'ytick.minor.width': 0.25,
+    'ytick.labelsize': MPL_LEG_FONT_SIZE,
+    'lines.linewidth': MPL_LINE_WIDTH,
+    'axes.labelsize': MPL_FONT_SIZE,
+    'legend.frameon': False,
+    'legend.fontsize': MPL_LEG_FONT_SIZE,
+    'font.family': 'serif',
+    'font.size': MPL_FONT_SIZE
+}
+TEXT_STYLES = {
+    'latex': {'text.usetex': True, 'font.serif': ['Computer Modern Roman']},
+    'mathtext': {'text.usetex': False, 'font.serif': ['DejaVu Serif'], 'mathtext.fontset': 'cm'}
+}
+
+# Text mode used by plot_style
+_text_mode = DEFAULT_TEXT_MODE
+
+
+def set_text_mode(mode):
+    """ Sets how the text of the figures is rendered.
+
+    :param str mode: 'mathtext' for bulk processing (no external programs, Computer Modern math), or 'latex' for
+        publication figures (requires a LaTeX installation, each figure runs LaTeX).
+    """
+    global _text_mode
+    if mode not in TEXT_MODES:
+        raise ValueError('Unknown text mode "{0}", options are {1}.'.format(mode, TEXT_MODES))
+    _text_mode = mode
+    return
+
+
+@contextlib.contextmanager
+def plot_style(text_mode=None):
+    """ Context manager that applies the style of the figures, the previous rcParams are restored at the end.
+
+    :param str text_mode: 'mathtext' or 'latex', if None then the mode of set_text_mode.
+    """
+    if text_mode is None:
+        text_mode = _text_mode
+    if text_mode not in TEXT_MODES:
+        raise ValueError('Unknown text mode "{0}", options are {1}.'.format(text_mode, TEXT_MODES))
+    style = dict(MPL_STYLE)
+    style.update(TEXT_STYLES[text_mode])
+    with mpl.rc_context(style):
+        yield
 
 
 def cm2inch(value):
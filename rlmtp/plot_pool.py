@@ -0,0 +1,125 @@
+"""@package plot_pool
+Renders the figures of the processed data in background processes.
+
+Saving the PDF figures takes a large part of the time to process a specimen. With an active PlotPool, the figures of
+rlmtp.processing.generate_output are rendered by worker processes (Agg backend, one reused figure per worker) while
+the processing continues:
+>>> with PlotPool(jobs=2) as pool, plotting_pool(pool):
+>>>     for d in specimen_dirs:
+>>>         process_specimen_data(d, output_dir)
+The pool waits for all the figures when it is closed. Without an active pool the figures are rendered immediately.
+"""
+import contextlib
+import warnings
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from .mpl_import import DEFAULT_TEXT_MODE
+
+# PlotPool that receives the figures of submit_plot
+_active = None
+
+
+def _init_worker(text_mode):
+    """ Selects the Agg backend and the text mode in a worker process. """
+    import matplotlib
+    matplotlib.use('Agg')
+    from .mpl_import import set_text_mode
+    set_text_mode(text_mode)
+
+
+def _render(plotter, data, output_dir, pre_name):
+    plotter(data, output_dir, pre_name)
+    return pre_name
+
+
+class PlotPool:
+    """ Worker processes that render the figures.
+
+    Notes:
+    ======
+        - At most 2 * jobs figures are waiting at a time, submit blocks until the oldest figure is rendered so that
+        the data of the figures waiting is bounded.
+        - A figure that fails raises a warning when it is collected, it does not stop the other figures. The errors
+        are kept in errors as [pre_name, message].
+    """
+    __slots__ = ('jobs', 'text_mode', 'errors', '_executor', '_pending')
+
+    def __init__(self, jobs=1, text_mode=DEFAULT_TEXT_MODE):
+        """ Constructor.
+
+        :param int jobs: Number of worker processes.
+        :param str text_mode: Text rendering of the figures, 'mathtext' or 'latex', see mpl_import.set_text_mode.
+        """
+        self.jobs = jobs
+        self.text_mode = text_mode
+        self.errors = []
+        self._executor = ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker, initargs=(text_mode,))
+        self._pending = deque()
+
+    def submit(self, plotter, data, output_dir, pre_name):
+        """ Renders the figure in a worker process, see the plotters in rlmtp.plotting for the parameters.
+
+        - plotter must be a module-level function so that it can be sent to the workers.
+        """
+        while len(self._pending) >= 2 * self.jobs:
+            self._collect(self._pending.popleft())
+        self._pending.append([pre_name, self._executor.submit(_render, plotter, data, output_dir, pre_name)])
+        return
+
+    def _collect(self, pending):
+        pre_name, future = pending
+        try:
+            future.result()
+        except Exception as e:
+            message = '{0}: {1}'.format(type(e).__name__, e)
+            self.errors.append([pre_name, message])
+            warnings.warn('Could not plot {0}, {1}'.format(pre_name, message))
+        return
+
+    def wait(self):
+        """ Waits for all the figures that were submitted. """
+        while self._pending:
+            self._collect(self._pending.popleft())
+        return
+
+    def close(self):
+        """ Waits for all the figures and stops the workers. """
+        self.wait()
+        self._executor.shutdown()
+        return
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
+        return False
+
+
+@contextlib.contextmanager
+def plotting_pool(pool):
+    """ Context manager that makes the figures of submit_plot be rendered by pool.
+
+    - If pool is None, then the figures are rendered immediately.
+    """
+    global _active
+    previous = _active
+    _active = pool
+    try:
+        yield pool
+    finally:
+        _active = previous
+
+
+def active_pool():
+    """ Returns the active PlotPool, or None if the figures are rendered immediately. """
+    return _active
+
+
+def submit_plot(plotter, data, output_dir, pre_name):
+    """ Renders the figure with the active PlotPool, or immediately if no pool is active. """
+    if _active is None:
+        plotter(data, output_dir, pre_name)
+    else:
+        _active.submit(plotter, data, output_dir, pre_name)
+    return
@@ -1,89 +1,286 @@
 """@package plotting
 Functions to plot the stress-strain and temperature-time according to the pre-specified figure format.
+
+The figures are drawn on a figure that is reused by all the plotters of a thread and rendered with the Agg canvas. The
+figure is not managed by pyplot, so no figures are left open and no GUI backend is needed. The text is rendered with
+mathtext by default, use set_text_mode('latex') for publication figures. The style is only applied while a figure is
+drawn, the rcParams of matplotlib are not changed.
+
+A figure is only rendered if its file does not exist, or if the plotted arrays or the style changed since it was
+rendered: the hash of the arrays and the style is kept in output_dir/.plot_cache. Many specimens can be plotted in one
+multi-page PDF with batch_plotter. Curves with many points (e.g., the unreduced data) are decimated to the points that
+change the figure at the resolution of rlmtp.decimation.
 """
 
 import os
+import json
+import functools
+import hashlib
+import threading
 import numpy as np
 import warnings
-from .mpl_import import *
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.backends.backend_pdf import PdfPages
+from .mpl_import import mpl, plot_style, set_text_mode
 from .yield_properties import yield_properties
+from .decimation import display_indices, DECIMATION_THRESHOLD, DECIMATION_DPI
+
+# Figure reused by the plotters, one per thread
+_local = threading.local()
+# Increase if the plotters change, so that all the figures are rendered again
+PLOT_VERSION = 2
+# Style parameters that change the figures
+STYLE_KEYS = ['text.usetex', 'font.family', 'font.serif', 'font.size', 'mathtext.fontset', 'lines.linewidth',
+              'axes.linewidth', 'axes.labelsize', 'xtick.labelsize', 'ytick.labelsize', 'xtick.major.width',
+              'ytick.major.width', 'figure.figsize']
+# Directory in the output directory with the render keys of the figures
+PLOT_CACHE_DIR = '.plot_cache'
+
+
+def reused_figure():
+    """ Returns the cleared figure of the current thread, with the default size of the figures. """
+    fig = getattr(_local, 'figure', None)
+    if fig is None:
+        fig = Figure()
+        FigureCanvasAgg(fig)
+        _local.figure = fig
+    fig.clear()
+    fig.set_size_inches(mpl.rcParams['figure.figsize'])
+    return fig
 
 
-def safe_savefig(path):
-    """ Saves the figure to path, but raises a warning if the file cannot be overwritten. """
+def styled(func):
+    """ Decorator that draws the figures of func with the style of the figures, see mpl_import.plot_style. """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with plot_style():
+            return func(*args, **kwargs)
+    return wrapper
+
+
+def safe_savefig(path, fig=None):
+    """ Saves the figure to path, but raises a warning if the file cannot be overwritten.
+
+    :param str path: Output file.
+    :param matplotlib.figure.Figure fig: Figure to save, if None then the current pyplot figure.
+    :return bool: True if the figure was saved, False otherwise.
+    """
     try:
-        plt.savefig(path)
+        if fig is None:
+            import matplotlib.pyplot as plt
+            plt.savefig(path)
+        else:
+            fig.savefig(path)
     except PermissionError:
         warnings.warn('Cannot write the file {0}, it''s likely already open!'.format(path))
+        return False
+    return True
+
+
+def render_key(name, arrays, titles=()):
+    """ Returns the hash of the plotted arrays and the style of the figures.
+
+    :param str name: Name of the plot, e.g., the kind of figure.
+    :param list arrays: (array-like) Values that are plotted.
+    :param list titles: (str) Titles of the figures.
+    :return str: Hex digest that changes if any of the values, the titles, or the style changes.
+    """
+    h = hashlib.sha1()
+    style = dict((k, mpl.rcParams[k]) for k in STYLE_KEYS)
+    header = [PLOT_VERSION, mpl.__version__, DECIMATION_THRESHOLD, DECIMATION_DPI, name, list(titles), style]
+    h.update(json.dumps(header, default=str).encode())
+    for a in arrays:
+        a = np.ascontiguousarray(np.asarray(a, dtype=np.float64))
+        h.update(str(a.shape).encode())
+        h.update(a.tobytes())
+    return h.hexdigest()
+
+
+def _key_file(out_path):
+    directory, file_name = os.path.split(out_path)
+    return os.path.join(directory, PLOT_CACHE_DIR, file_name + '.key')
+
+
+def is_up_to_date(out_path, key):
+    """ Returns True if out_path exists and was rendered from the same key, see render_key. """
+    if not os.path.isfile(out_path):
+        return False
+    try:
+        with open(_key_file(out_path), 'r') as f:
+            return f.read().strip() == key
+    except FileNotFoundError:
+        return False
+
+
+def _write_key(out_path, key):
+    key_file = _key_file(out_path)
+    os.makedirs(os.path.dirname(key_file), exist_ok=True)
+    with open(key_file, 'w') as f:
+        f.write(key)
     return
 
 
+def decimated(arrays):
+    """ Returns the arrays [x, y, ...] with only the points needed to draw the curve (x, y), see rlmtp.decimation.
+
+    - The arrays are returned unchanged if they have no more than DECIMATION_THRESHOLD points.
+    """
+    i = display_indices(arrays[0], arrays[1])
+    if len(i) == len(arrays[0]):
+        return arrays
+    return [np.asarray(a)[i] for a in arrays]
+
+
+def _stress_strain_arrays(data):
+    return [data['e_true'], data['Sigma_true']]
+
+
+def _draw_stress_strain(ax, e, s):
+    ax.plot(e, s, c='0.15', label='Test', lw=0.5)
+    ax.set_xlabel(r'True Strain, $\varepsilon$')
+    ax.set_ylabel(r'True Stress, $\sigma$ [MPa]')
+
+
+def _strain_rate_arrays(data):
+    time_name = 'C_1_Temps[s]' if 'C_1_Temps[s]' in data else 'Time[s]'
+    accum_strain = np.cumsum(np.abs(np.diff(data['e_true'])))
+    strain_rate = np.diff(data['e_true']) / np.diff(data[time_name])
+    return [accum_strain, strain_rate]
+
+
+def _draw_strain_rate(ax, accum_strain, strain_rate):
+    ax.plot(accum_strain, strain_rate, c='0.15', label='Test', lw=0.5)
+    ax.set_xlabel(r'Accumulated Strain, $\int |\dot{\varepsilon}| \mathrm{d}t$')
+    ax.set_ylabel(r'Strain Rate, $\dot{\varepsilon}$ [s$^{-1}$]')
+
+
+def _temp_strain_arrays(data):
+    return [data['e_true'], data['Temperature[C]']]
+
+
+def _draw_temp_strain(ax, e, temperature):
+    ax.plot(e, temperature, c='0.15', label='Test', lw=0.5)
+    ax.set_xlabel(r'True Strain, $\varepsilon$')
+    ax.set_ylabel(r'Temperature, $T$ [$^\circ$C]')
+
+
+def _temp_time_arrays(data):
+    time_name = 'C_1_Temps[s]' if 'C_1_Temps[s]' in data else 'Time[s]'
+    return [data[time_name], data['Temperature[C]']]
+
+
+def _draw_temp_time(ax, t, temperature):
+    ax.plot(t, temperature, c='0.15', label='Test', lw=0.5)
+    ax.set_xlabel(r'Time, $t$ [s]')
+    ax.set_ylabel(r'Temperature, $T$ [$^\circ$C]')
+
+
+# Kind of figure: [file name suffix, function that returns the plotted arrays, function that draws the arrays]
+PLOT_KINDS = {
+    'stress_strain': ['stress_strain_plot.pdf', _stress_strain_arrays, _draw_stress_strain],
+    'strain_rate': ['stress_rate_plot.pdf', _strain_rate_arrays, _draw_strain_rate],
+    'temp_strain': ['temperature_strain_plot.pdf', _temp_strain_arrays, _draw_temp_strain],
+    'temp_time': ['temperature_time_plot.pdf', _temp_time_arrays, _draw_temp_time]
+}
+
+
+@styled
+def plot_kind(kind, data, output_dir, pre_name):
+    """ Plots the data in the file output_dir/pre_name_[suffix of the kind].
+
+    :param str kind: One of PLOT_KINDS.
+    :param data: (pd.DataFrame or dict) Contains the columns of the plot.
+    :param str output_dir: Directory to save the figure.
+    :param str pre_name: Name prepended to the generic plot name.
+    :return bool: True if the figure was rendered, False if it is up-to-date.
+    """
+    suffix, get_arrays, draw = PLOT_KINDS[kind]
+    out_path = os.path.join(output_dir, pre_name + '_' + suffix)
+    arrays = get_arrays(data)
+    key = render_key(kind, arrays)
+    if is_up_to_date(out_path, key):
+        return False
+    fig = reused_figure()
+    draw(fig.add_subplot(), *decimated(arrays))
+    fig.tight_layout()
+    saved = safe_savefig(out_path, fig)
+    fig.clear()
+    if saved:
+        _write_key(out_path, key)
+    return True
+
+
+def _title(title):
+    """ Returns the title with the underscores escaped if LaTeX renders the text. """
+    if mpl.rcParams['text.usetex']:
+        return title.replace('_', r'\_')
+    return title
+
+
+@styled
+def batch_plotter(curves, output_file, kind='stress_strain'):
+    """ Plots many specimens in one multi-page PDF, one page per specimen.
+
+    :param list curves: [title, data] of each specimen, data is a pd.DataFrame or a dict of arrays.
+    :param str output_file: Path to the .pdf file.
+    :param str kind: One of PLOT_KINDS.
+    :return bool: True if the file was rendered, False if it is up-to-date.
+
+    Notes:
+    ======
+        - The pages are drawn on the reused figure, so the memory does not grow with the number of pages.
+        - The file is only rendered if any of the plotted arrays, the titles, or the style changed, see render_key.
+        The arrays of all the specimens are hashed first, so curves must be a list and not a generator.
+    """
+    _, get_arrays, draw = PLOT_KINDS[kind]
+    arrays = [get_arrays(data) for _, data in curves]
+    titles = [str(title) for title, _ in curves]
+    key = render_key(kind + '_batch', [a for page in arrays for a in page], titles)
+    if is_up_to_date(output_file, key):
+        return False
+    fig = reused_figure()
+    with PdfPages(output_file) as pdf:
+        for title, page in zip(titles, arrays):
+            fig.clear()
+            ax = fig.add_subplot()
+            draw(ax, *decimated(page))
+            ax.set_title(_title(title))
+            fig.tight_layout()
+            pdf.savefig(fig)
+    fig.clear()
+    _write_key(output_file, key)
+    return True
+
+
 def stress_strain_plotter(data, output_dir, pre_name):
     """ Plots the true stress versus true strain. """
-    file_name = pre_name + '_' + 'stress_strain_plot.pdf'
-    out_path = os.path.join(output_dir, file_name)
-    plt.figure()
-    plt.plot(data['e_true'], data['Sigma_true'], c='0.15', label='Test', lw=0.5)
-    plt.xlabel(r'True Strain, $\varepsilon$')
-    plt.ylabel(r'True Stress, $\sigma$ [MPa]')
-    plt.tight_layout()
-    safe_savefig(out_path)
-    plt.close()
+    plot_kind('stress_strain', data, output_dir, pre_name)
     return
 
 
 def strain_rate_plotter(data, output_dir, pre_name):
-    """ Plots the strain-rate vs. accumulated strain. """
-    if 'C_1_Temps[s]' in data.columns:
-        time_name = 'C_1_Temps[s]'
-    else:
-        time_name = 'Time[s]'
-    file_name = pre_name + '_' + 'stress_rate_plot.pdf'
-    out_path = os.path.join(output_dir, file_name)
-    accum_strain = np.cumsum(np.abs(np.diff(data['e_true'])))
-    strain_rate = np.diff(data['e_true']) / np.diff(data[time_name])
-    plt.figure()
-    plt.plot(accum_strain, strain_rate, c='0.15', label='Test', lw=0.5)
-    plt.xlabel(r'Accumulated Strain, $\int |\dot{\varepsilon}| \mathrm{d}t$')
-    plt.ylabel(r'Strain Rate, $\dot{\varepsilon}$ [s$^{-1}$]')
-    plt.tight_layout()
-    safe_savefig(out_path)
-    plt.close()
+    """ Plots the strain-rate vs. accumulated strain.
+
+    - data can be a pd.DataFrame or a dict of arrays, e.g., a curve of rlmtp.curve_store.CurveStore.
+    """
+    plot_kind('strain_rate', data, output_dir, pre_name)
     return
 
 
 def temp_strain_plotter(data, output_dir, pre_name):
     """ Plots the temperature vs true strain. """
-    file_name = pre_name + '_' + 'temperature_strain_plot.pdf'
-    out_path = os.path.join(output_dir, file_name)
-    plt.figure()
-    plt.plot(data['e_true'], data['Temperature[C]'], c='0.15', label='Test', lw=0.5)
-    plt.xlabel(r'True Strain, $\varepsilon$')
-    plt.ylabel(r'Temperature, $T$ [$^\circ$C]')
-    plt.tight_layout()
-    safe_savefig(out_path)
-    plt.close()
+    plot_kind('temp_strain', data, output_dir, pre_name)
     return
 
 
 def temp_time_plotter(data, output_dir, pre_name):
     """ Plots the temperature versus time. """
-    if 'C_1_Temps[s]' in data.columns:
-        time_name = 'C_1_Temps[s]'
-    else:
-        time_name = 'Time[s]'
-    file_name = pre_name + '_' + 'temperature_time_plot.pdf'
-    out_path = os.path.join(output_dir, file_name)
-    plt.figure()
-    plt.plot(data[time_name], data['Temperature[C]'], c='0.15', label='Test', lw=0.5)
-    plt.xlabel(r'Time, $t$ [s]')
-    plt.ylabel(r'Temperature, $T$ [$^\circ$C]')
-    plt.tight_layout()
-    safe_savefig(out_path)
-    plt.close()
+    plot_kind('temp_time', data, output_dir, pre_name)
     return
 
 
+@styled
 def yield_properties_plotter(data, output_dir, pre_name, f_yn=345.):
     """ Plots the data and the 0.2% offset yield stress point.
 
@@ -93,6 +290,11 @@ def yield_properties_plotter(data, output_dir, pre_name, f_yn=345.):
     :param float f_yn: Nominal yield stress.
     :return:
     """
+    file_name = pre_name + '_' + 'yield_props_plot.pdf'
+    out_path = os.path.join(output_dir, file_name)
+    key = render_key('yield_properties', [data['e_true'], data['Sigma_true'], [f_yn]])
+    if is_up_to_date(out_path, key):
+        return
     e_and_fy = yield_properties(data, f_yn)
     offset = 0.002
     projection = 0.005
@@ -100,11 +302,12 @@ def yield_properties_plotter(data, output_dir, pre_name, f_yn=345.):
     fy_offset_line = e_and_fy[0] * x - offset * e_and_fy[0]
     ey = e_and_fy[1] / e_and_fy[0] + offset
 
-    plt.figure()
-    plt.plot(data['e_true'], data['Sigma_true'], '0.7')
-    plt.plot(x, fy_offset_line, 'k')
-    plt.plot([ey], [e_and_fy[1]], 'ko')
-
-    file_name = pre_name + '_' + 'yield_props_plot.pdf'
-    out_path = os.path.join(output_dir, file_name)
-    plt.savefig(out_path)
+    fig = reused_figure()
+    ax = fig.add_subplot()
+    ax.plot(data['e_true'], data['Sigma_true'], '0.7')
+    ax.plot(x, fy_offset_line, 'k')
+    ax.plot([ey], [e_and_fy[1]], 'ko')
+    if safe_savefig(out_path, fig):
+        _write_key(out_path, key)
+    fig.clear()
+    return
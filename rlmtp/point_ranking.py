@@ -0,0 +1,272 @@
+"""@package point_ranking
+Functions to rank the importance of the points of a curve for downsampling.
+
+A ranking assigns a significance to every point such that the downsampled curve for a tolerance is obtained by
+keeping the points with a significance greater than the tolerance. The ranking is computed once, then any number of
+tolerances can be evaluated with a threshold filter.
+"""
+import heapq
+import warnings
+import numpy as np
+import polyprox
+
+
+class RDPRanking:
+    """ Significance of the points of a curve for the Ramer-Douglas-Peucker algorithm.
+
+    Notes:
+    ======
+        - The significance of a point is the tolerance at which it is retained by the RDP algorithm, i.e.,
+        polyprox.min_num(d, epsilon=tol, return_index=True) is equal to indices(tol).
+        - The distance and the split point (first maximum) are identical to polyprox, so the recursion tree does not
+        depend on the tolerance. The significance of a split point is the minimum of its distance and the
+        significance of the split point of its parent segment.
+        - The points retained at the smallest tolerance of interest, min_significance, are found with a single call to
+        polyprox. They are exactly the split points of the recursion down to this tolerance, and the first maximum of
+        any segment is always one of them, so the recursion tree is rebuilt using only the retained points.
+        - Tolerances below min_significance refine the ranking again with a margin (refine_factor), so that a
+        search that approaches a tolerance from above only refines the ranking a few times.
+    """
+    __slots__ = ('d', 'significance', 'min_significance')
+
+    def __init__(self, d, min_significance=1.e-4):
+        """ Constructor.
+
+        :param np.ndarray d: (n, 2) x-y data.
+        :param float min_significance: Smallest tolerance of interest.
+        """
+        self.d = np.ascontiguousarray(d, dtype=float)
+        self.significance = None
+        self.min_significance = np.inf
+        self.refine(min_significance)
+
+    def __len__(self):
+        return len(self.d)
+
+    def refine(self, min_significance):
+        """ Computes the significance of all the points that are retained for tolerances > min_significance. """
+        if min_significance >= self.min_significance:
+            return self
+        retained = np.asarray(polyprox.min_num(self.d, epsilon=min_significance, return_index=True), dtype=np.int64)
+        self.significance = np.zeros(len(self.d))
+        self.significance[retained] = _tree_significance(self.d[retained, 0], self.d[retained, 1])
+        self.min_significance = min_significance
+        return self
+
+    def indices(self, tol, refine_factor=0.5):
+        """ Returns the indices of the points retained by the RDP algorithm with tolerance tol.
+
+        :param float tol: Tolerance of the RDP algorithm.
+        :param float refine_factor: If tol < min_significance, then the ranking is refined to refine_factor * tol.
+        :return np.ndarray: (int) Indices of the retained points.
+        """
+        if tol < self.min_significance:
+            self.refine(refine_factor * tol)
+        return threshold_indices(self.significance, tol)
+
+
+def rdp_significance(d, min_significance=0.):
+    """ Returns the tolerance at which each point is retained by the Ramer-Douglas-Peucker algorithm.
+
+    :param np.ndarray d: (n, 2) x-y data.
+    :param float min_significance: Smallest tolerance of interest, the points that are not retained at this tolerance
+        have a significance of 0.
+    :return np.ndarray: (n, ) Significance of each point, inf for the first and last points.
+
+    - polyprox.min_num(d, epsilon=eps, return_index=True) is equal to np.flatnonzero(significance > eps) for all
+    eps >= min_significance, see RDPRanking.
+    """
+    return RDPRanking(d, min_significance=min_significance).significance
+
+
+def _tree_significance(x, y):
+    """ Returns the significance of the points of the RDP recursion with a tolerance of 0.
+
+    All the segments at the same depth of the recursion are refined together with vectorized operations, the cost is
+    O(n) per level of the recursion.
+    """
+    n = len(x)
+    significance = np.zeros(n)
+    if n == 0:
+        return significance
+    significance[[0, -1]] = np.inf
+    # Segments to refine at the current level and the significance of their parent split
+    starts = np.array([0])
+    ends = np.array([n - 1])
+    parents = np.array([np.inf])
+    while len(starts) > 0:
+        has_interior = ends - starts >= 2
+        starts, ends, parents = starts[has_interior], ends[has_interior], parents[has_interior]
+        if len(starts) == 0:
+            break
+        # Flat array of the interior points of all the segments
+        lengths = ends - starts - 1
+        offsets = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+        k = np.arange(offsets[-1] + lengths[-1]) + np.repeat(starts + 1 - offsets, lengths)
+        dist = segment_distance(np.repeat(x[starts], lengths), np.repeat(y[starts], lengths),
+                                np.repeat(x[ends] - x[starts], lengths), np.repeat(y[ends] - y[starts], lengths),
+                                x[k], y[k])
+        # First maximum of each segment, NaN distances are never selected as in polyprox
+        dist[np.isnan(dist)] = -1.
+        d_max = np.maximum.reduceat(dist, offsets)
+        first = np.minimum.reduceat(np.where(dist == np.repeat(d_max, lengths), np.arange(len(dist)), len(dist)),
+                                    offsets)
+        k_max = k[first]
+        split = d_max > 0.
+        starts, ends, k_max = starts[split], ends[split], k_max[split]
+        sig = np.minimum(d_max[split], parents[split])
+        significance[k_max] = sig
+        starts = np.concatenate((starts, k_max))
+        ends = np.concatenate((k_max, ends))
+        parents = np.concatenate((sig, sig))
+    return significance
+
+
+def segment_distance(x0, y0, gx, gy, xk, yk):
+    """ Returns the distance between the points (xk, yk) and the segments from (x0, y0) to (x0 + gx, y0 + gy).
+
+    - All the arguments are arrays of the same shape (or scalars).
+    - Uses the same operations as polyprox: the projection is clipped to the segment, and points far from the segment
+    relative to its length use the segment length as the distance.
+    """
+    g_l = gx * gx + gy * gy
+    side_x = xk - x0
+    side_y = yk - y0
+    side_l = side_x * side_x + side_y * side_y
+    with np.errstate(divide='ignore', invalid='ignore'):
+        p_g_l = np.clip((side_x * gx + side_y * gy) / g_l, 0., 1.)
+    dx = x0 + p_g_l * gx - xk
+    dy = y0 + p_g_l * gy - yk
+    dist = np.sqrt(dx * dx + dy * dy)
+    return np.where(side_l > 1000. * g_l, np.sqrt(g_l), dist)
+
+
+class VWRanking:
+    """ Significance of the points of a curve for the Visvalingam-Whyatt algorithm.
+
+    Notes:
+    ======
+        - The points are removed one at a time in order of the area of the triangle formed with their current
+        neighbors, the smallest area first. The areas of the neighbors are updated after each removal using a heap, so
+        the cost is O(n log n).
+        - The significance of a point is its effective area when it is removed, i.e., the maximum of its area and the
+        significance of all the points removed before it. The significance increases with the removal order, so
+        indices(tol) are the points left when the algorithm is stopped at an area of tol.
+        - The forced points (e.g., the peaks) and the end points are never removed, their significance is inf. The
+        excluded points (e.g., in the removal ranges) are removed from the curve before the ranking, their
+        significance is -inf.
+        - budget_indices(n_points) keeps the n_points most significant points.
+    """
+    __slots__ = ('d', 'significance')
+
+    def __init__(self, d, forced=None, excluded=None):
+        """ Constructor.
+
+        :param np.ndarray d: (n, 2) x-y data.
+        :param list forced: (int) Indices of the points that are always kept.
+        :param list excluded: (int) Indices of the points that are never kept.
+        """
+        self.d = np.ascontiguousarray(d, dtype=float)
+        n = len(self.d)
+        is_forced = np.zeros(n, dtype=bool)
+        if forced is not None:
+            is_forced[np.asarray(forced, dtype=np.int64)] = True
+        is_active = np.ones(n, dtype=bool)
+        if excluded is not None:
+            is_active[np.asarray(excluded, dtype=np.int64)] = False
+        active = np.flatnonzero(is_active | is_forced)
+        self.significance = np.full(n, -np.inf)
+        self.significance[active] = vw_significance(self.d[active], is_forced[active])
+
+    def __len__(self):
+        return len(self.d)
+
+    def indices(self, tol):
+        """ Returns the indices of the points with an effective area greater than tol. """
+        return threshold_indices(self.significance, tol)
+
+    def budget_indices(self, n_points):
+        """ Returns the indices of the n_points most significant points.
+
+        :param int n_points: Number of points to keep.
+        :return np.ndarray: (int) Sorted indices of the points to keep.
+
+        - All the forced points are kept, a warning is raised if there are more than n_points of them.
+        - Less than n_points are returned if there are not enough points that are not excluded.
+        """
+        n_forced = int(np.count_nonzero(np.isposinf(self.significance)))
+        if n_forced > n_points:
+            warnings.warn('{0} points are forced, the budget of {1} points is exceeded'.format(n_forced, n_points))
+        n_available = int(np.count_nonzero(self.significance > -np.inf))
+        n_keep = min(max(n_points, n_forced), n_available)
+        order = np.argsort(-self.significance, kind='stable')
+        return np.sort(order[:n_keep])
+
+
+def vw_significance(d, is_forced=None):
+    """ Returns the effective area at which each point is removed by the Visvalingam-Whyatt algorithm.
+
+    :param np.ndarray d: (n, 2) x-y data.
+    :param np.ndarray is_forced: (n, ) bool, True for the points that are never removed.
+    :return np.ndarray: (n, ) Significance of each point, inf for the first and last points and the forced points.
+
+    - Ties in the area are removed in the order of the indices.
+    """
+    n = len(d)
+    significance = np.full(n, np.inf)
+    if n < 3:
+        return significance
+    if is_forced is None:
+        is_forced = np.zeros(n, dtype=bool)
+    x = d[:, 0].tolist()
+    y = d[:, 1].tolist()
+    area = np.full(n, np.inf)
+    area[1:-1] = triangle_area(d[:-2, 0], d[:-2, 1], d[1:-1, 0], d[1:-1, 1], d[2:, 0], d[2:, 1])
+    removable = np.flatnonzero(~is_forced[1:-1]) + 1
+    heap = list(zip(area[removable].tolist(), removable.tolist()))
+    heapq.heapify(heap)
+    area = area.tolist()
+    can_update = (~is_forced).tolist()
+    can_update[0] = can_update[-1] = False
+    prev_ind = list(range(-1, n - 1))
+    next_ind = list(range(1, n + 1))
+    removal_area = [np.inf] * n
+    heappop, heappush = heapq.heappop, heapq.heappush
+    last_significance = -np.inf
+    while heap:
+        a, i = heappop(heap)
+        if a != area[i]:
+            # Outdated entry
+            continue
+        area[i] = None
+        if a > last_significance:
+            last_significance = a
+        removal_area[i] = last_significance
+        i_prev, i_next = prev_ind[i], next_ind[i]
+        next_ind[i_prev] = i_next
+        prev_ind[i_next] = i_prev
+        # Update the neighbors that can still be removed
+        if can_update[i_prev]:
+            j_prev = prev_ind[i_prev]
+            xj, yj = x[i_prev], y[i_prev]
+            a = abs((x[j_prev] - xj) * (y[i_next] - yj) - (x[i_next] - xj) * (y[j_prev] - yj)) / 2.
+            area[i_prev] = a
+            heappush(heap, (a, i_prev))
+        if can_update[i_next]:
+            j_next = next_ind[i_next]
+            xj, yj = x[i_next], y[i_next]
+            a = abs((x[i_prev] - xj) * (y[j_next] - yj) - (x[j_next] - xj) * (y[i_prev] - yj)) / 2.
+            area[i_next] = a
+            heappush(heap, (a, i_next))
+    significance = np.array(removal_area)
+    return significance
+
+
+def triangle_area(x0, y0, x1, y1, x2, y2):
+    """ Returns the area of the triangles with the vertices (x0, y0), (x1, y1), (x2, y2). """
+    return np.abs((x0 - x1) * (y2 - y1) - (x2 - x1) * (y0 - y1)) / 2.
+
+
+def threshold_indices(significance, tol):
+    """ Returns the indices of the points with a significance greater than tol. """
+    return np.flatnonzero(significance > tol)
@@ -0,0 +1,158 @@
+"""@package processed_data
+Writers and readers of the processed data files.
+
+The processed data can be written as .csv (default), Parquet, Feather, or compressed .npz files. All the formats have
+the same columns ('Time[s]', 'e_true', 'Sigma_true', and optionally 'Temperature[C]') and keep the row numbers of the
+original data as the index. The Parquet and Feather formats require pyarrow.
+"""
+import os
+import zipfile
+import numpy as np
+import pandas as pd
+
+# Format name and file extension
+OUTPUT_FORMATS = {'csv': '.csv', 'parquet': '.parquet', 'feather': '.feather', 'npz': '.npz'}
+
+
+def format_extension(output_format):
+    """ Returns the file extension of the output format. """
+    try:
+        return OUTPUT_FORMATS[output_format]
+    except KeyError:
+        raise ValueError('Unknown output format "{0}", options are {1}.'.format(output_format, list(OUTPUT_FORMATS)))
+
+
+def file_format(file):
+    """ Returns the format of the data file from its extension, or None if it is not a data file. """
+    ext = os.path.splitext(file)[1].lower()
+    for output_format, format_ext in OUTPUT_FORMATS.items():
+        if ext == format_ext:
+            return output_format
+    return None
+
+
+def find_data_files(directory):
+    """ Returns the paths of the data files (any format) in the directory, sorted by name. """
+    return [os.path.join(directory, f) for f in sorted(os.listdir(directory))
+            if file_format(f) is not None and os.path.isfile(os.path.join(directory, f))]
+
+
+def write_processed_data(data, file, output_format='csv'):
+    """ Writes the processed data to file.
+
+    :param pd.DataFrame data: Processed data, the index is written with the data.
+    :param str file: Path to the output file.
+    :param str output_format: One of OUTPUT_FORMATS.
+    """
+    write_processed_chunks([data], file, len(data), output_format=output_format)
+    return
+
+
+def write_processed_chunks(chunks, file, n_rows, output_format='csv'):
+    """ Writes consecutive chunks of the processed data to file, only one chunk is in memory at a time.
+
+    :param iterable chunks: (pd.DataFrame) Consecutive chunks with the same columns, the index is written.
+    :param str file: Path to the output file.
+    :param int n_rows: Total number of rows in the chunks.
+    :param str output_format: One of OUTPUT_FORMATS.
+
+    - The .csv output is identical to pd.DataFrame.to_csv on all the data.
+    - The .npz output stores the values as float64, the index of all the rows is kept in memory until the end.
+    """
+    format_extension(output_format)
+    if output_format == 'csv':
+        with open(file, 'w', newline='') as f:
+            for k, chunk in enumerate(chunks):
+                chunk.to_csv(f, header=(k == 0))
+    elif output_format == 'npz':
+        _write_npz(chunks, file, n_rows)
+    else:
+        _write_arrow(chunks, file, output_format)
+    return
+
+
+def _write_npz(chunks, file, n_rows):
+    """ Writes the chunks to a compressed .npz file with the arrays values (n_rows, k), index, and columns. """
+    index = []
+    columns = None
+    with zipfile.ZipFile(file, 'w', compression=zipfile.ZIP_DEFLATED, allowZip64=True) as zf:
+        with zf.open('values.npy', 'w', force_zip64=True) as f:
+            for chunk in chunks:
+                if columns is None:
+                    columns = [str(c) for c in chunk.columns]
+                    header = {'descr': np.lib.format.dtype_to_descr(np.dtype(float)), 'fortran_order': False,
+                              'shape': (n_rows, len(columns))}
+                    np.lib.format.write_array_header_2_0(f, header)
+                f.write(np.ascontiguousarray(chunk.to_numpy(dtype=float)).tobytes())
+                index.append(chunk.index.to_numpy(dtype=np.int64))
+        index = np.concatenate(index) if index else np.zeros(0, dtype=np.int64)
+        if len(index) != n_rows:
+            raise ValueError('Expected {0} rows, the chunks have {1} rows.'.format(n_rows, len(index)))
+        for name, array in [['index', index], ['columns', np.array(columns)]]:
+            with zf.open(name + '.npy', 'w', force_zip64=True) as f:
+                np.lib.format.write_array(f, array, allow_pickle=False)
+    return
+
+
+def _import_pyarrow(output_format):
+    """ Returns the pyarrow module, raises ImportError with the format that requires it if it is not installed. """
+    try:
+        import pyarrow
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError('The {0} format requires pyarrow (pip install pyarrow).'.format(output_format))
+    return pyarrow
+
+
+def _write_arrow(chunks, file, output_format):
+    """ Writes the chunks to a Parquet or Feather file, each chunk is a row group or a record batch. """
+    pa = _import_pyarrow(output_format)
+    writer = None
+    schema = None
+    try:
+        for chunk in chunks:
+            table = pa.Table.from_pandas(chunk, preserve_index=True)
+            if writer is None:
+                # The schema of the first chunk is used for all the chunks
+                schema = table.schema
+                if output_format == 'parquet':
+                    writer = pa.parquet.ParquetWriter(file, schema)
+                else:
+                    writer = pa.ipc.new_file(file, schema)
+            writer.write_table(table.cast(schema))
+    finally:
+        if writer is not None:
+            writer.close()
+    return
+
+
+def csv_has_index(file):
+    """ Returns True if the .csv file was written with its index, i.e., the first column of the header is empty. """
+    with open(file, 'r') as f:
+        return f.readline().split(',', 1)[0].strip() == ''
+
+
+def read_processed_data(file, has_index=True):
+    """ Returns the data in the file written by write_processed_data, or in any .csv data file.
+
+    :param str file: Path to the data file, the format is given by the extension.
+    :param bool has_index: If True, the first column of .csv files is the index. Use False for the non-RLMTP data,
+        which is stored as .csv files without an index.
+    :return pd.DataFrame: Data, the index is the row numbers of the original data for all the formats.
+
+    - For files with a mix of the RLMTP and non-RLMTP data, see csv_has_index.
+    """
+    output_format = file_format(file)
+    if output_format == 'csv':
+        return pd.read_csv(file, index_col=0 if has_index else None)
+    elif output_format == 'npz':
+        with np.load(file, allow_pickle=False) as npz:
+            return pd.DataFrame(npz['values'], index=npz['index'], columns=list(npz['columns']))
+    elif output_format == 'parquet':
+        _import_pyarrow(output_format)
+        return pd.read_parquet(file)
+    elif output_format == 'feather':
+        _import_pyarrow(output_format)
+        return pd.read_feather(file)
+    raise ValueError('Unknown data file format "{0}".'.format(file))
@@ -7,11 +7,19 @@ data. Generally the data is required to be stored according to the protocols out
 
 import os
 import errno
-import pandas as pd
-from .readers import import_dion7_data, import_catman_data
+from .readers import dion7_reader, catman_reader, DEFAULT_CHUNK_SIZE, DELIMITED_EXTENSIONS
+from .data_cache import cached_read, CACHE_DIR_NAME
 from .sync_temperature import sync_temperature
 from .plotting import stress_strain_plotter, temp_time_plotter
-from .downsampler import downsample_data, read_downsample_props
+from .plot_pool import submit_plot, active_pool
+from .downsampler import downsample_data, read_downsample_props, output_columns
+from .streaming import stream_process, DEFAULT_SEGMENT_LENGTH
+from .manifest import build_manifest, stale_reason, write_manifest
+from .instrumentation import timed_stage, recording
+from .processed_data import write_processed_data, read_processed_data, format_extension
+
+# Columns used by the figures of generate_plots
+PLOTTED_COLUMNS = ['e_true', 'Sigma_true', 'C_1_Temps[s]', 'Time[s]', 'Temperature[C]']
 
 
 def dir_maker(directory):
@@ -24,25 +32,72 @@ def dir_maker(directory):
     return
 
 
-def load_data_files(input_dir):
+def find_dion7_file(input_dir):
+    """ Returns the path to the Dion7 test data file in the specimen directory, or None if it does not exist. """
+    excel_dir = os.path.join(input_dir, 'Excel')
+    try:
+        valid_file = [f for f in os.listdir(excel_dir) if f[:8] == 'testData']
+    except FileNotFoundError:
+        return None
+    if len(valid_file) == 0:
+        return None
+    return os.path.join(excel_dir, valid_file[0])
+
+
+def find_catman_file(input_dir):
+    """ Returns the path to the catman temperature file in the specimen directory, or None if it does not exist. """
+    raw_dir = os.path.join(input_dir, 'rawData')
+    try:
+        valid_file = [f for f in os.listdir(raw_dir) if f[:11] == 'Temperature']
+    except FileNotFoundError:
+        return None
+    valid_file = [f for f in valid_file if f.lower().endswith(('.xlsx', '.xls') + DELIMITED_EXTENSIONS)]
+    if len(valid_file) == 0:
+        return None
+    return os.path.join(raw_dir, valid_file[0])
+
+
+def find_downsample_props_file(input_dir):
+    """ Returns the path to the downsampler_props file in the specimen directory, or None if it does not exist. """
+    valid_file = [f for f in os.listdir(input_dir) if f[:len('downsampler_props')] == 'downsampler_props']
+    if len(valid_file) == 0:
+        return None
+    return os.path.join(input_dir, valid_file[0])
+
+
+def load_data_files(input_dir, use_cache=False, cache_dir=None, load_dion7=True):
     """ Checks if the correct files exists and loads them if they do.
 
     :param str input_dir: Specimen parent directory.
+    :param bool use_cache: If True, then load the Dion7 and catman data through rlmtp.data_cache.
+    :param str cache_dir: Cache directory, if None then uses the ".rlmtp_cache" directory in input_dir.
+    :param bool load_dion7: If False, then the path to the Dion7 file is returned instead of the data.
     :return dict: Contains the Dion7 data, catman data, and downsampler data.
 
     - If any of the data files do not exist, then None is returned in their place.
+    - The Dion7 and catman files can be Excel workbooks or CSV/TSV exports, the format is detected from the contents
+    of the file, see rlmtp.readers.dion7_reader.
     """
-    excel_path = 'Excel/'
-    raw_path = 'rawData/'
     print('Checking files...')
-    files_in_excel = os.listdir(os.path.join(input_dir, excel_path))
-    files_in_raw = os.listdir(os.path.join(input_dir, raw_path))
-    files_in_root = os.listdir(input_dir)
+
+    def read(reader_for_file, file):
+        if file is None:
+            raise FileNotFoundError('Data file does not exist.')
+        reader = reader_for_file(file)
+        if use_cache:
+            return cached_read(reader, file, cache_dir=cache_dir)
+        return reader.read(file)
+
     # Dion7 data file
     try:
-        valid_file = [f for f in files_in_excel if f[:8] == 'testData']
-        dion7_file = os.path.join(input_dir, excel_path + valid_file[0])
-        dion7_data = import_dion7_data(dion7_file)
+        if load_dion7:
+            with timed_stage('read_dion7') as info:
+                dion7_data = read(dion7_reader, find_dion7_file(input_dir))
+                info['n_points'] = len(dion7_data.data)
+        else:
+            dion7_data = find_dion7_file(input_dir)
+            if dion7_data is None:
+                raise FileNotFoundError('Data file does not exist.')
         valid_dion7_data = True
         print('\t Dion7 data exists.')
     except (FileNotFoundError, IndexError):
@@ -50,10 +105,9 @@ def load_data_files(input_dir):
         print('\t Dion7 data does NOT exist.')
     # catman data file
     try:
-        valid_file = [f for f in files_in_raw if f[:11] == 'Temperature']
-        valid_file = [f for f in valid_file if (f[-4:].lower() == 'xlsx' or f[-3:].lower() == 'xls')]
-        catman_file = os.path.join(input_dir, raw_path + valid_file[0])
-        catman_data = import_catman_data(catman_file)
+        with timed_stage('read_catman') as info:
+            catman_data = read(catman_reader, find_catman_file(input_dir))
+            info['n_points'] = len(catman_data.data)
         valid_catman_data = True
         print('\t catman data exists.')
     except (FileNotFoundError, IndexError):
@@ -61,8 +115,9 @@ def load_data_files(input_dir):
         print('\t catman data does NOT exist.')
     # downsampling info
     try:
-        valid_file = [f for f in files_in_root if f[:len('downsampler_props')] == 'downsampler_props']
-        downsample_file = os.path.join(input_dir, valid_file[0])
+        downsample_file = find_downsample_props_file(input_dir)
+        if downsample_file is None:
+            raise FileNotFoundError('Data file does not exist.')
         downsample_props = read_downsample_props(downsample_file)
         valid_downsample_data = True
         print('\t Using custom downsampling parameters.')
@@ -87,40 +142,109 @@ def load_data_files(input_dir):
     return data
 
 
-def processed_file_name(output_dir, pre_name):
+def processed_file_name(output_dir, pre_name, output_format='csv'):
     """ Returns the path for the processed data file.
 
     :param str output_dir: Directory where files will be saved.
     :param str pre_name: String prepended to all the output file names.
+    :param str output_format: Format of the file, see rlmtp.processed_data.OUTPUT_FORMATS.
     :return str: Path to the file.
     """
-    file_name = pre_name + '_' + 'processed_data.csv'
+    file_name = pre_name + '_' + 'processed_data' + format_extension(output_format)
     out_path = os.path.join(output_dir, file_name)
     return out_path
 
 
-def generate_output(data, output_dir, pre_name):
+def generate_output(data, output_dir, pre_name, output_format='csv'):
     """ Creates the output files in the specified directory.
 
     :param pd.DataFrame data: Contains all the data to save to file.
     :param str output_dir: Directory where files will be saved.
     :param str pre_name: String prepended to all the output file names.
+    :param str output_format: Format of the data file, see rlmtp.processed_data.OUTPUT_FORMATS.
     :return:
     """
-    # Write the .csv file
-    out_path = processed_file_name(output_dir, pre_name)
+    # Write the data file
+    out_path = processed_file_name(output_dir, pre_name, output_format)
     # Rename the time column
-    data2 = data.rename(columns={'C_1_Temps[s]': 'Time[s]'})
-    data2.to_csv(out_path, index=True)
+    with timed_stage('write_data', n_points=len(data), output_format=output_format):
+        data2 = data.rename(columns={'C_1_Temps[s]': 'Time[s]'})
+        write_processed_data(data2, out_path, output_format)
+    generate_plots(data, output_dir, pre_name)
+    return
+
+
+def generate_plots(data, output_dir, pre_name):
+    """ Creates the figures in the specified directory, see generate_output.
 
-    # Write the figures
-    stress_strain_plotter(data, output_dir, pre_name)
-    if 'Temperature[C]' in data.columns:
-        temp_time_plotter(data, output_dir, pre_name)
+    - If a PlotPool is active, then the figures are rendered in the background, see rlmtp.plot_pool.
+    """
+    background = active_pool() is not None
+    with timed_stage('plot', n_points=len(data), background=background):
+        if background:
+            # Only send the columns that are plotted to the workers
+            data = data[[c for c in data.columns if c in PLOTTED_COLUMNS]]
+        submit_plot(stress_strain_plotter, data, output_dir, pre_name)
+        if 'Temperature[C]' in data.columns:
+            submit_plot(temp_time_plotter, data, output_dir, pre_name)
     return
 
 
-def process_specimen_data(input_dir, output_dir, should_downsample=True, default_global_downsample=True):
+def specimen_manifest(input_dir, should_downsample=True, default_global_downsample=True, streaming=False,
+                      segment_length=DEFAULT_SEGMENT_LENGTH, output_format='csv', cache_dir=None):
+    """ Returns the manifest of the processed data of the specimen, see rlmtp.manifest.
+
+    - The parameters are the same as in process_specimen_data, the ones that do not change the output are not included.
+    - The downsampling parameters are identified by the digest of the downsampler_props file.
+    - The digests of the input files are memoized in cache_dir, or computed on each call if None.
+    """
+    input_files = {
+        'Dion7': find_dion7_file(input_dir),
+        'catman': find_catman_file(input_dir),
+        'downsampler_props': find_downsample_props_file(input_dir)
+    }
+    parameters = {
+        'should_downsample': should_downsample,
+        'default_global_downsample': default_global_downsample,
+        'streaming': streaming,
+        'segment_length': segment_length if streaming else None,
+        'output_format': output_format
+    }
+    return build_manifest(input_files, parameters, cache_dir=cache_dir)
+
+
+def rebuild_reason(input_dir, output_dir, should_downsample=True, default_global_downsample=True, streaming=False,
+                   segment_length=DEFAULT_SEGMENT_LENGTH, output_format='csv', cache_dir=None):
+    """ Returns why process_specimen_data would process the specimen, or None if its output is up-to-date.
+
+    - The parameters are the same as in process_specimen_data.
+    - Only reads the input directory, the digests of the input files are memoized as in process_specimen_data.
+    """
+    output_file = processed_file_name(output_dir, get_pre_name(input_dir), output_format)
+    if not os.path.isfile(output_file):
+        # Same as stale_reason, without hashing the inputs or creating the cache in output_dir
+        return 'no output'
+    manifest = specimen_manifest(input_dir, should_downsample=should_downsample,
+                                 default_global_downsample=default_global_downsample, streaming=streaming,
+                                 segment_length=segment_length, output_format=output_format,
+                                 cache_dir=digest_cache_dir(output_dir, cache_dir))
+    return stale_reason(output_file, manifest)
+
+
+def digest_cache_dir(output_dir, cache_dir=None):
+    """ Returns the directory where the digests of the input files are memoized, see rlmtp.manifest.
+
+    - cache_dir if it is not None, else the ".rlmtp_cache" directory in output_dir. The input directory is not
+    written to unless it is given as cache_dir.
+    """
+    if cache_dir is not None:
+        return cache_dir
+    return os.path.join(output_dir, CACHE_DIR_NAME)
+
+
+def process_specimen_data(input_dir, output_dir, should_downsample=True, default_global_downsample=True,
+                          use_cache=False, cache_dir=None, streaming=False, segment_length=DEFAULT_SEGMENT_LENGTH,
+                          chunk_size=DEFAULT_CHUNK_SIZE, rebuild=False, recorder=None, output_format='csv'):
     """ Generates the final .csv output and plots the relevant data.
 
     :param str input_dir: Specimen directory containing the data.
@@ -128,6 +252,17 @@ def process_specimen_data(input_dir, output_dir, should_downsample=True, default
     :param bool should_downsample: If False, then do not downsample.
     :param bool default_global_downsample: If True, then uses the global downsamping method, else uses
                                          the local downsampling method.
+    :param bool use_cache: If True, then the parsed Dion7 and catman data are cached, see rlmtp.data_cache.
+    :param str cache_dir: Cache directory, if None then the parsed data is cached in the ".rlmtp_cache" directory in
+                          input_dir and the digests of the input files in the one in output_dir.
+    :param bool streaming: If True, then the Dion7 data is processed in chunks with bounded memory, see
+                           rlmtp.streaming.stream_process.
+    :param int segment_length: Maximum number of points downsampled at once if streaming=True.
+    :param int chunk_size: Number of rows read at once if streaming=True.
+    :param bool rebuild: If True, then the specimen is processed even if its output is up-to-date.
+    :param rlmtp.instrumentation.Recorder recorder: If not None, then the time and memory of each stage are recorded.
+    :param str output_format: Format of the processed data file: 'csv', 'parquet', 'feather', or 'npz', see
+                              rlmtp.processed_data.
     :return pd.DataFrame: Contains all the processed, downsampled data collected by the function.
 
     Notes:
@@ -139,35 +274,54 @@ def process_specimen_data(input_dir, output_dir, should_downsample=True, default
         - All of the output names are prepended by a string based on the input_dir string. For details on the prepended
         string, see the get_pre_name function.
         - If the temperature data exists, it is synced with the Dion7 data.
+        - The processed data only has the time, strain, stress, and temperature columns, also if it is not
+        downsampled, see rlmtp.downsampler.output_columns.
         - Option "default_global_downsample" is ignored if "use_local_error" is specified in the downsample_props.txt.
         - The global downsampling tolerance is set to 0.5% if default_global_downsample=True, else default parameters
         are used.
+        - With streaming=True, the catman data is still read at once and use_cache only applies to it. The figures are
+        only generated if the data is downsampled, and None is returned if it is not.
+        - A manifest of the inputs and parameters is stored with the output, see rlmtp.manifest. The specimen is
+        only processed again if the output or its manifest is missing, or if the input files, the parameters, or the
+        rlmtp version changed.
+        - The stages recorded by the recorder are: process_specimen (all the processing), read_dion7, read_catman,
+        sync_temperature, downsample (peaks, filter, downsample_search), write_data, and plot. The iterations of the
+        global downsampling search are recorded as downsample_iteration events.
     """
-    # First check if the data already exists at the output location
+    with recording(recorder), timed_stage('process_specimen') as info:
+        final_data = _process_specimen_data(input_dir, output_dir, should_downsample, default_global_downsample,
+                                            use_cache, cache_dir, streaming, segment_length, chunk_size, rebuild,
+                                            output_format)
+        info['n_points'] = None if final_data is None else len(final_data)
+    return final_data
+
+
+def _process_specimen_data(input_dir, output_dir, should_downsample, default_global_downsample, use_cache, cache_dir,
+                           streaming, segment_length, chunk_size, rebuild, output_format):
+    """ See process_specimen_data. """
+    # First check if the data at the output location is up-to-date
     print('Processing data in {0}'.format(input_dir))
     pre_name = get_pre_name(input_dir)
-    final_file_path = processed_file_name(output_dir, pre_name)
-    if os.path.isfile(final_file_path):
-        # The data already exists, load it so can return "final_data"
+    final_file_path = processed_file_name(output_dir, pre_name, output_format)
+    manifest = specimen_manifest(input_dir, should_downsample=should_downsample,
+                                 default_global_downsample=default_global_downsample, streaming=streaming,
+                                 segment_length=segment_length, output_format=output_format,
+                                 cache_dir=digest_cache_dir(output_dir, cache_dir))
+    reason = 'rebuild requested' if rebuild else stale_reason(final_file_path, manifest)
+    if reason is None:
+        # The data is up-to-date, load it so can return "final_data"
         # and notify the user
-        final_data = pd.read_csv(final_file_path)
-        print('The processed data already exists, skipping processing!')
+        final_data = read_processed_data(final_file_path)
+        print('The processed data is up-to-date, skipping processing!')
     else:
-        # The data does not exist, generate it
+        # The data does not exist or is out-of-date, generate it
+        print('\t Processing the data ({0}).'.format(reason))
         # Check to see if the correct files exist, and load the data
-        all_data = load_data_files(input_dir)
+        all_data = load_data_files(input_dir, use_cache=use_cache, cache_dir=cache_dir, load_dion7=not streaming)
         dion7_data = all_data['Dion7']
         if dion7_data is None:
             raise Exception('Dion7 data does not exist (in the correct format), exiting.')
-        # Add the temperature to the stress/strain data
         catman_data = all_data['catman']
-        if catman_data is not None:
-            print('Syncing temperature data with Dion7 data...')
-            final_data = sync_temperature(dion7_data, catman_data)
-        else:
-            final_data = dion7_data.data
-        # Convert the index to integers
-        final_data.index = final_data.index.astype('int64')
         # Do the downsampling
         downsample_params = all_data['downsampling']
         # Choose local or global method if not specified
@@ -178,15 +332,42 @@ def process_specimen_data(input_dir, output_dir, should_downsample=True, default
             else:
                 # Use default params
                 pass
+        if streaming:
+            print('Processing the data in chunks...')
+            dir_maker(output_dir)
+            result = stream_process(dion7_reader(dion7_data).iter_chunks(dion7_data, chunk_size=chunk_size),
+                                    final_file_path, catman_data=catman_data, downsample_params=downsample_params,
+                                    should_downsample=should_downsample, segment_length=segment_length,
+                                    chunk_size=chunk_size, output_format=output_format)
+            if result.data is not None:
+                generate_plots(result.data, output_dir, pre_name)
+            write_manifest(final_file_path, manifest)
+            print('Finished processing!')
+            return result.data
+        # Add the temperature to the stress/strain data
+        if catman_data is not None:
+            print('Syncing temperature data with Dion7 data...')
+            with timed_stage('sync_temperature', n_points=len(dion7_data.data)):
+                # The columns are added to dion7_data.data instead of a copy, it was loaded for this specimen only
+                final_data = sync_temperature(dion7_data, catman_data, inplace=True)
+        else:
+            final_data = dion7_data.data
+        # Convert the index to integers
+        final_data.index = final_data.index.astype('int64')
         if not should_downsample:
             print('Skipping downsampling...')
+            # Same columns as the downsampled data
+            final_data = final_data[output_columns(final_data)]
         else:
             print('Downsampling the data...')
-            final_data = downsample_data(final_data, downsample_params)
+            with timed_stage('downsample', n_points=len(final_data)) as info:
+                final_data = downsample_data(final_data, downsample_params)
+                info['n_points_kept'] = len(final_data)
         # Output the required files
         dir_maker(output_dir)
         print('Generating the output...')
-        generate_output(final_data, output_dir, pre_name)
+        generate_output(final_data, output_dir, pre_name, output_format)
+        write_manifest(final_file_path, manifest)
         print('Finished processing!')
     return final_data
 
@@ -2,12 +2,32 @@
 Readers for various input files.
 """
 
+import csv
+import codecs
+import numpy as np
 import pandas as pd
 import datetime
 import warnings
 import collections
 from rlmtp.timed_data import TimedData
 
+# Increment when the output of the Dion7 or catman readers changes, invalidates the entries in rlmtp.data_cache
+READER_VERSION = 2
+
+# Number of rows in each chunk of the chunked readers
+DEFAULT_CHUNK_SIZE = 100000
+
+# Rows of channel information between the header and the data in the catman exports, the third has the start time
+CATMAN_PREAMBLE_ROWS = 47
+CATMAN_TIME_FORMAT = '%m.%d.%y %H:%M:%S'
+# Dion7 columns that are used in the processing, the delimited readers skip the other columns by default
+DION7_COLUMNS = ['System Date', 'C_1_Temps[s]', 'e_true', 'sigma_true']
+# Delimiters that are detected in the CSV/TSV exports
+DELIMITERS = ',;\t'
+DELIMITED_EXTENSIONS = ('.csv', '.tsv', '.txt')
+# First bytes of .xlsx (zip) and .xls (OLE2) files
+EXCEL_SIGNATURES = (b'PK\x03\x04', b'\xd0\xcf\x11\xe0')
+
 ACCEPTED_READER_INPUTS = collections.OrderedDict([
     # Key = allowable keywords in the specimen description file, value = title of each keyword
     # If multiple values are expected for an entry, then place the value in a list
@@ -67,29 +87,78 @@ class ExcelCatmanReader(Reader):
         # Import the data and remove the unnecessary rows
         data = pd.read_excel(file, header=self.header_rows)
         col_1 = data.columns[0]
-        start_time = datetime.datetime.strptime(data[col_1][2], '%m.%d.%y %H:%M:%S')
-        data.drop(range(47), inplace=True)
+        start_time = datetime.datetime.strptime(data[col_1][2], CATMAN_TIME_FORMAT)
+        data.drop(range(CATMAN_PREAMBLE_ROWS), inplace=True)
         data.reset_index(drop=True, inplace=True)
-        # Rename the columns to remove the spaces
-        col_new_name = ['Time[s]']  # assume that the time associated with temperature is the first column
-        rename_dict = dict(zip(data.columns, col_new_name))
-        # Find the temperature index
-        for col in data.columns:
-            if len(col) >= 12:
-                if col[:11] == 'Temperature':
-                    rename_dict[col] = 'Temperature[C]'
-        data = data.rename(index=str, columns=rename_dict)
-        time = data['Time[s]']
-        sample_rate = int((time[1] - time[0]) * 1000000)
-        sample_rate = datetime.timedelta(microseconds=sample_rate)
-        # Add the system date column
-        system_date = []
-        for i in range(len(time)):
-            time_diff = i * sample_rate
-            system_date.append(start_time + time_diff)
-        data['System Date'] = system_date
-        temperature_data = TimedData(data, start_time, sample_rate)
-        return temperature_data
+        return catman_timed_data(data, start_time)
+
+
+class CsvCatmanReader(Reader):
+    """ Reader for the CSV/TSV exports from catman, same layout as the Excel files (see ExcelCatmanReader). """
+
+    def __init__(self, start_row=1, sep=None, decimal=None, encoding=None):
+        """ Constructor.
+
+        :param int start_row: Row (0-indexed) with the channel names.
+        :param str sep: Delimiter, if None then it is detected from the header, see sniff_delimiter.
+        :param str decimal: Decimal separator, if None then ',' for ';' delimited files and '.' otherwise.
+        :param str encoding: Encoding of the file, if None then it is detected, see sniff_encoding.
+        """
+        Reader.__init__(self, start_row)
+        self.sep = sep
+        self.decimal = decimal
+        self.encoding = encoding
+
+    def read(self, file):
+        """ Returns the TimedData with the time and temperature channels, the other channels are not parsed. """
+        encoding = self.encoding if self.encoding is not None else sniff_encoding(file)
+        sep = self.sep if self.sep is not None else sniff_delimiter(file, self.header_rows, encoding)
+        lines = read_lines(file, self.header_rows + 4, encoding)
+        columns = next(csv.reader([lines[self.header_rows]], delimiter=sep))
+        start_field = next(csv.reader([lines[self.header_rows + 3]], delimiter=sep))[0]
+        start_time = datetime.datetime.strptime(start_field.strip(), CATMAN_TIME_FORMAT)
+        use_cols = [0] + [k for k, c in enumerate(columns) if is_temperature_channel(c)]
+        data = pd.read_csv(file, sep=sep, header=None, skiprows=self.header_rows + 1 + CATMAN_PREAMBLE_ROWS,
+                           usecols=use_cols, dtype=np.float64, decimal=_decimal(self.decimal, sep),
+                           encoding=encoding)
+        data.columns = [columns[k] for k in use_cols]
+        return catman_timed_data(data, start_time)
+
+
+def is_temperature_channel(column):
+    """ Returns True if the catman column is a thermocouple, i.e., the name starts with 'Temperature'. """
+    return column[:11] == 'Temperature'
+
+
+def catman_timed_data(data, start_time):
+    """ Returns the TimedData of the catman channels.
+
+    :param pd.DataFrame data: catman channels without the preamble, the first column is the time.
+    :param datetime.datetime start_time: Start time of the recording.
+    :return TimedData: Data with the columns renamed and the System Date of each entry.
+    """
+    # Rename the columns to remove the spaces
+    col_new_name = ['Time[s]']  # assume that the time associated with temperature is the first column
+    rename_dict = dict(zip(data.columns, col_new_name))
+    # Find the temperature channels, the first is 'Temperature[C]' and any others are 'Temperature_2[C]', ...
+    n_temperature = 0
+    for col in data.columns:
+        if is_temperature_channel(col):
+            n_temperature += 1
+            if n_temperature == 1:
+                rename_dict[col] = 'Temperature[C]'
+            else:
+                rename_dict[col] = 'Temperature_{0}[C]'.format(n_temperature)
+    data = data.rename(index=str, columns=rename_dict)
+    time = data['Time[s]']
+    sample_rate = int((time[1] - time[0]) * 1000000)
+    sample_rate = datetime.timedelta(microseconds=sample_rate)
+    # Add the system date column, the entries are at a constant rate from the start time
+    time_diff = pd.to_timedelta(np.arange(len(time)) * (sample_rate // datetime.timedelta(microseconds=1)),
+                                unit='us')
+    data['System Date'] = (pd.Timestamp(start_time) + time_diff).to_numpy()
+    temperature_data = TimedData(data, start_time, sample_rate)
+    return temperature_data
 
 
 class ExcelDion7Reader(Reader):
@@ -99,11 +168,12 @@ class ExcelDion7Reader(Reader):
         Reader.__init__(self, start_row - 2)
         return
 
+    column_names = {"sigma [Mpa]": "Eng_Stress[MPa]", "epsilon": "Eng_Strain[]", "sigma_true": "Sigma_true"}
+
     def read(self, file):
-        data = pd.read_excel(file, header=self.header_rows)
+        data = self.read_raw(file)
         # data.drop('S/No', inplace=True)
-        data = data.rename(index=str, columns={"sigma [Mpa]": "Eng_Stress[MPa]", "epsilon": "Eng_Strain[]",
-                                               "sigma_true": "Sigma_true"})
+        data = data.rename(index=str, columns=self.column_names)
         # Deduce and replace the times with microseconds
         system_time = pd.to_datetime(data['System Date'])
         time_with_microseconds = self.deduce_microseconds(system_time)
@@ -116,63 +186,353 @@ class ExcelDion7Reader(Reader):
         coupon_data = TimedData(data, start_time, sample_rate)
         return coupon_data
 
+    def read_raw(self, file):
+        """ Returns the columns of the file as exported by Dion7. """
+        return pd.read_excel(file, header=self.header_rows)
+
+    def iter_raw_chunks(self, file, chunk_size=DEFAULT_CHUNK_SIZE):
+        """ Yields the columns of the file as exported by Dion7 as DataFrames of chunk_size rows. """
+        return iter_excel_chunks(file, self.header_rows, chunk_size)
+
+    def iter_chunks(self, file, chunk_size=DEFAULT_CHUNK_SIZE):
+        """ Yields the data as DataFrames of chunk_size rows.
+
+        :param str file: Path to the input file to read.
+        :param int chunk_size: Number of rows in each chunk.
+        :return generator: (pd.DataFrame) Chunks with the same columns and System Date as the data from read, and the
+            positions of the rows as the index.
+
+        - Only the current chunk is in memory, see iter_excel_chunks. The microseconds are deduced with a
+        MicrosecondDeducer, the chunks are held until the timestep is known (usually only the first chunk).
+        """
+        deducer = MicrosecondDeducer()
+        for chunk in self.iter_raw_chunks(file, chunk_size):
+            for ready in deducer.update(chunk.rename(columns=self.column_names)):
+                yield ready
+        for ready in deducer.finish():
+            yield ready
+
     def deduce_microseconds(self, system_time):
         """ Returns a Series of Timestamps with the deduced microseconds from available values. """
-        # Find the first entry with microseconds not equal to zero
-        set_micro_index = False
-        for i, st in enumerate(system_time):
-            t_micro_1 = st.microsecond
-            if t_micro_1 != 0:
-                set_micro_index = True
-                st2 = system_time[i + 1]
-                t_micro_2 = st2.microsecond
-                dt = t_micro_2 - t_micro_1  # the timestep is assumed to be constant
-                first_micro_index = i
-                first_micro_time = st
-                break
-
+        time_ns = deduce_microseconds_ns(system_time.to_numpy(dtype='datetime64[ns]').view('int64'))
         # Exit with original times if no microseconds
-        if not set_micro_index:
+        if time_ns is None:
             warnings.warn('No microseconds in the data, time syncing will not be as accurate.')
             return system_time.copy()
+        return pd.Series(time_ns.view('datetime64[ns]'), index=system_time.index, name=system_time.name)
 
-        # Make sure all entries have microseconds
-        system_time_micro = system_time.copy()
-        # Adjust all the times before the first time with microseconds
-        for i in range(first_micro_index):
-            micro_second_diff = -(first_micro_index - i) * dt
-            system_time_micro[i] = first_micro_time + datetime.timedelta(microseconds=micro_second_diff)
-        # Adjust all the times after the first time with microseconds
-        count_since_ref = 0
-        ref_time = first_micro_time
-        for i in range(first_micro_index, len(system_time)):
-            if (system_time[i]).microsecond != 0:
-                ref_time = system_time[i]
-                count_since_ref = 0
-            else:
-                count_since_ref += 1
-                micro_second_diff = count_since_ref * dt
-                system_time_micro[i] = ref_time + datetime.timedelta(microseconds=micro_second_diff)
-        return system_time_micro
+
+class CsvDion7Reader(ExcelDion7Reader):
+    """ Reader for the CSV/TSV exports from Dion7, same layout as the Excel files (see ExcelDion7Reader).
+
+    Notes:
+    ======
+        - Only the columns in DION7_COLUMNS are parsed by default, the numerical columns are read as float64.
+        - The System Date entries are parsed by parse_system_date, the milliseconds may be missing in some entries.
+    """
+
+    def __init__(self, start_row=8, sep=None, decimal=None, columns=DION7_COLUMNS, time_format=None,
+                 encoding=None):
+        """ Constructor.
+
+        :param int start_row: Row (1-indexed) of the first entry, the header is on the previous row.
+        :param str sep: Delimiter, if None then it is detected from the header, see sniff_delimiter.
+        :param str decimal: Decimal separator, if None then ',' for ';' delimited files and '.' otherwise.
+        :param list columns: (str) Columns to parse with the names in the export, if None then all the columns.
+        :param str time_format: Format of the System Date without the milliseconds, if None then it is inferred.
+        :param str encoding: Encoding of the file, if None then it is detected, see sniff_encoding.
+        """
+        ExcelDion7Reader.__init__(self, start_row)
+        self.sep = sep
+        self.decimal = decimal
+        self.columns = columns
+        self.time_format = time_format
+        self.encoding = encoding
+
+    def read_raw(self, file):
+        data = self._read_csv(file)
+        data['System Date'] = parse_system_date(data['System Date'], self.time_format)
+        return data
+
+    def iter_raw_chunks(self, file, chunk_size=DEFAULT_CHUNK_SIZE):
+        for chunk in self._read_csv(file, chunk_size=chunk_size):
+            chunk['System Date'] = parse_system_date(chunk['System Date'], self.time_format)
+            yield chunk
+
+    def _read_csv(self, file, chunk_size=None):
+        """ Returns the DataFrame of the file, or an iterator over chunks of chunk_size rows if not None. """
+        encoding = self.encoding if self.encoding is not None else sniff_encoding(file)
+        sep = self.sep if self.sep is not None else sniff_delimiter(file, self.header_rows, encoding)
+        use_cols = None
+        dtype = {'System Date': str}
+        if self.columns is not None:
+            use_cols = self.columns.__contains__
+            dtype.update({c: np.float64 for c in self.columns if c != 'System Date'})
+        return pd.read_csv(file, sep=sep, skiprows=self.header_rows, header=0, usecols=use_cols, dtype=dtype,
+                           decimal=_decimal(self.decimal, sep), encoding=encoding, chunksize=chunk_size)
+
+
+def deduce_microseconds_ns(time_ns):
+    """ Returns the times with the microseconds deduced from the entries that have them.
+
+    :param np.ndarray time_ns: (n, ) int64 times in nanoseconds since epoch.
+    :return np.ndarray: (n, ) int64 times in nanoseconds since epoch, or None if no entry has microseconds.
+
+    Notes:
+    ======
+        - The timestep, dt, is the difference in microseconds between the first entry with microseconds and the next
+        entry, the timestep is assumed to be constant.
+        - Entries before the first entry with microseconds are set backwards from that entry in steps of dt.
+        - Entries after without microseconds are set to the last entry with microseconds (the reference) plus the
+        number of entries since the reference times dt.
+    """
+    time_ns = np.asarray(time_ns, dtype=np.int64)
+    n = len(time_ns)
+    has_micro = (time_ns // 1000) % 1000000 != 0
+    if not has_micro.any():
+        return None
+    first_micro_index = int(np.argmax(has_micro))
+    if first_micro_index + 1 >= n:
+        raise IndexError('Cannot deduce the timestep from the last entry.')
+    dt_ns = _timestep_ns(time_ns, first_micro_index)
+    count = np.arange(n, dtype=np.int64)
+    time_micro = np.empty_like(time_ns)
+    # Adjust all the times before the first time with microseconds
+    steps_before = first_micro_index - count[:first_micro_index]
+    time_micro[:first_micro_index] = time_ns[first_micro_index] - steps_before * dt_ns
+    # Adjust all the times after, the reference is the last index with microseconds
+    ref = np.where(has_micro, count, -1)
+    np.maximum.accumulate(ref, out=ref)
+    ref = ref[first_micro_index:]
+    time_micro[first_micro_index:] = time_ns[ref] + (count[first_micro_index:] - ref) * dt_ns
+    return time_micro
+
+
+def _timestep_ns(time_ns, first_micro_index):
+    """ Returns the timestep in nanoseconds, the difference in microseconds of the first entry with microseconds and
+    the next entry. """
+    micro = (time_ns[first_micro_index:first_micro_index + 2] // 1000) % 1000000
+    return int(micro[1] - micro[0]) * 1000
+
+
+class MicrosecondDeducer:
+    """ Deduces the microseconds of the System Date in consecutive chunks of the Dion7 data.
+
+    Notes:
+    ======
+        - The deduced times are identical to deduce_microseconds_ns on all the data. The chunks are held until the
+        timestep is known, then the last entry with microseconds (the reference) is carried to the next chunks.
+        - If no entry has microseconds, the chunks are returned unchanged by finish() with a warning.
+    """
+    __slots__ = ('_pending', '_n', 'dt_ns', 'ref_index', 'ref_time_ns')
+
+    def __init__(self):
+        self._pending = []
+        self._n = 0
+        self.dt_ns = None
+        self.ref_index = None
+        self.ref_time_ns = None
+
+    def update(self, chunk):
+        """ Returns the chunks with deduced times that are ready, chunk is the next DataFrame with a System Date. """
+        chunk.index = pd.RangeIndex(self._n, self._n + len(chunk))
+        self._n += len(chunk)
+        if self.dt_ns is None:
+            self._pending.append(chunk)
+            time_ns = np.concatenate([_time_ns(c) for c in self._pending])
+            has_micro = _has_microseconds(time_ns)
+            if not has_micro.any() or np.argmax(has_micro) + 1 >= len(time_ns):
+                # The timestep is not known yet
+                return []
+            time_micro = deduce_microseconds_ns(time_ns)
+            self.dt_ns = _timestep_ns(time_ns, int(np.argmax(has_micro)))
+            self._set_reference(time_ns, has_micro, 0)
+            ready, self._pending = self._pending, []
+            _set_times(ready, time_micro)
+            return ready
+        time_ns = _time_ns(chunk)
+        offset = chunk.index[0]
+        count = np.arange(offset, offset + len(chunk), dtype=np.int64)
+        has_micro = _has_microseconds(time_ns)
+        ref = np.maximum.accumulate(np.where(has_micro, count, self.ref_index))
+        ref_time = np.where(ref >= offset, time_ns[np.maximum(ref - offset, 0)], self.ref_time_ns)
+        self._set_reference(time_ns, has_micro, offset)
+        _set_times([chunk], ref_time + (count - ref) * self.dt_ns)
+        return [chunk]
+
+    def finish(self):
+        """ Returns the chunks that are still held, raises the same errors as deduce_microseconds_ns. """
+        ready, self._pending = self._pending, []
+        if len(ready) > 0:
+            time_ns = np.concatenate([_time_ns(c) for c in ready])
+            if deduce_microseconds_ns(time_ns) is None:
+                warnings.warn('No microseconds in the data, time syncing will not be as accurate.')
+                for c in ready:
+                    c['System Date'] = pd.to_datetime(c['System Date'])
+        return ready
+
+    def _set_reference(self, time_ns, has_micro, offset):
+        """ Updates the reference to the last entry with microseconds. """
+        if has_micro.any():
+            i = len(has_micro) - 1 - int(np.argmax(has_micro[::-1]))
+            self.ref_index = offset + i
+            self.ref_time_ns = int(time_ns[i])
+
+
+def _time_ns(chunk):
+    """ Returns the System Date of the chunk as int64 nanoseconds since epoch. """
+    return pd.to_datetime(chunk['System Date']).to_numpy(dtype='datetime64[ns]').view('int64')
+
+
+def _has_microseconds(time_ns):
+    return (time_ns // 1000) % 1000000 != 0
+
+
+def _set_times(chunks, time_ns):
+    """ Sets the System Date of the consecutive chunks to the times. """
+    start = 0
+    for c in chunks:
+        c['System Date'] = time_ns[start:start + len(c)].view('datetime64[ns]')
+        start += len(c)
+
+
+def iter_excel_chunks(file, header_row, chunk_size=DEFAULT_CHUNK_SIZE):
+    """ Yields the first sheet of an Excel file as DataFrames of chunk_size rows.
+
+    :param str file: Path to the Excel file.
+    :param int header_row: Row (0-indexed) with the column names, as the header in pd.read_excel.
+    :param int chunk_size: Number of rows in each chunk.
+    :return generator: (pd.DataFrame) Consecutive chunks of the data.
+
+    - .xlsx files are read row by row with openpyxl in read-only mode, so only the current chunk is in memory. Empty
+    rows are skipped. Other formats are read at once with pd.read_excel and then split into chunks.
+    """
+    if not file.lower().endswith(('.xlsx', '.xlsm')):
+        data = pd.read_excel(file, header=header_row)
+        for i in range(0, len(data), chunk_size):
+            yield data.iloc[i:i + chunk_size].copy()
+        return
+    # openpyxl is the engine of pd.read_excel for .xlsx files
+    import openpyxl
+    workbook = openpyxl.load_workbook(file, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        for _ in range(header_row):
+            next(rows)
+        columns = [c if c is not None else 'Unnamed: {0}'.format(k) for k, c in enumerate(next(rows))]
+        buffer = []
+        for row in rows:
+            if all(v is None for v in row):
+                continue
+            buffer.append(row)
+            if len(buffer) == chunk_size:
+                yield pd.DataFrame(buffer, columns=columns)
+                buffer = []
+        if len(buffer) > 0:
+            yield pd.DataFrame(buffer, columns=columns)
+    finally:
+        workbook.close()
+
+
+def parse_system_date(values, time_format=None):
+    """ Returns the Dion7 System Date strings as datetime64 values.
+
+    :param pd.Series values: (str) System Date entries, e.g., '11.12.2018 14:50:48.023' or '11.12.2018 14:50:48'.
+    :param str time_format: Format of the entries without the milliseconds, if None then it is inferred.
+    :return pd.Series: Parsed times.
+
+    - The fraction of a second is split from the entries before parsing, since it is missing in some entries.
+    """
+    values = pd.Series(values, dtype=str).str.strip()
+    parts = values.str.rpartition('.')
+    has_fraction = (parts[1] == '.') & parts[2].str.isdigit()
+    fraction_ns = parts[2].where(has_fraction, '0').str.ljust(9, '0').str[:9].astype(np.int64)
+    base = parts[0].where(has_fraction, values)
+    return pd.to_datetime(base, format=time_format) + pd.to_timedelta(fraction_ns.to_numpy(), unit='ns')
+
+
+def sniff_encoding(file, n_bytes=65536):
+    """ Returns 'utf-8-sig' if the start of the file is UTF-8 (with or without the BOM), else 'latin-1'.
+
+    - latin-1 decodes any file, e.g., the Windows exports, and the names of the columns that are used are ASCII.
+    """
+    with open(file, 'rb') as f:
+        head = f.read(n_bytes)
+    try:
+        codecs.getincrementaldecoder('utf-8')().decode(head, final=False)
+        return 'utf-8-sig'
+    except UnicodeDecodeError:
+        return 'latin-1'
+
+
+def read_lines(file, n, encoding=None):
+    """ Returns the first n lines of a text file, without the line endings. """
+    if encoding is None:
+        encoding = sniff_encoding(file)
+    lines = []
+    with open(file, encoding=encoding, errors='replace', newline='') as f:
+        for line in f:
+            lines.append(line.rstrip('\r\n'))
+            if len(lines) == n:
+                break
+    return lines
+
+
+def sniff_delimiter(file, header_row, encoding=None):
+    """ Returns the delimiter of a CSV/TSV file from the header row, one of DELIMITERS.
+
+    - If the delimiter can not be detected, then tab for .tsv files and comma otherwise.
+    """
+    lines = read_lines(file, header_row + 1, encoding)
+    try:
+        return csv.Sniffer().sniff(lines[-1], delimiters=DELIMITERS).delimiter
+    except (csv.Error, IndexError):
+        return '\t' if file.lower().endswith('.tsv') else ','
+
+
+def _decimal(decimal, sep):
+    if decimal is not None:
+        return decimal
+    return ',' if sep == ';' else '.'
+
+
+def is_excel_file(file):
+    """ Returns True if the file is an Excel workbook, from the first bytes of the file. """
+    with open(file, 'rb') as f:
+        return f.read(4) in EXCEL_SIGNATURES
+
+
+def dion7_reader(file):
+    """ Returns the reader for the Dion7 file, ExcelDion7Reader for Excel workbooks and CsvDion7Reader otherwise. """
+    if is_excel_file(file):
+        return ExcelDion7Reader()
+    return CsvDion7Reader()
+
+
+def catman_reader(file):
+    """ Returns the reader for the catman file, ExcelCatmanReader for Excel workbooks and CsvCatmanReader otherwise. """
+    if is_excel_file(file):
+        return ExcelCatmanReader()
+    return CsvCatmanReader()
 
 
 def import_dion7_data(file):
-    """ Returns a properly formatted TimedData object from the specified Excel input file.
+    """ Returns a properly formatted TimedData object from the specified Excel or CSV/TSV input file.
 
     :param str file: Path to file in the specified Dion7 format.
     :return TimedData: Object containing the data from the input file.
     """
-    reader = ExcelDion7Reader()
+    reader = dion7_reader(file)
     return reader.read(file)
 
 
 def import_catman_data(file):
-    """ Returns a properly formatted TimedData object from the specified Excel input file.
+    """ Returns a properly formatted TimedData object from the specified Excel or CSV/TSV input file.
 
     :param str file: Path to file in the specified catman format.
     :return TimedData: Object containing the data from the input file.
     """
-    reader = ExcelCatmanReader()
+    reader = catman_reader(file)
     return reader.read(file)
 
 
@@ -0,0 +1,253 @@
+"""@package streaming
+Constant-memory processing of the Dion7 data, from the reader to the downsampled output.
+
+The Dion7 data is read in chunks (see rlmtp.readers.ExcelDion7Reader.iter_chunks), the temperature is synced with each
+chunk, and the columns of the output are appended to a temporary file on disk. The half-cycles are found incrementally
+with a CycleIndexBuilder. The stress filter, the downsampler, and the output then only read bounded windows of the
+memory-mapped file, so the memory does not depend on the length of the test.
+"""
+import os
+import inspect
+import tempfile
+import collections
+import numpy as np
+import pandas as pd
+from .readers import DEFAULT_CHUNK_SIZE
+from .find_peaks import CycleIndexBuilder
+from .sync_temperature import SyncCoverage, interp_columns, get_epoch_time, get_timed_data_epoch_time, get_column
+from .sync_temperature import get_coverage, warn_coverage
+from .yield_properties import yield_properties
+from .downsampler import rlmtp_downsampler, combine_peaks, saturation_positions, cut_at_saturation
+from .downsampler import filter_stress_window, bounded_segment_breaks, apply_removal_ranges, add_to_elastic
+from .downsampler import _downsample_segment, STRAIN_2PRCT, STRAIN_LAST, LARGE_NUM_CYCLES
+from .instrumentation import timed_stage
+from .processed_data import write_processed_chunks
+
+# Maximum number of points downsampled at once
+DEFAULT_SEGMENT_LENGTH = 10 ** 6
+TIME_COLUMN = 'C_1_Temps[s]'
+TEMPERATURE_COLUMN = 'Temperature[C]'
+
+StreamResult = collections.namedtuple('StreamResult', ['indices', 'n_rows', 'data'])
+StreamResult.__doc__ = """ Result of stream_process.
+
+- indices: List of the retained rows, range(n_rows) if not downsampled (not expanded to a list).
+- n_rows: Number of rows in the Dion7 data.
+- data: pd.DataFrame with the retained rows, None if not downsampled.
+"""
+
+
+def stream_process(chunks, output_file, catman_data=None, downsample_params=None, should_downsample=True,
+                   segment_length=DEFAULT_SEGMENT_LENGTH, chunk_size=DEFAULT_CHUNK_SIZE, work_dir=None,
+                   output_format='csv'):
+    """ Syncs, downsamples, and writes the Dion7 data without holding all of it in memory.
+
+    :param iterable chunks: (pd.DataFrame) Consecutive chunks of the Dion7 data, see ExcelDion7Reader.iter_chunks.
+    :param str output_file: Path to the output file, same format as rlmtp.processing.generate_output.
+    :param TimedData catman_data: Optional, temperature data from catman.
+    :param dict downsample_params: Parameters of rlmtp_downsampler, n_points and n_jobs are not supported.
+    :param bool should_downsample: If False, then all the rows are written.
+    :param int segment_length: Maximum number of points downsampled at once with the global criteria, see
+        bounded_segment_breaks. If None, then all the data up to the last peak is downsampled at once.
+    :param int chunk_size: Number of rows in each pass over the data.
+    :param str work_dir: Directory for the temporary file, if None then the default temporary directory.
+    :param str output_format: Format of the output file, see rlmtp.processed_data.OUTPUT_FORMATS.
+    :return StreamResult: Retained rows.
+
+    Notes:
+    ======
+        - The retained rows are identical to rlmtp_downsampler(data, **params) for the local criteria, and to
+        rlmtp_downsampler(data, segment_length=segment_length, **params) for the global criteria, where data is the
+        synced Dion7 data.
+        - With the local criteria, the data up to the last peak is downsampled at once since the points kept by the
+        backends depend on the points before them. Splitting it would force the break points.
+        - Only the temperature channel 'Temperature[C]' is synced since it is the only one in the output.
+        - The memory is O(chunk_size + segment_length + number of half-cycles + number of retained rows) for the global
+        criteria, and O(number of points up to the last peak) for the local criteria.
+    """
+    params = _downsampler_params(downsample_params)
+    with tempfile.TemporaryDirectory(dir=work_dir) as tmp_dir:
+        # The Dion7 data is read and synced together
+        with timed_stage('read_dion7') as info:
+            values, cycle_index, columns = _spill(chunks, catman_data, os.path.join(tmp_dir, 'data.bin'))
+            info['n_points'] = n = len(values)
+        if should_downsample:
+            with timed_stage('downsample', n_points=n) as info:
+                ind = _downsample(values, cycle_index, params, segment_length, chunk_size, tmp_dir)
+                info['n_points_kept'] = len(ind)
+        else:
+            ind = range(n)
+        # Write the output in chunks
+        names = [c if c != TIME_COLUMN else 'Time[s]' for c in columns]
+
+        def blocks():
+            for k in range(0, max(len(ind), 1), chunk_size):
+                rows = np.asarray(ind[k:k + chunk_size], dtype=np.int64)
+                yield pd.DataFrame(values[rows], index=rows, columns=names)
+
+        with timed_stage('write_data', n_points=len(ind), output_format=output_format):
+            write_processed_chunks(blocks(), output_file, len(ind), output_format=output_format)
+        if should_downsample:
+            data = pd.DataFrame(values[np.asarray(ind, dtype=np.int64)], index=ind, columns=columns)
+            result = StreamResult(ind, n, data)
+        else:
+            result = StreamResult(ind, n, None)
+        del values
+    return result
+
+
+def _downsampler_params(downsample_params):
+    """ Returns the parameters of rlmtp_downsampler with the defaults filled in. """
+    params = {k: v.default for k, v in inspect.signature(rlmtp_downsampler).parameters.items()
+              if v.default is not inspect.Parameter.empty}
+    if downsample_params is not None:
+        params.update(downsample_params)
+    if params['n_points'] is not None:
+        raise ValueError('The point budget (n_points) is not supported with streaming.')
+    return params
+
+
+def _spill(chunks, catman_data, path):
+    """ Appends the output columns of each chunk to the file at path.
+
+    :return list: [np.memmap, CycleIndex, list] The (n, k) columns, the half-cycles, and the column names.
+    """
+    columns = [TIME_COLUMN, 'e_true', 'Sigma_true']
+    if catman_data is not None:
+        t_catman = get_timed_data_epoch_time(catman_data)
+        temperature = get_column(catman_data, TEMPERATURE_COLUMN)[:, np.newaxis]
+        columns.append(TEMPERATURE_COLUMN)
+        n_before, n_after = 0, 0
+        t_first, t_last = None, None
+    builder = CycleIndexBuilder()
+    n = 0
+    with open(path, 'wb') as f:
+        for chunk in chunks:
+            block = np.empty((len(chunk), len(columns)))
+            for k, c in enumerate(columns[:3]):
+                block[:, k] = chunk[c].to_numpy(dtype=float)
+            if catman_data is not None:
+                t = get_epoch_time(chunk['System Date'])
+                block[:, 3] = interp_columns(t, t_catman, temperature)[:, 0]
+                coverage = get_coverage(t, t_catman)
+                n_before += coverage.n_before
+                n_after += coverage.n_after
+                if t_first is None:
+                    t_first = t[0]
+                t_last = t[-1]
+            builder.update(block[:, 2], block[:, 1])
+            f.write(block.tobytes())
+            n += len(block)
+    if n == 0:
+        raise ValueError('The Dion7 data is empty.')
+    if catman_data is not None:
+        warn_coverage(SyncCoverage(n_before, n_after, max(float(t_catman[0] - t_first), 0.),
+                                   max(float(t_last - t_catman[-1]), 0.)))
+    values = np.memmap(path, dtype=float, mode='r', shape=(n, len(columns)))
+    return [values, builder.build(), columns]
+
+
+def _downsample(values, cycle_index, p, segment_length, chunk_size, tmp_dir):
+    """ Returns the retained rows, follows rlmtp_downsampler with the parameters p. """
+    n = len(values)
+    e = values[:, 1]
+    s = values[:, 2]
+    # Peaks, as in stress_strain_peaks
+    em, fym = prefix_yield_properties(e, s, f_yn=p['f_yn'], chunk_size=chunk_size)
+    i_plateau = first_greater(e, 0.2 / 100. + fym / em, chunk_size)
+    if i_plateau is None:
+        raise IndexError('The strain does not pass the 0.2% offset yield strain.')
+    i_fyupper = first_argmax(s, i_plateau + 1, chunk_size)
+    i_2prct = first_greater(e, STRAIN_2PRCT, chunk_size)
+    ilast = first_greater(e, STRAIN_LAST, chunk_size)
+    ind_ss = combine_peaks(cycle_index.find_peaks(), int(cycle_index.strain_peaks[0]), i_fyupper, i_2prct, ilast, n,
+                           last_ind=p['last_ind'])
+    ind_ss = sorted(list(set(ind_ss)))
+    if i_2prct is None and len(ind_ss) > LARGE_NUM_CYCLES and p['cut_sat_cycles']:
+        sat_ind = max(saturation_positions(cycle_index, pd.Series(s, copy=False), p['sat_tol']))
+        ind_ss = cut_at_saturation(ind_ss, sat_ind, n_cycles_min=p['n_cycles_min'])
+
+    # Filtered stress up to the last peak
+    last_ind = ind_ss[-1]
+    s_filtered = np.lib.format.open_memmap(os.path.join(tmp_dir, 'filtered.npy'), mode='w+', shape=(last_ind + 1,))
+    for i0 in range(0, last_ind + 1, chunk_size):
+        i1 = min(i0 + chunk_size, last_ind + 1)
+        if p['apply_filter']:
+            s_filtered[i0:i1] = filter_stress_window(s, i0, i1, i_2prct, wl_base=p['wl_base_value'],
+                                                     wl_factor=p['wl_2prct_factor'], poly_order=p['polyorder'])
+        else:
+            s_filtered[i0:i1] = s[i0:i1]
+    e_range = _chunked_range(e[:last_ind + 1], chunk_size)
+    s_range = _chunked_range(s_filtered, chunk_size)
+
+    # Downsample each segment, scaled as in apply_downsampler for the local criteria
+    use_global = not p['use_local_error']
+    if segment_length is None or not use_global:
+        breaks = [0, last_ind]
+    else:
+        breaks = bounded_segment_breaks(ind_ss, segment_length)
+    ind_downsampler = set(breaks)
+    for b0, b1 in zip(breaks[:-1], breaks[1:]):
+        if use_global:
+            d = np.column_stack((e[b0:b1 + 1], s_filtered[b0:b1 + 1]))
+        else:
+            d = np.column_stack((e[b0:b1 + 1] / e_range, s_filtered[b0:b1 + 1] / s_range))
+        ind_segment = _downsample_segment((d, p['downsample_tol'], use_global, p['backend'], p['use_ranking']))
+        ind_downsampler.update(b0 + i for i in ind_segment)
+    del s_filtered
+
+    # Combine the points as in rlmtp_downsampler
+    ind_final = apply_removal_ranges(ind_ss + sorted(ind_downsampler), p['removal_ranges'])
+    ind_final = sorted(list(set(ind_final)))
+    ind_final += add_to_elastic(values[:, 1:3], ind_final, p['f_yn'], p['n_elastic_region'])
+    return sorted(list(set(ind_final)))
+
+
+def prefix_yield_properties(e, s, f_yn=345., chunk_size=DEFAULT_CHUNK_SIZE):
+    """ Returns yield_properties of the strain e and stress s using the shortest prefix of the data that is needed.
+
+    - The elastic modulus only depends on the data up to 0.66 * f_yn, and the yield stress is the first intersection
+    with the 0.2% offset line. The prefix is doubled until both are found in it, so the result is identical to
+    yield_properties on all the data.
+    """
+    n = len(e)
+    m = min(chunk_size, n)
+    while True:
+        reached_limit = np.any(np.abs(s[:m]) > 0.66 * f_yn)
+        if reached_limit or m == n:
+            try:
+                return yield_properties(pd.DataFrame({'e_true': e[:m], 'Sigma_true': s[:m]}), f_yn=f_yn)
+            except IndexError:
+                if m == n:
+                    raise
+        m = min(2 * m, n)
+
+
+def first_greater(x, threshold, chunk_size=DEFAULT_CHUNK_SIZE):
+    """ Returns the first index where x > threshold, or None. """
+    for i0 in range(0, len(x), chunk_size):
+        above = x[i0:i0 + chunk_size] > threshold
+        if above.any():
+            return i0 + int(np.argmax(above))
+    return None
+
+
+def first_argmax(x, stop, chunk_size=DEFAULT_CHUNK_SIZE):
+    """ Returns the first index of the maximum of x[:stop], NaN entries are skipped as in pd.Series.idxmax. """
+    i_max = None
+    x_max = -np.inf
+    for i0 in range(0, stop, chunk_size):
+        chunk = np.asarray(x[i0:min(i0 + chunk_size, stop)])
+        if np.all(np.isnan(chunk)):
+            continue
+        j = int(np.nanargmax(chunk))
+        if i_max is None or chunk[j] > x_max:
+            i_max, x_max = i0 + j, chunk[j]
+    return i_max
+
+
+def _chunked_range(x, chunk_size):
+    """ Returns x.max() - x.min() computed in chunks. """
+    x_max = np.max([np.max(x[i0:i0 + chunk_size]) for i0 in range(0, len(x), chunk_size)])
+    x_min = np.min([np.min(x[i0:i0 + chunk_size]) for i0 in range(0, len(x), chunk_size)])
+    return x_max - x_min
@@ -2,55 +2,146 @@
 Functions to synchronize the Dion7 data with the catman temperature data.
 """
 
-import datetime
+import collections
+import warnings
 import numpy as np
-# import matplotlib.pyplot as plt
+from .timed_data import ArrayTimedData, SYSTEM_DATE
 
+SyncCoverage = collections.namedtuple('SyncCoverage', ['n_before', 'n_after', 'gap_before_s', 'gap_after_s'])
+SyncCoverage.__doc__ = """ Coverage of the Dion7 times by the catman times.
 
-def sync_temperature(dion_data, catman_data):
-    """ Returns a new DataFrame with the temperature data from catman interpolated from the Dion7 times.
+- n_before: Number of Dion7 entries before the first catman time.
+- n_after: Number of Dion7 entries after the last catman time.
+- gap_before_s: Seconds between the first Dion7 time and the first catman time, 0 if covered.
+- gap_after_s: Seconds between the last catman time and the last Dion7 time, 0 if covered.
+"""
+
+SyncResult = collections.namedtuple('SyncResult', ['values', 'channels', 'coverage'])
+SyncResult.__doc__ = """ Result of sync_catman_channels.
+
+- values: (n, k) np.ndarray with the interpolated value of each channel at each Dion7 time.
+- channels: List of the k channel names.
+- coverage: SyncCoverage of the Dion7 times by the catman times.
+"""
+
+
+def sync_temperature(dion_data, catman_data, inplace=False):
+    """ Returns a DataFrame with the temperature data from catman interpolated from the Dion7 times.
 
     :param TimedData dion_data: Data from Dion7.
     :param TimedData catman_data: Data from catman.
-    :return pd.DataFrame: Copy of the data from dion_data with the interpolated temperature.
+    :param bool inplace: If True, the columns are added to dion_data.data, else a copy is returned.
+    :return pd.DataFrame: Data from dion_data with the interpolated temperature.
 
-    - The added column is 'Temperature[C]'
+    - The added columns are all the temperature channels of catman_data, i.e., 'Temperature[C]' and any additional
+    thermocouples 'Temperature_2[C]', ...
+    - Raises a warning if the Dion7 times are not covered by the catman times, the temperature is held constant
+    outside of the catman times.
     """
-    # Get the times in seconds since epoch
-    system_time_dion = dion_data.data['System Date']
-    system_time_dion = np.array(get_epoch_time(system_time_dion))
-    system_time_catman = catman_data.data['System Date']
-    system_time_catman = np.array(get_epoch_time(system_time_catman))
-    # Notify user if the dion times are outside the catman times
-    if system_time_dion[0] < system_time_catman[0]:
-        print('Warning: Dion7 first time is before catman first time')
-    if system_time_dion[-1] > system_time_catman[-1]:
-        print('Warning: Dion7 last time is after catman last time')
-    # Interpolate the temperature values from catman onto the dion times
-    catman_temperature = np.array(catman_data.data['Temperature[C]'], dtype=float)
-    dion_temperature = np.interp(system_time_dion, system_time_catman, catman_temperature)
-    synced_data = dion_data.data.copy()
-    synced_data['Temperature[C]'] = dion_temperature
-
-    # Used to output the debug figure
-    # debugging = True
-    # if debugging is True:
-    #     plt.figure()
-    #     plt.plot(system_time_catman, catman_data.data['Temperature[C]'], lw=1.5, label='Original')
-    #     plt.plot(system_time_dion, synced_data['Temperature[C]'], lw=1.0, label='Interpolated')
-    #     plt.xlabel('Time since epoch [s]')
-    #     plt.ylabel('Temperature [$^\circ$C]')
-    #     plt.legend()
-    #     plt.savefig('../output/temperature_interp_fig.pdf')
-    #     plt.close()
-
+    result = sync_catman_channels(dion_data, catman_data)
+    warn_coverage(result.coverage)
+    if inplace:
+        synced_data = dion_data.data
+    else:
+        synced_data = dion_data.data.copy()
+    for k, c in enumerate(result.channels):
+        synced_data[c] = result.values[:, k]
     return synced_data
 
 
+def sync_catman_channels(dion_data, catman_data, channels=None, out=None):
+    """ Returns the catman channels interpolated at the Dion7 times.
+
+    :param TimedData dion_data: Data from Dion7, can also be an ArrayTimedData.
+    :param TimedData catman_data: Data from catman, can also be an ArrayTimedData.
+    :param list channels: (str) catman columns to interpolate, if None then all the temperature channels are used.
+    :param np.ndarray out: (n, k) Optional preallocated output array, n Dion7 times and k channels.
+    :return SyncResult: Interpolated values, channel names, and coverage of the Dion7 times.
+
+    - All the channels are interpolated in one pass, the interpolation indices are only computed once.
+    """
+    if channels is None:
+        channels = temperature_channels(catman_data)
+    t_dion = get_timed_data_epoch_time(dion_data)
+    t_catman = get_timed_data_epoch_time(catman_data)
+    values = np.column_stack([get_column(catman_data, c) for c in channels])
+    values = interp_columns(t_dion, t_catman, values, out=out)
+    coverage = get_coverage(t_dion, t_catman)
+    return SyncResult(values, list(channels), coverage)
+
+
+def temperature_channels(catman_data):
+    """ Returns the names of the temperature channels in the catman data. """
+    if isinstance(catman_data, ArrayTimedData):
+        columns = catman_data.columns.keys()
+    else:
+        columns = catman_data.data.columns
+    return [c for c in columns if c[:11] == 'Temperature' and c[-3:] == '[C]']
+
+
+def interp_columns(x, xp, fp, out=None):
+    """ Returns the one-dimensional linear interpolation of each column of fp, equivalent to np.interp per column.
+
+    :param np.ndarray x: (n, ) Coordinates at which to evaluate the interpolated values.
+    :param np.ndarray xp: (m, ) Increasing coordinates of the data points, m >= 1.
+    :param np.ndarray fp: (m, k) Values of the data points.
+    :param np.ndarray out: (n, k) Optional preallocated output array.
+    :return np.ndarray: (n, k) Interpolated values, values outside of xp are set to the first or last fp.
+    """
+    x = np.asarray(x, dtype=float)
+    xp = np.asarray(xp, dtype=float)
+    fp = np.asarray(fp, dtype=float)
+    if out is None:
+        out = np.empty((len(x), fp.shape[1]))
+    if len(xp) == 1:
+        out[:] = fp[0]
+        return out
+    # Interval of each x, clipped so that both end points exist
+    j = np.clip(np.searchsorted(xp, x, side='right') - 1, 0, len(xp) - 2)
+    dx = (x - xp[j])[:, np.newaxis]
+    slope = (fp[j + 1] - fp[j]) / (xp[j + 1] - xp[j])[:, np.newaxis]
+    np.add(slope * dx, fp[j], out=out)
+    # Constant extrapolation outside of the data
+    out[x < xp[0]] = fp[0]
+    out[x >= xp[-1]] = fp[-1]
+    return out
+
+
+def warn_coverage(coverage):
+    """ Raises a warning if the Dion7 times are not covered by the catman times. """
+    if coverage.n_before > 0:
+        warnings.warn('Dion7 first time is {0:0.3f} s before catman first time'.format(coverage.gap_before_s))
+    if coverage.n_after > 0:
+        warnings.warn('Dion7 last time is {0:0.3f} s after catman last time'.format(coverage.gap_after_s))
+
+
+def get_coverage(t, t_ref):
+    """ Returns the SyncCoverage of the times t by the reference times t_ref, both in seconds. """
+    n_before = int(np.searchsorted(t, t_ref[0], side='left'))
+    n_after = int(len(t) - np.searchsorted(t, t_ref[-1], side='right'))
+    gap_before = max(float(t_ref[0] - t[0]), 0.)
+    gap_after = max(float(t[-1] - t_ref[-1]), 0.)
+    return SyncCoverage(n_before, n_after, gap_before, gap_after)
+
+
+def get_column(timed_data, column):
+    """ Returns the column of a TimedData or ArrayTimedData as a float array. """
+    if isinstance(timed_data, ArrayTimedData):
+        return np.asarray(timed_data[column], dtype=float)
+    return np.asarray(timed_data.data[column], dtype=float)
+
+
+def get_timed_data_epoch_time(timed_data):
+    """ Returns the time in seconds since epoch for each entry in a TimedData or ArrayTimedData. """
+    if isinstance(timed_data, ArrayTimedData):
+        return timed_data.get_epoch_seconds()
+    return get_epoch_time(timed_data.data[SYSTEM_DATE])
+
+
 def get_epoch_time(time_series):
-    """ Returns a list of floats with the time in seconds since epoch for each entry in time_series. """
-    epoch = datetime.datetime.utcfromtimestamp(0)
-    new_time = []
-    for i in range(len(time_series)):
-        new_time.append((time_series[i].to_pydatetime() - epoch).total_seconds())
-    return new_time
+    """ Returns an array of floats with the time in seconds since epoch for each entry in time_series.
+
+    - The times are truncated to the microsecond, consistent with datetime.datetime.
+    """
+    time_ns = np.asarray(time_series.to_numpy(dtype='datetime64[ns]').view('int64'))
+    return (time_ns // 1000) / 1.e6
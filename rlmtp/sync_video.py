@@ -8,6 +8,7 @@ import subprocess
 import os
 import datetime
 import warnings
+import pandas as pd
 
 
 def get_duration_ffmpeg(video_file):
@@ -81,12 +82,10 @@ def dion7_times_to_video_times(video_file, times):
     video_end = vet.replace(year=t1.year, month=t1.month, day=t1.day)
     time_is_ok = check_times_within_video_time(video_start, video_end, times)
     if time_is_ok:
-        # Calculate the elapsed time in seconds
-        video_times = []
-        for t in times:
-            t_delta = t - video_start
-            video_times.append(t_delta.total_seconds())
-        return video_times
+        # Calculate the elapsed time in seconds, to the microsecond
+        times_ns = pd.to_datetime(times).to_numpy(dtype='datetime64[ns]').view('int64')
+        elapsed_us = (times_ns - pd.Timestamp(video_start).value) // 1000
+        return list(elapsed_us / 1.e6)
     else:
         # Returns False
         return time_is_ok
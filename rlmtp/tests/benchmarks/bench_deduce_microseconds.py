@@ -0,0 +1,69 @@
+"""
+Compares the vectorized ExcelDion7Reader.deduce_microseconds with the original row-by-row implementation.
+
+Run this file from the command line:
+>>> python bench_deduce_microseconds.py
+"""
+import time
+import datetime
+import warnings
+import pandas as pd
+from rlmtp.readers import ExcelDion7Reader
+from rlmtp.tests.unit_tests.synthetic import dion7_system_times
+
+
+def deduce_microseconds_loop(system_time):
+    """ Original row-by-row implementation of ExcelDion7Reader.deduce_microseconds. """
+    set_micro_index = False
+    for i, st in enumerate(system_time):
+        t_micro_1 = st.microsecond
+        if t_micro_1 != 0:
+            set_micro_index = True
+            st2 = system_time.iloc[i + 1]
+            t_micro_2 = st2.microsecond
+            dt = t_micro_2 - t_micro_1
+            first_micro_index = i
+            first_micro_time = st
+            break
+    if not set_micro_index:
+        return system_time.copy()
+    system_time_micro = system_time.copy()
+    for i in range(first_micro_index):
+        micro_second_diff = -(first_micro_index - i) * dt
+        system_time_micro.iloc[i] = first_micro_time + datetime.timedelta(microseconds=micro_second_diff)
+    ref_time = first_micro_time
+    count_since_ref = 0
+    for i in range(first_micro_index, len(system_time)):
+        if system_time.iloc[i].microsecond != 0:
+            ref_time = system_time.iloc[i]
+            count_since_ref = 0
+        else:
+            count_since_ref += 1
+            micro_second_diff = count_since_ref * dt
+            system_time_micro.iloc[i] = ref_time + datetime.timedelta(microseconds=micro_second_diff)
+    return system_time_micro
+
+
+def run(sizes=(10 ** 3, 10 ** 4, 10 ** 5), loop_limit=10 ** 5):
+    reader = ExcelDion7Reader()
+    print('{0:>10} {1:>12} {2:>12} {3:>10}'.format('n', 'loop [s]', 'vector [s]', 'speedup'))
+    for n in sizes:
+        system_time = pd.Series(dion7_system_times(n))
+        t0 = time.perf_counter()
+        new = reader.deduce_microseconds(system_time)
+        t_vec = time.perf_counter() - t0
+        if n <= loop_limit:
+            t0 = time.perf_counter()
+            old = deduce_microseconds_loop(system_time)
+            t_loop = time.perf_counter() - t0
+            if not new.equals(old):
+                raise ValueError('Vectorized output differs from the original for n = {0}'.format(n))
+            print('{0:>10} {1:>12.4f} {2:>12.4f} {3:>10.1f}'.format(n, t_loop, t_vec, t_loop / t_vec))
+        else:
+            print('{0:>10} {1:>12} {2:>12.4f} {3:>10}'.format(n, '-', t_vec, '-'))
+
+
+if __name__ == "__main__":
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        run(sizes=(10 ** 3, 10 ** 4, 10 ** 5, 10 ** 6, 10 ** 7))
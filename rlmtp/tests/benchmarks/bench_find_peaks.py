@@ -0,0 +1,39 @@
+"""
+Compares the vectorized find_peaks and find_peaks2 with the original loop implementations.
+
+Run this file from the command line:
+>>> python bench_find_peaks.py
+"""
+import time
+import pandas as pd
+from rlmtp.find_peaks import find_peaks, find_peaks2
+from rlmtp.tests.unit_tests.synthetic import cyclic_stress_strain
+from rlmtp.tests.unit_tests.peaks_reference import find_peaks_loop, find_peaks2_loop
+
+
+def _time(fun, *args):
+    t0 = time.perf_counter()
+    result = fun(*args)
+    return [result, time.perf_counter() - t0]
+
+
+def run(sizes=(10 ** 4, 10 ** 5, 10 ** 6, 10 ** 7), loop_limit=10 ** 6):
+    print('{0:>10} {1:>12} {2:>12} {3:>12} {4:>12}'.format('n', 'loop [s]', 'vector [s]', 'loop2 [s]', 'vector2 [s]'))
+    for n in sizes:
+        strain, stress = cyclic_stress_strain(n, n_cycles=max(20, n // 1000))
+        e_true = pd.Series(strain)
+        sigma_true = pd.Series(stress)
+        peaks, t_vec = _time(find_peaks, sigma_true)
+        peaks2, t_vec2 = _time(find_peaks2, e_true, sigma_true)
+        if n <= loop_limit:
+            peaks_old, t_loop = _time(find_peaks_loop, sigma_true)
+            peaks2_old, t_loop2 = _time(find_peaks2_loop, e_true, sigma_true)
+            if peaks != peaks_old or peaks2 != peaks2_old:
+                raise ValueError('Vectorized output differs from the original for n = {0}'.format(n))
+            print('{0:>10} {1:>12.4f} {2:>12.4f} {3:>12.4f} {4:>12.4f}'.format(n, t_loop, t_vec, t_loop2, t_vec2))
+        else:
+            print('{0:>10} {1:>12} {2:>12.4f} {3:>12} {4:>12.4f}'.format(n, '-', t_vec, '-', t_vec2))
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,53 @@
+"""
+Time to import rlmtp and its entry points in a new interpreter, and the heavy dependencies that are loaded.
+
+Run this file from the command line:
+>>> python bench_import_time.py
+"""
+import sys
+import json
+import statistics
+import subprocess
+
+# Statements that are timed, from the lightest use of the package to the processing
+STATEMENTS = [
+    'import rlmtp',
+    'from rlmtp import import_dion7_data',
+    'from rlmtp import yield_properties',
+    'from rlmtp import stress_strain_plotter',
+    'from rlmtp import process_specimen_data'
+]
+HEAVY_MODULES = ['matplotlib', 'scipy', 'polyprox']
+
+_TIMER = """
+import sys, time, json
+t0 = time.perf_counter()
+{0}
+t = time.perf_counter() - t0
+print(json.dumps([t, [m for m in {1!r} if m in sys.modules]]))
+"""
+
+
+def time_import(statement, repeat=5):
+    """ Returns [times in seconds, heavy modules loaded] of the statement, each run in a new interpreter. """
+    times = []
+    loaded = []
+    for _ in range(repeat):
+        out = subprocess.run([sys.executable, '-W', 'ignore', '-c', _TIMER.format(statement, HEAVY_MODULES)],
+                             check=True, capture_output=True, text=True).stdout
+        t, loaded = json.loads(out.strip().splitlines()[-1])
+        times.append(t)
+    return [times, loaded]
+
+
+def run(statements=STATEMENTS, repeat=5):
+    """ Prints the median and minimum import times of the statements. """
+    print('{0:<45} {1:>10} {2:>10}  {3}'.format('statement', 'median [s]', 'min [s]', 'heavy modules'))
+    for statement in statements:
+        times, loaded = time_import(statement, repeat=repeat)
+        print('{0:<45} {1:>10.3f} {2:>10.3f}  {3}'.format(statement, statistics.median(times), min(times),
+                                                          ', '.join(loaded) or '-'))
+
+
+if __name__ == "__main__":
+    run()
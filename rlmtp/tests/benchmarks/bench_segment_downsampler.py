@@ -0,0 +1,47 @@
+"""
+Scaling of the segment-parallel downsampler with the number of processes.
+Run this file from the command line:
+>>> python bench_segment_downsampler.py
+"""
+import contextlib
+import io
+import os
+import time
+import numpy as np
+import pandas as pd
+from rlmtp.downsampler import segment_breaks, segment_downsampler, stress_strain_peaks, downsample_error
+from rlmtp.tests.unit_tests.synthetic import cyclic_stress_strain
+
+
+def _time(fun, *args, **kwargs):
+    t0 = time.perf_counter()
+    # Silence the progress of downsample_loop
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = fun(*args, **kwargs)
+    return [result, time.perf_counter() - t0]
+
+
+def run(n=2 * 10 ** 6, n_cycles=1000, jobs=None, use_global=True, tol=0.005):
+    """ Prints the time and the error of segment_downsampler for each number of processes in jobs. """
+    if jobs is None:
+        n_cpu = os.cpu_count()
+        jobs = sorted(set([1, 2, 4, 8, n_cpu]))
+        jobs = [j for j in jobs if j <= n_cpu]
+    strain, stress = cyclic_stress_strain(n, n_cycles=n_cycles)
+    d = np.column_stack([strain, stress])
+    ind_ss, _ = stress_strain_peaks(pd.DataFrame({'e_true': strain, 'Sigma_true': stress}))
+    ind_ss = sorted(set(ind_ss))
+    print('n = {0}, global criteria = {1}, tol = {2}'.format(n, use_global, tol))
+    print('{0:>6} {1:>10} {2:>10} {3:>10} {4:>10}'.format('jobs', 'time [s]', 'speedup', '# points', 'error'))
+    t_serial = None
+    for n_jobs in jobs:
+        breaks = segment_breaks(ind_ss, 2 * n_jobs)
+        ind, t = _time(segment_downsampler, d.copy(), breaks, tol, use_global=use_global, n_jobs=n_jobs)
+        if t_serial is None:
+            t_serial = t
+        e = downsample_error(d.copy(), ind)
+        print('{0:>6} {1:>10.3f} {2:>10.2f} {3:>10} {4:>10.3%}'.format(n_jobs, t, t_serial / t, len(ind), e))
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,306 @@
+"""
+Times the main processing steps on synthetic Dion7 and catman data, and compares the times with a saved baseline.
+
+Run this file from the command line:
+>>> python bench_suite.py --output results.json
+>>> python bench_suite.py --output results.json --baseline baseline.json
+
+Notes:
+======
+    - The data is generated for each loading protocol in synthetic.SPECIMEN_KINDS and each number of entries.
+    - Each step is repeated and the median and minimum times are saved, see BENCHMARKS for the steps.
+    - A step is flagged as a regression if its median time is more than threshold times the baseline median, and
+    the difference is more than min_delta seconds (short steps are dominated by noise).
+    - The Excel files are limited to EXCEL_LIMIT entries by default, and the slow steps have their own limits in
+    SIZE_LIMITS, the larger cases are skipped.
+"""
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+import rlmtp
+from rlmtp.readers import ExcelDion7Reader, CsvDion7Reader
+from rlmtp.sync_temperature import sync_temperature
+from rlmtp.find_peaks import find_peaks
+from rlmtp.downsampler import stress_strain_peaks, rlmtp_downsampler
+from rlmtp.yield_properties import yield_properties
+from rlmtp.processing import generate_output
+from rlmtp.tests.unit_tests.synthetic import SPECIMEN_KINDS, dion7_frame, catman_frame, dion7_timed_data, \
+    catman_timed_data, write_dion7_excel, write_dion7_csv
+
+RESULTS_VERSION = 1
+DEFAULT_SIZES = (10 ** 3, 10 ** 4, 10 ** 5, 10 ** 6, 10 ** 7)
+DEFAULT_THRESHOLD = 1.25
+DEFAULT_MIN_DELTA = 0.01
+# Largest number of entries for the slow steps, writing the Excel files is also slow
+EXCEL_LIMIT = 10 ** 5
+SIZE_LIMITS = {
+    'ExcelDion7Reader.read': EXCEL_LIMIT,
+    'CsvDion7Reader.read': 10 ** 6,
+    'rlmtp_downsampler[global]': 10 ** 6,
+    'generate_output': 10 ** 6
+}
+
+
+class BenchCase:
+    """ Synthetic data of one loading protocol and number of entries, shared by the benchmarks. """
+    __slots__ = ('kind', 'n', 'work_dir', 'dion7_frame', 'dion7', 'catman', '_excel_file', '_csv_file')
+
+    def __init__(self, kind, n, work_dir, temperature=True):
+        """ Constructor.
+
+        :param str kind: Loading protocol, see synthetic.specimen_stress_strain.
+        :param int n: Number of Dion7 entries.
+        :param str work_dir: Directory for the files written by the benchmarks.
+        :param bool temperature: If True, catman temperature data is generated that covers the Dion7 times.
+        """
+        self.kind = kind
+        self.n = n
+        self.work_dir = work_dir
+        self.dion7_frame = dion7_frame(n, kind=kind)
+        self.dion7 = dion7_timed_data(self.dion7_frame)
+        self.catman = None
+        if temperature:
+            # catman starts before Dion7 and ends after it
+            self.catman = catman_timed_data(catman_frame(n + 600))
+        self._excel_file = None
+        self._csv_file = None
+
+    @property
+    def data(self):
+        """ Stress-strain data, as in process_specimen_data before the downsampling. """
+        return self.dion7.data
+
+    def excel_file(self):
+        """ Returns the path to the Dion7 Excel file of the case, the file is written on the first call. """
+        if self._excel_file is None:
+            self._excel_file = os.path.join(self.work_dir, '{0}_{1}.xlsx'.format(self.kind, self.n))
+            write_dion7_excel(self._excel_file, self.dion7_frame)
+        return self._excel_file
+
+    def csv_file(self):
+        """ Returns the path to the Dion7 CSV file of the case, the file is written on the first call. """
+        if self._csv_file is None:
+            self._csv_file = os.path.join(self.work_dir, '{0}_{1}.csv'.format(self.kind, self.n))
+            write_dion7_csv(self._csv_file, self.dion7_frame)
+        return self._csv_file
+
+
+def _read_dion7(case):
+    file = case.excel_file()
+    return lambda: ExcelDion7Reader().read(file)
+
+
+def _read_dion7_csv(case):
+    file = case.csv_file()
+    return lambda: CsvDion7Reader().read(file)
+
+
+def _sync_temperature(case):
+    if case.catman is None:
+        return None
+    return lambda: sync_temperature(case.dion7, case.catman)
+
+
+def _find_peaks(case):
+    sigma_true = case.data['Sigma_true']
+    return lambda: find_peaks(sigma_true)
+
+
+def _stress_strain_peaks(case):
+    return lambda: stress_strain_peaks(case.data)
+
+
+def _downsampler(use_local_error, downsample_tol):
+    def setup(case):
+        return lambda: rlmtp_downsampler(case.data, use_local_error=use_local_error, downsample_tol=downsample_tol)
+    return setup
+
+
+def _yield_properties(case):
+    return lambda: yield_properties(case.data)
+
+
+def _generate_output(case):
+    def step():
+        # New directory each time, else the figures are skipped as up-to-date
+        output_dir = tempfile.mkdtemp(dir=case.work_dir)
+        try:
+            generate_output(case.data, output_dir, 'bench')
+        finally:
+            shutil.rmtree(output_dir)
+    return step
+
+
+# Name: function that returns the step to time for a BenchCase, or None if the step does not apply
+BENCHMARKS = {
+    'ExcelDion7Reader.read': _read_dion7,
+    'CsvDion7Reader.read': _read_dion7_csv,
+    'sync_temperature': _sync_temperature,
+    'find_peaks': _find_peaks,
+    'stress_strain_peaks': _stress_strain_peaks,
+    'rlmtp_downsampler[local]': _downsampler(True, 0.001),
+    'rlmtp_downsampler[global]': _downsampler(False, 0.005),
+    'yield_properties': _yield_properties,
+    'generate_output': _generate_output
+}
+
+
+def time_step(step, repeat):
+    """ Returns the times in seconds of repeat calls of step, the output of the step is silenced. """
+    times = []
+    for _ in range(repeat):
+        with contextlib.redirect_stdout(io.StringIO()):
+            t0 = time.perf_counter()
+            step()
+            times.append(time.perf_counter() - t0)
+    return times
+
+
+def result_key(result):
+    """ Returns the key that identifies a benchmark result across runs. """
+    return '{0}|{1}|{2}'.format(result['name'], result['kind'], result['n'])
+
+
+def run(sizes=DEFAULT_SIZES, kinds=SPECIMEN_KINDS, names=None, repeat=3, temperature=True, size_limits=None):
+    """ Returns the results of the benchmarks, the times are printed as they are measured.
+
+    :param list sizes: (int) Numbers of Dion7 entries.
+    :param list kinds: (str) Loading protocols, see synthetic.SPECIMEN_KINDS.
+    :param list names: (str) Benchmarks to run, if None then all the BENCHMARKS.
+    :param int repeat: Number of times each step is timed.
+    :param bool temperature: If True, the cases include catman temperature data.
+    :param dict size_limits: Largest number of entries of each benchmark, if None then SIZE_LIMITS.
+    :return dict: Results with keys 'meta' and 'results', see save_results.
+    """
+    if names is None:
+        names = list(BENCHMARKS)
+    if size_limits is None:
+        size_limits = SIZE_LIMITS
+    results = []
+    work_dir = tempfile.mkdtemp()
+    print('{0:<28} {1:<10} {2:>10} {3:>12} {4:>12}'.format('benchmark', 'kind', 'n', 'median [s]', 'min [s]'))
+    try:
+        for n in sizes:
+            for kind in kinds:
+                case = BenchCase(kind, n, work_dir, temperature=temperature)
+                for name in names:
+                    if n > size_limits.get(name, n):
+                        continue
+                    step = BENCHMARKS[name](case)
+                    if step is None:
+                        continue
+                    times = time_step(step, repeat)
+                    results.append({'name': name, 'kind': kind, 'n': n, 'times': times,
+                                    'median': statistics.median(times), 'min': min(times)})
+                    print('{0:<28} {1:<10} {2:>10} {3:>12.4f} {4:>12.4f}'.format(name, kind, n, results[-1]['median'],
+                                                                                 results[-1]['min']))
+                del case
+    finally:
+        shutil.rmtree(work_dir)
+    meta = {
+        'version': RESULTS_VERSION,
+        'date': datetime.datetime.now().isoformat(timespec='seconds'),
+        'rlmtp': rlmtp.__version__,
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'repeat': repeat
+    }
+    return {'meta': meta, 'results': results}
+
+
+def save_results(results, file):
+    """ Writes the results from run to a JSON file. """
+    with open(file, 'w') as f:
+        json.dump(results, f, indent=1)
+
+
+def load_results(file):
+    """ Returns the results saved with save_results. """
+    with open(file) as f:
+        results = json.load(f)
+    if results.get('meta', {}).get('version') != RESULTS_VERSION:
+        raise ValueError('Results in {0} are not version {1}.'.format(file, RESULTS_VERSION))
+    return results
+
+
+def compare_results(results, baseline, threshold=DEFAULT_THRESHOLD, min_delta=DEFAULT_MIN_DELTA):
+    """ Returns the comparison of the results with the baseline.
+
+    :param dict results: Results from run.
+    :param dict baseline: Results from run, e.g., with load_results.
+    :param float threshold: A benchmark regresses if its median time is more than threshold times the baseline.
+    :param float min_delta: Differences in the median times less than min_delta seconds are not flagged.
+    :return list: [key, median, baseline median, ratio, is_regression] for each benchmark in both the results and
+        baseline.
+    """
+    base = {result_key(r): r for r in baseline['results']}
+    comparison = []
+    for r in results['results']:
+        key = result_key(r)
+        if key not in base:
+            continue
+        t_base = base[key]['median']
+        ratio = r['median'] / t_base if t_base > 0. else float('inf')
+        is_regression = ratio > threshold and r['median'] - t_base > min_delta
+        comparison.append([key, r['median'], t_base, ratio, is_regression])
+    return comparison
+
+
+def print_comparison(comparison):
+    """ Prints the output of compare_results. """
+    print('{0:<55} {1:>12} {2:>12} {3:>8}'.format('benchmark', 'median [s]', 'baseline [s]', 'ratio'))
+    for key, t, t_base, ratio, is_regression in comparison:
+        print('{0:<55} {1:>12.4f} {2:>12.4f} {3:>8.2f}{4}'.format(key, t, t_base, ratio,
+                                                                  '  REGRESSION' if is_regression else ''))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Time the rlmtp processing steps on synthetic data.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(DEFAULT_SIZES), help='Numbers of entries.')
+    parser.add_argument('--kinds', nargs='+', default=list(SPECIMEN_KINDS), choices=list(SPECIMEN_KINDS),
+                        help='Loading protocols.')
+    parser.add_argument('--only', nargs='+', default=None, choices=list(BENCHMARKS), help='Benchmarks to run.')
+    parser.add_argument('--repeat', type=int, default=3, help='Number of times each step is timed.')
+    parser.add_argument('--no-temperature', action='store_true', help='Do not generate catman temperature data.')
+    parser.add_argument('--excel-limit', type=int, default=EXCEL_LIMIT,
+                        help='Largest number of entries of the Excel files.')
+    parser.add_argument('--output', default=None, help='JSON file to save the results.')
+    parser.add_argument('--baseline', default=None, help='JSON file with the results to compare to.')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='Ratio of the median times that is flagged as a regression.')
+    parser.add_argument('--min-delta', type=float, default=DEFAULT_MIN_DELTA,
+                        help='Differences in seconds that are never flagged.')
+    args = parser.parse_args(argv)
+    size_limits = dict(SIZE_LIMITS)
+    size_limits['ExcelDion7Reader.read'] = args.excel_limit
+    results = run(sizes=args.sizes, kinds=args.kinds, names=args.only, repeat=args.repeat,
+                  temperature=not args.no_temperature, size_limits=size_limits)
+    if args.output is not None:
+        save_results(results, args.output)
+    if args.baseline is not None:
+        comparison = compare_results(results, load_results(args.baseline), threshold=args.threshold,
+                                     min_delta=args.min_delta)
+        print_comparison(comparison)
+        n_regressions = sum(c[-1] for c in comparison)
+        if n_regressions > 0:
+            print('{0} regression(s) compared to {1}.'.format(n_regressions, args.baseline))
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
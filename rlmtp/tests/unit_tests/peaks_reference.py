@@ -0,0 +1,78 @@
+"""
+Original loop implementations of find_peaks and find_peaks2, used as the reference in the tests and benchmarks.
+"""
+
+
+def find_peaks_loop(x):
+    """ Original loop implementation of find_peaks. """
+    current_max = 0.
+    max_ind = 0
+    current_min = 0.
+    min_ind = 0
+    if x[x.index[0]] > 0.:
+        is_positive = True
+    else:
+        is_positive = False
+    peaks = []
+    for i, xi in x.items():
+        if xi > 0.:
+            if not is_positive:
+                peaks.append(min_ind)
+                is_positive = True
+                current_min = 0.
+            if xi > current_max:
+                current_max = xi
+                max_ind = i
+        else:
+            if is_positive:
+                peaks.append(max_ind)
+                is_positive = False
+                current_max = 0.
+            if xi < current_min:
+                current_min = xi
+                min_ind = i
+    if current_min == 0.:
+        peaks.append(max_ind)
+    else:
+        peaks.append(min_ind)
+    peaks.append(len(x) - 1)
+    return peaks
+
+
+def find_peaks2_loop(x, y):
+    """ Original loop implementation of find_peaks2. """
+    current_max = 0.
+    max_ind = 0
+    current_min = 0.
+    min_ind = 0
+    if y[y.index[0]] > 0.:
+        is_positive = True
+    else:
+        is_positive = False
+    peaks = []
+    for i, xi in x.items():
+        yi = y.loc[i]
+        if yi > 0.:
+            if not is_positive:
+                peaks.append(min_ind)
+                is_positive = True
+                current_min = 0.
+                current_max = xi
+            if xi > current_max:
+                current_max = xi
+                max_ind = i
+        else:
+            if is_positive:
+                peaks.append(max_ind)
+                is_positive = False
+                current_max = 0.
+                current_min = xi
+            if xi < current_min:
+                current_min = xi
+                min_ind = i
+    if current_min == 0.:
+        peaks.append(max_ind)
+    else:
+        peaks.append(min_ind)
+    peaks.append(len(x) - 1)
+    return peaks
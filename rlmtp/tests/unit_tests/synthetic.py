@@ -0,0 +1,259 @@
+"""@package synthetic
+Generators for synthetic test data used in the unit tests and the benchmarks.
+"""
+import datetime
+import numpy as np
+import pandas as pd
+from rlmtp.readers import ExcelDion7Reader, deduce_microseconds_ns
+from rlmtp.timed_data import TimedData
+from rlmtp.downsampler import scale_data
+
+
+def dion7_system_times(n, dt_ms=10, start='2019-07-01T13:05:53.963', stamped_fraction=0.9, seed=0):
+    """ Returns Dion7-like System Date values where some of the entries are missing the milliseconds.
+
+    :param int n: Number of entries.
+    :param int dt_ms: Sampling period in milliseconds.
+    :param str start: Time of the first entry.
+    :param float stamped_fraction: Fraction of entries that keep their milliseconds.
+    :param int seed: Seed for the random number generator.
+    :return np.ndarray: (n, ) datetime64[ns] times.
+    """
+    rng = np.random.default_rng(seed)
+    t = np.datetime64(start, 'ns') + np.arange(n) * np.timedelta64(dt_ms, 'ms')
+    t_ns = t.view('int64').copy()
+    unstamped = rng.random(n) > stamped_fraction
+    # Truncate to the second, as in the Dion7 export when the milliseconds are missing
+    t_ns[unstamped] = t_ns[unstamped] // 10 ** 9 * 10 ** 9
+    return t_ns.view('datetime64[ns]')
+
+
+def cyclic_stress_strain(n, n_cycles=20, amplitude=0.02, f_y=355., lag=0.3, noise=0.5, seed=0):
+    """ Returns true strain and stress of a cyclic test with increasing amplitude.
+
+    :param int n: Number of entries.
+    :param int n_cycles: Number of full cycles.
+    :param float amplitude: Strain amplitude of the last cycle.
+    :param float f_y: Stress amplitude.
+    :param float lag: Phase lag of the strain relative to the stress in radians, mimics the hysteresis.
+    :param float noise: Standard deviation of the noise added to the stress.
+    :param int seed: Seed for the random number generator.
+    :return list: [np.ndarray, np.ndarray] (n, ) strain and stress.
+    """
+    rng = np.random.default_rng(seed)
+    phase = np.linspace(0., 2. * np.pi * n_cycles, n)
+    strain = amplitude * np.linspace(0.1, 1., n) * np.sin(phase - lag)
+    stress = f_y * np.tanh(3. * np.sin(phase)) + rng.normal(scale=noise, size=n)
+    return [strain, stress]
+
+
+def cyclic_curve(n, scaled=False, **kwargs):
+    """ Returns the strain and stress of cyclic_stress_strain as the columns of an (n, 2) array.
+
+    :param int n: Number of entries.
+    :param bool scaled: If True, then the columns are scaled as in rlmtp.downsampler.scale_data.
+    :param kwargs: Other parameters of cyclic_stress_strain.
+    :return np.ndarray: (n, 2) strain and stress.
+    """
+    d = np.column_stack(cyclic_stress_strain(n, **kwargs))
+    if scaled:
+        d, _, _ = scale_data(d)
+    return d
+
+
+# Loading protocols of the synthetic specimens
+SPECIMEN_KINDS = ('monotonic', 'cyclic', 'fatigue')
+# Rows of the Excel exports, the Dion7 header is on row 7 (ExcelDion7Reader(start_row=8)) and the catman header is
+# on row 2 followed by 47 rows of channel information
+DION7_HEADER_ROW = 6
+CATMAN_HEADER_ROW = 1
+CATMAN_PREAMBLE_ROWS = 47
+# Maximum number of rows in an Excel worksheet
+EXCEL_MAX_ROWS = 1048576 - DION7_HEADER_ROW - 1
+
+
+def specimen_stress_strain(n, kind='cyclic', elastic_modulus=200.e3, f_y=355., noise=0.5, seed=0):
+    """ Returns true strain and stress of a synthetic specimen.
+
+    :param int n: Number of entries.
+    :param str kind: Loading protocol, one of SPECIMEN_KINDS.
+    :param float elastic_modulus: Initial slope of the stress-strain curve.
+    :param float f_y: Yield stress.
+    :param float noise: Standard deviation of the noise added to the stress.
+    :param int seed: Seed for the random number generator.
+    :return list: [np.ndarray, np.ndarray] (n, ) strain and stress.
+
+    Notes:
+    ======
+        - 'monotonic': tension to 20% strain with a hardening response.
+        - 'cyclic': increasing amplitude up to 2% strain, one cycle per 1000 entries (at least 20).
+        - 'fatigue': constant amplitude of 1% strain, one cycle per 500 entries (at least 20).
+        - The first cycle of the cyclic protocols starts with elastic loading in tension so that the yield properties
+        can be computed.
+    """
+    rng = np.random.default_rng(seed)
+    if kind == 'monotonic':
+        strain = np.linspace(0., 0.2, n)
+        stress = f_y * np.tanh(elastic_modulus * strain / f_y) + 150. * (1. - np.exp(-20. * strain))
+    elif kind in ('cyclic', 'fatigue'):
+        if kind == 'cyclic':
+            n_cycles = max(20, n // 1000)
+            amplitude = 0.02 * np.linspace(0.1, 1., n)
+        else:
+            n_cycles = max(20, n // 500)
+            amplitude = np.full(n, 0.01)
+        strain = amplitude * np.sin(np.linspace(0., 2. * np.pi * n_cycles, n))
+        # Masing-type response from the strain change since the last reversal
+        reversal = np.flatnonzero(np.diff(np.sign(np.diff(strain))) != 0) + 1
+        run = np.zeros(n, dtype=np.int64)
+        run[reversal] = 1
+        run = np.cumsum(run)
+        e_0 = np.concatenate([[0.], strain[reversal]])[run]
+        s_0 = 2. * f_y * np.tanh(elastic_modulus * (strain - e_0) / (2. * f_y))
+        # Stress at each reversal, first segment starts from zero stress
+        s_rev = np.zeros(len(reversal) + 1)
+        for k, i in enumerate(reversal):
+            s_rev[k + 1] = np.clip(s_rev[k] + s_0[i - 1], -1.2 * f_y, 1.2 * f_y)
+        stress = np.clip(s_rev[run] + s_0, -1.2 * f_y, 1.2 * f_y)
+    else:
+        raise ValueError('Unknown kind "{0}", options are {1}.'.format(kind, SPECIMEN_KINDS))
+    stress = stress + rng.normal(scale=noise, size=n)
+    return [strain, stress]
+
+
+def dion7_frame(n, kind='cyclic', dt_ms=50, start='2019-07-01T13:05:53.963', area=28.1, seed=0):
+    """ Returns a DataFrame with the columns of a Dion7 export, as read by ExcelDion7Reader before renaming.
+
+    :param int n: Number of entries.
+    :param str kind: Loading protocol, see specimen_stress_strain.
+    :param int dt_ms: Sampling period in milliseconds.
+    :param str start: Time of the first entry.
+    :param float area: Cross-sectional area of the specimen in mm^2, used for the force.
+    :param int seed: Seed for the random number generator.
+    :return pd.DataFrame: Dion7 data.
+    """
+    e_true, sigma_true = specimen_stress_strain(n, kind=kind, seed=seed)
+    e_eng = np.expm1(e_true)
+    sigma_eng = sigma_true / (1. + e_eng)
+    time = dt_ms / 1000. * np.arange(1, n + 1)
+    return pd.DataFrame({
+        'S/No': np.arange(1, n + 1),
+        'System Date': dion7_system_times(n, dt_ms=dt_ms, start=start, seed=seed),
+        'C_1_Temps[s]': time,
+        'C_1_Force[kN]': sigma_eng * area / 1000.,
+        'C_1_Déplacement[mm]': 8. * e_eng,
+        'C_1_Cycles[]': np.zeros(n, dtype=np.int64),
+        'sigma [Mpa]': sigma_eng,
+        'epsilon': e_eng,
+        'e_true': e_true,
+        'sigma_true': sigma_true
+    })
+
+
+def catman_frame(n, dt_ms=50, n_temperature=1, t_0=22., t_rise=15., seed=0):
+    """ Returns a DataFrame with the data columns of a catman export, without the preamble.
+
+    :param int n: Number of entries.
+    :param int dt_ms: Sampling period in milliseconds.
+    :param int n_temperature: Number of thermocouples.
+    :param float t_0: Initial temperature in deg C.
+    :param float t_rise: Temperature rise over the test in deg C.
+    :param int seed: Seed for the random number generator.
+    :return pd.DataFrame: catman data.
+    """
+    rng = np.random.default_rng(seed)
+    time = dt_ms / 1000. * np.arange(n)
+    # The channel names are padded with spaces in the exports
+    data = {'Time  1 - default sample rate'.ljust(64): time, 'Load'.ljust(64): rng.normal(scale=0.01, size=n)}
+    rise = t_rise * (1. - np.exp(-3. * np.arange(n) / n))
+    for k in range(n_temperature):
+        name = 'Temperature' if k == 0 else 'Temperature {0}'.format(k + 1)
+        data[name.ljust(64)] = t_0 + rise + rng.normal(scale=0.01, size=n)
+    return pd.DataFrame(data)
+
+
+def dion7_timed_data(frame, dt_ms=50):
+    """ Returns the TimedData from ExcelDion7Reader.read for a frame from dion7_frame, without writing the file. """
+    data = frame.rename(columns=ExcelDion7Reader.column_names)
+    time_ns = deduce_microseconds_ns(data['System Date'].to_numpy(dtype='datetime64[ns]').view('int64'))
+    data['System Date'] = time_ns.view('datetime64[ns]')
+    start_time = data['System Date'][0].to_pydatetime() - datetime.timedelta(milliseconds=dt_ms)
+    return TimedData(data, start_time, pd.Timedelta(milliseconds=dt_ms))
+
+
+def catman_timed_data(frame, start='2019-07-01T13:05:40', dt_ms=50):
+    """ Returns the TimedData from ExcelCatmanReader.read for a frame from catman_frame, without writing the file. """
+    start_time = pd.Timestamp(start).to_pydatetime()
+    rename = {frame.columns[0]: 'Time[s]'}
+    temperature = [c for c in frame.columns if c.startswith('Temperature')]
+    for k, c in enumerate(temperature):
+        rename[c] = 'Temperature[C]' if k == 0 else 'Temperature_{0}[C]'.format(k + 1)
+    data = frame.rename(columns=rename)
+    data['System Date'] = pd.Timestamp(start_time) + pd.to_timedelta(np.arange(len(data)) * dt_ms, unit='ms')
+    return TimedData(data, start_time, datetime.timedelta(milliseconds=dt_ms))
+
+
+def write_dion7_excel(file, frame):
+    """ Writes the frame from dion7_frame in the layout of a Dion7 export, see ExcelDion7Reader.
+
+    - The specimen properties are in the first rows and the header is on row 7.
+    - Excel worksheets are limited to EXCEL_MAX_ROWS entries.
+    """
+    if len(frame) > EXCEL_MAX_ROWS:
+        raise ValueError('Excel files are limited to {0} entries.'.format(EXCEL_MAX_ROWS))
+    with pd.ExcelWriter(file, engine='openpyxl') as writer:
+        pd.DataFrame([['L0', 8, 'mm', None, 'D', 5.98, 'mm'], [None, None, None, None, 'A', 28.1, 'mm2']]).to_excel(
+            writer, header=False, index=False)
+        frame.to_excel(writer, startrow=DION7_HEADER_ROW, index=False)
+
+
+def write_catman_excel(file, frame, start='2019-07-01T13:05:40', dt_ms=50):
+    """ Writes the frame from catman_frame in the layout of a catman export, see ExcelCatmanReader.
+
+    - The header is on row 2 and is followed by 47 rows of channel information, the third of which has the start time.
+    """
+    if len(frame) > EXCEL_MAX_ROWS - CATMAN_PREAMBLE_ROWS:
+        raise ValueError('Excel files are limited to {0} entries.'.format(EXCEL_MAX_ROWS - CATMAN_PREAMBLE_ROWS))
+    preamble = pd.DataFrame(None, index=range(CATMAN_PREAMBLE_ROWS), columns=frame.columns, dtype=object)
+    preamble.iloc[0, :] = 's'
+    preamble.iloc[2, :] = pd.Timestamp(start).strftime('%m.%d.%y %H:%M:%S')
+    preamble.iloc[3, :] = '{0:.2f} ms ({1:g} Hz)'.format(dt_ms, 1000. / dt_ms)
+    with pd.ExcelWriter(file, engine='openpyxl') as writer:
+        pd.DataFrame([['File comment: ']]).to_excel(writer, header=False, index=False)
+        pd.concat([preamble, frame.astype(object)]).to_excel(writer, startrow=CATMAN_HEADER_ROW, index=False)
+
+
+def write_dion7_csv(file, frame, sep=',', encoding='utf-8'):
+    """ Writes the frame from dion7_frame in the layout of write_dion7_excel as a delimited file, see CsvDion7Reader.
+
+    - The System Date entries are written as 'YYYY-MM-DD HH:MM:SS.fff', without the milliseconds if they are missing.
+    - The decimal separator is ',' for ';' delimited files.
+    """
+    frame = frame.copy()
+    times = pd.Series(frame['System Date'])
+    has_ms = times.dt.microsecond != 0
+    frame['System Date'] = times.dt.strftime('%Y-%m-%d %H:%M:%S.%f').str[:23].where(
+        has_ms, times.dt.strftime('%Y-%m-%d %H:%M:%S'))
+    with open(file, 'w', newline='', encoding=encoding) as f:
+        f.write(sep.join(['L0', '8', 'mm', '', 'D', '5.98', 'mm']) + '\n')
+        f.write(sep.join(['', '', '', '', 'A', '28.1', 'mm2']) + '\n')
+        f.write('\n' * (DION7_HEADER_ROW - 2))
+        frame.to_csv(f, sep=sep, index=False, decimal=',' if sep == ';' else '.')
+
+
+def write_catman_csv(file, frame, start='2019-07-01T13:05:40', dt_ms=50, sep=','):
+    """ Writes the frame from catman_frame in the layout of write_catman_excel as a delimited file, see CsvCatmanReader.
+
+    - The decimal separator is ',' for ';' delimited files.
+    """
+    n_columns = len(frame.columns)
+    preamble = [[''] * n_columns for _ in range(CATMAN_PREAMBLE_ROWS)]
+    preamble[0] = ['s'] * n_columns
+    preamble[2] = [pd.Timestamp(start).strftime('%m.%d.%y %H:%M:%S')] * n_columns
+    preamble[3] = ['{0:.2f} ms ({1:g} Hz)'.format(dt_ms, 1000. / dt_ms)] * n_columns
+    with open(file, 'w', newline='', encoding='utf-8') as f:
+        f.write('File comment: ' + sep * (n_columns - 1) + '\n')
+        f.write(sep.join(frame.columns) + '\n')
+        for row in preamble:
+            f.write(sep.join(row) + '\n')
+        frame.to_csv(f, sep=sep, index=False, header=False, decimal=',' if sep == ';' else '.')
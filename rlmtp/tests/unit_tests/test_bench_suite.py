@@ -0,0 +1,53 @@
+from unittest import TestCase
+import os
+import shutil
+import tempfile
+import warnings
+import numpy as np
+from rlmtp.readers import ExcelDion7Reader, ExcelCatmanReader
+from rlmtp.tests.unit_tests.synthetic import dion7_frame, catman_frame, dion7_timed_data, catman_timed_data, \
+    write_dion7_excel, write_catman_excel
+from rlmtp.tests.benchmarks.bench_suite import compare_results
+
+
+class TestSyntheticData(TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_dion7_excel(self):
+        frame = dion7_frame(300, kind='fatigue')
+        file = os.path.join(self.dir, 'dion7.xlsx')
+        write_dion7_excel(file, frame)
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            data = ExcelDion7Reader().read(file)
+        expected = dion7_timed_data(frame)
+        self.assertEqual(data.start_time, expected.start_time)
+        self.assertEqual(list(data.data.columns), list(expected.data.columns))
+        np.testing.assert_array_equal(data.data['System Date'].to_numpy(), expected.data['System Date'].to_numpy())
+        np.testing.assert_allclose(data.data['Sigma_true'], expected.data['Sigma_true'])
+
+    def test_catman_excel(self):
+        frame = catman_frame(300, n_temperature=2)
+        file = os.path.join(self.dir, 'catman.xlsx')
+        write_catman_excel(file, frame)
+        data = ExcelCatmanReader().read(file)
+        expected = catman_timed_data(frame)
+        self.assertEqual(data.start_time, expected.start_time)
+        self.assertEqual(list(data.data.columns), list(expected.data.columns))
+        np.testing.assert_allclose(data.data['Temperature_2[C]'].astype(float), expected.data['Temperature_2[C]'])
+
+
+class TestCompareResults(TestCase):
+    def test_regressions(self):
+        def results(times):
+            return {'results': [{'name': 'find_peaks', 'kind': 'cyclic', 'n': n, 'median': t} for n, t in times]}
+        baseline = results([[10, 1.0e-4], [100, 1.0], [1000, 2.0]])
+        comparison = compare_results(results([[10, 5.0e-4], [100, 1.5], [1000, 2.1], [10000, 9.]]), baseline)
+        self.assertEqual([c[0] for c in comparison], ['find_peaks|cyclic|10', 'find_peaks|cyclic|100',
+                                                      'find_peaks|cyclic|1000'])
+        # Small absolute differences are not regressions
+        self.assertEqual([c[-1] for c in comparison], [False, True, False])
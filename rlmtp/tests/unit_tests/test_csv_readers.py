@@ -0,0 +1,90 @@
+from unittest import TestCase
+import os
+import shutil
+import tempfile
+import warnings
+import numpy as np
+import pandas as pd
+from rlmtp.readers import CsvDion7Reader, ExcelDion7Reader, ExcelCatmanReader, dion7_reader, catman_reader, \
+    parse_system_date, sniff_delimiter, sniff_encoding
+from rlmtp.tests.unit_tests.synthetic import dion7_frame, catman_frame, write_dion7_excel, write_dion7_csv, \
+    write_catman_excel, write_catman_csv
+
+START = '2019-07-01T13:05:53.000'
+
+
+class TestCsvDion7Reader(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.dir = tempfile.mkdtemp()
+        cls.frame = dion7_frame(2000, kind='cyclic', start=START)
+        cls.excel_file = os.path.join(cls.dir, 'testData.xlsx')
+        write_dion7_excel(cls.excel_file, cls.frame)
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            cls.expected = ExcelDion7Reader().read(cls.excel_file)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.dir)
+
+    def test_same_as_excel(self):
+        for sep in [',', '\t', ';']:
+            file = os.path.join(self.dir, 'testData.csv')
+            write_dion7_csv(file, self.frame, sep=sep)
+            self.assertEqual(sniff_delimiter(file, 6), sep)
+            self.assertIsInstance(dion7_reader(file), CsvDion7Reader)
+            data = dion7_reader(file).read(file)
+            self.assertEqual(list(data.data.columns), ['System Date', 'C_1_Temps[s]', 'e_true', 'Sigma_true'])
+            self.assertEqual(data.start_time, self.expected.start_time)
+            self.assertEqual(data.sample_rate_ms, self.expected.sample_rate_ms)
+            np.testing.assert_array_equal(data.data['System Date'].to_numpy(),
+                                          self.expected.data['System Date'].to_numpy())
+            for c in ['C_1_Temps[s]', 'e_true', 'Sigma_true']:
+                self.assertEqual(data.data[c].dtype, np.float64)
+                np.testing.assert_allclose(data.data[c], self.expected.data[c], rtol=1.e-12, atol=1.e-12)
+
+    def test_all_columns_and_chunks(self):
+        file = os.path.join(self.dir, 'testData.tsv')
+        write_dion7_csv(file, self.frame, sep='\t', encoding='cp1252')
+        self.assertEqual(sniff_encoding(file), 'latin-1')
+        reader = CsvDion7Reader(columns=None)
+        data = reader.read(file)
+        self.assertEqual(list(data.data.columns), list(self.expected.data.columns))
+        chunks = pd.concat(list(reader.iter_chunks(file, chunk_size=300)))
+        # read has the index as strings, as in ExcelDion7Reader
+        pd.testing.assert_frame_equal(chunks, data.data.reset_index(drop=True))
+
+    def test_parse_system_date(self):
+        values = pd.Series(['11.12.2018 14:50:47', '11.12.2018 14:50:48.023', '11.12.2018 14:50:48.5'])
+        expected = pd.to_datetime(['2018-12-11 14:50:47.000', '2018-12-11 14:50:48.023', '2018-12-11 14:50:48.500'])
+        times = parse_system_date(values, time_format='%d.%m.%Y %H:%M:%S')
+        np.testing.assert_array_equal(times.to_numpy(), expected.to_numpy())
+        # Inferred as in ExcelDion7Reader
+        times = parse_system_date(values)
+        self.assertEqual(times[1], pd.to_datetime(values[1]))
+
+
+class TestCsvCatmanReader(TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_same_as_excel(self):
+        frame = catman_frame(500, n_temperature=2)
+        excel_file = os.path.join(self.dir, 'Temperature.xlsx')
+        write_catman_excel(excel_file, frame)
+        self.assertIsInstance(catman_reader(excel_file), ExcelCatmanReader)
+        expected = catman_reader(excel_file).read(excel_file)
+        file = os.path.join(self.dir, 'Temperature.csv')
+        write_catman_csv(file, frame)
+        data = catman_reader(file).read(file)
+        # The channels that are not used are skipped
+        self.assertEqual(list(data.data.columns), ['Time[s]', 'Temperature[C]', 'Temperature_2[C]', 'System Date'])
+        self.assertEqual(data.start_time, expected.start_time)
+        self.assertEqual(data.sample_rate_ms, expected.sample_rate_ms)
+        np.testing.assert_array_equal(data.data['System Date'].to_numpy(), expected.data['System Date'].to_numpy())
+        for c in ['Time[s]', 'Temperature[C]', 'Temperature_2[C]']:
+            np.testing.assert_allclose(data.data[c], expected.data[c].astype(float), rtol=1.e-12, atol=1.e-12)
@@ -0,0 +1,88 @@
+from unittest import TestCase
+import os
+import shutil
+import tempfile
+import warnings
+import numpy as np
+import pandas as pd
+from rlmtp.processed_data import write_processed_data
+from rlmtp.curve_store import CurveStore, CurveStoreWriter, build_curve_store, read_tag_map, open_default_store, main
+
+
+class TestCurveStore(TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.store_dir = os.path.join(self.dir, 'curve_store')
+        rng = np.random.RandomState(2)
+        # Processed RLMTP data with and without temperature, and non-RLMTP data without an index
+        self.data = {
+            7: pd.DataFrame(rng.normal(size=(300, 4)), index=np.arange(0, 3000, 10),
+                            columns=['Time[s]', 'e_true', 'Sigma_true', 'Temperature[C]']),
+            3: pd.DataFrame(rng.normal(size=(50, 3)), index=np.arange(50) * 3,
+                            columns=['Time[s]', 'e_true', 'Sigma_true']),
+            12: pd.DataFrame(rng.normal(size=(80, 2)), columns=['e_true', 'Sigma_true'])
+        }
+        self.files = dict()
+        for tag, data in list(self.data.items()):
+            file = os.path.join(self.dir, 'specimen_{0}.npz'.format(tag))
+            if tag == 12:
+                file = os.path.join(self.dir, 'specimen_12.csv')
+                data.to_csv(file, index=False)
+                self.data[tag] = pd.read_csv(file)
+            else:
+                write_processed_data(data, file, output_format='npz')
+            self.files[tag] = file
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_build_and_read(self):
+        map_file = os.path.join(self.dir, 'db_tag_clean_data_map.csv')
+        with open(map_file, 'w') as f:
+            for tag, file in self.files.items():
+                f.write('{0},{1}\n'.format(tag, file))
+        store = build_curve_store(read_tag_map(map_file), self.store_dir)
+        self.assertEqual(store.tags, [7, 3, 12])
+        self.assertEqual(len(store), 3)
+        self.assertIn(3, store)
+        self.assertNotIn(4, store)
+        self.assertEqual(store.sources[12], self.files[12])
+        for tag, data in self.data.items():
+            curve = store.curve(tag, columns=['e_true', 'Sigma_true'])
+            np.testing.assert_array_equal(curve['e_true'], data['e_true'])
+            # Views of the mapped column, not copies
+            self.assertIsNotNone(curve['Sigma_true'].base)
+            self.assertFalse(curve['Sigma_true'].flags.writeable)
+            np.testing.assert_array_equal(store.rows(tag), data.index)
+            pd.testing.assert_frame_equal(store.frame(tag), data, check_index_type=False)
+        self.assertTrue(np.all(np.isnan(store.curve(3)['Temperature[C]'])))
+        with self.assertRaises(KeyError):
+            store.curve(4)
+
+    def test_rebuild_and_abort(self):
+        build_curve_store(self.files, self.store_dir)
+        # The existing store is kept if the writing fails
+        with self.assertRaises(ValueError):
+            with CurveStoreWriter(self.store_dir) as writer:
+                writer.add(1, self.data[3])
+                writer.add(1, self.data[3])
+        self.assertFalse(os.path.exists(self.store_dir + '.tmp'))
+        self.assertEqual(CurveStore(self.store_dir).tags, [7, 3, 12])
+        # Replaced by a new store
+        store = build_curve_store({5: self.files[7]}, self.store_dir)
+        self.assertEqual(store.tags, [5])
+        self.assertEqual(len(store.column('e_true')), 300)
+
+    def test_default_store(self):
+        map_file = os.path.join(self.dir, 'db_tag_clean_data_map.csv')
+        with open(map_file, 'w') as f:
+            f.write('3,{0}\n'.format(self.files[3]))
+        self.assertIsNone(open_default_store(self.dir))
+        self.assertEqual(main(['build', self.dir]), 0)
+        self.assertEqual(open_default_store(self.dir).tags, [3])
+        # Not used if the processed data was generated again after the store
+        t = os.path.getmtime(os.path.join(self.dir, 'curve_store', 'index.json'))
+        os.utime(map_file, (t + 10., t + 10.))
+        with warnings.catch_warnings(record=True):
+            warnings.simplefilter('always')
+            self.assertIsNone(open_default_store(self.dir))
@@ -0,0 +1,47 @@
+from unittest import TestCase
+import os
+import shutil
+import tempfile
+import pandas as pd
+from rlmtp.readers import ExcelCatmanReader
+from rlmtp.data_cache import cached_read, cache_entries, evict
+
+
+class CountingCatmanReader(ExcelCatmanReader):
+    def __init__(self):
+        ExcelCatmanReader.__init__(self)
+        self.n_reads = 0
+
+    def read(self, file):
+        self.n_reads += 1
+        return ExcelCatmanReader.read(self, file)
+
+
+class TestDataCache(TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+
+    def test_cached_read(self):
+        reader = CountingCatmanReader()
+        file = '../Temp_LP9_1_181211.XLSX'
+        data_1 = cached_read(reader, file, cache_dir=self.cache_dir)
+        self.assertEqual(len(cache_entries(self.cache_dir)), 1)
+        data_2 = cached_read(reader, file, cache_dir=self.cache_dir)
+
+        self.assertEqual(reader.n_reads, 1)
+        pd.testing.assert_frame_equal(data_1.data, data_2.data)
+        self.assertEqual(data_1.start_time, data_2.start_time)
+        self.assertEqual(data_1.sample_rate_ms, data_2.sample_rate_ms)
+
+    def test_evict(self):
+        reader = ExcelCatmanReader()
+        cached_read(reader, '../Temp_LP9_1_181211.XLSX', cache_dir=self.cache_dir)
+        self.assertEqual(evict(self.cache_dir, max_bytes=0), 1)
+        self.assertEqual(len(cache_entries(self.cache_dir)), 0)
+
+    def test_missing_file(self):
+        with self.assertRaises(FileNotFoundError):
+            cached_read(ExcelCatmanReader(), os.path.join(self.cache_dir, 'missing.xlsx'), cache_dir=self.cache_dir)
@@ -0,0 +1,45 @@
+from unittest import TestCase
+import numpy as np
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from rlmtp.decimation import minmax_decimate, display_indices, DECIMATION_THRESHOLD
+
+
+def render(x, y):
+    fig = Figure(figsize=(6.4, 4.8), dpi=100)
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+    ax.plot(x, y, c='0.15', lw=0.5)
+    fig.canvas.draw()
+    return np.asarray(fig.canvas.buffer_rgba())[:, :, :3].astype(int)
+
+
+class TestDecimation(TestCase):
+    def setUp(self):
+        # Cyclic test with increasing amplitude and measurement noise
+        t = np.linspace(0., 20. * np.pi, 500000)
+        rng = np.random.RandomState(0)
+        self.e = (0.001 + 0.02 * t / t[-1]) * np.sin(t) + 1.e-7 * rng.normal(size=len(t))
+        self.s = 400. * np.tanh(self.e / 0.002) + 0.2 * rng.normal(size=len(t))
+
+    def test_extremes(self):
+        i = minmax_decimate(self.e, self.s, 3840)
+        self.assertLess(len(i), len(self.e) / 3)
+        self.assertTrue(np.all(np.diff(i) > 0))
+        self.assertEqual([i[0], i[-1]], [0, len(self.e) - 1])
+        for a in [self.e, self.s]:
+            self.assertEqual(a[i].min(), a.min())
+            self.assertEqual(a[i].max(), a.max())
+
+    def test_same_figure(self):
+        i = minmax_decimate(self.e, self.s, 3840)
+        diff = np.abs(render(self.e, self.s) - render(self.e[i], self.s[i])).max(axis=2)
+        # Only slight differences in the anti-aliasing of a few pixels
+        self.assertLess(np.sum(diff > 32), 50)
+
+    def test_small_curves(self):
+        x = np.arange(DECIMATION_THRESHOLD, dtype=float)
+        np.testing.assert_array_equal(display_indices(x, x), np.arange(len(x)))
+        np.testing.assert_array_equal(minmax_decimate(np.ones(10), x[:10], 100), np.arange(10))
+        x[5] = np.nan
+        np.testing.assert_array_equal(minmax_decimate(x, x, 100), np.arange(len(x)))
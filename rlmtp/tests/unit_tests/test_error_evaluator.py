@@ -0,0 +1,24 @@
+from unittest import TestCase
+import numpy as np
+import polyprox
+from rlmtp.error_evaluator import EnergyErrorEvaluator
+from rlmtp.downsampler import downsample_error, scale_data
+from rlmtp.tests.unit_tests.synthetic import cyclic_curve
+
+
+class TestEnergyErrorEvaluator(TestCase):
+    def test_same_as_downsample_error(self):
+        d0 = cyclic_curve(5000, n_cycles=10)
+        # Rounding the strain gives repeated values in the accumulated strain axis
+        for d in [d0.copy(), np.column_stack([np.round(d0[:, 0], 4), d0[:, 1]])]:
+            d, e_range, s_range = scale_data(d)
+            evaluator = EnergyErrorEvaluator(d, e_range, s_range)
+            for tol in [0.1, 0.01, 0.011, 0.001]:
+                ind = polyprox.min_num(d, epsilon=tol, return_index=True)
+                for sub in [ind, ind[:len(ind) // 2], np.append(3, ind[ind > 3])]:
+                    self.assertAlmostEqual(evaluator.error(sub) / downsample_error(d, sub, [], e_range, s_range), 1.,
+                                           places=10)
+            # Only the new segments are added to the cache
+            n_cached = evaluator.n_cached
+            evaluator.error(ind)
+            self.assertEqual(evaluator.n_cached, n_cached)
@@ -1,5 +1,7 @@
 from unittest import TestCase
-from rlmtp.readers import ExcelDion7Reader, ExcelCatmanReader
+import numpy as np
+import pandas as pd
+from rlmtp.readers import ExcelDion7Reader, ExcelCatmanReader, MicrosecondDeducer, deduce_microseconds_ns
 
 
 class TestExcelDion7Reader(TestCase):
@@ -10,6 +12,36 @@ class TestExcelDion7Reader(TestCase):
         x = data.data['System Date']
         self.assertEqual(x[0].microsecond, 723000)
 
+    def test_deduce_microseconds(self):
+        reader = ExcelDion7Reader()
+        system_time = pd.Series(pd.to_datetime(['2019-01-01 10:00:00.000', '2019-01-01 10:00:00.100',
+                                                '2019-01-01 10:00:00.200', '2019-01-01 10:00:00.000',
+                                                '2019-01-01 10:00:00.000', '2019-01-01 10:00:00.550',
+                                                '2019-01-01 10:00:00.000']))
+        expected = pd.to_datetime(['2019-01-01 10:00:00.000', '2019-01-01 10:00:00.100', '2019-01-01 10:00:00.200',
+                                   '2019-01-01 10:00:00.300', '2019-01-01 10:00:00.400',
+                                   '2019-01-01 10:00:00.550', '2019-01-01 10:00:00.650'])
+        result = reader.deduce_microseconds(system_time)
+        np.testing.assert_array_equal(result.to_numpy(), expected.to_numpy())
+
+    def test_microsecond_deducer(self):
+        # The second entry with microseconds crosses a second boundary
+        cases = [['10:00:00.000', '10:00:00.900', '10:00:01.100', '10:00:01.000', '10:00:01.000', '10:00:02.000'],
+                 ['10:00:00.000', '10:00:00.100', '10:00:00.200', '10:00:00.000', '10:00:00.000', '10:00:00.550',
+                  '10:00:00.000']]
+        for times in cases:
+            system_time = pd.to_datetime(['2019-01-01 ' + t for t in times])
+            expected = deduce_microseconds_ns(system_time.to_numpy(dtype='datetime64[ns]').view('int64'))
+            for chunk_size in [1, 2, len(times)]:
+                deducer = MicrosecondDeducer()
+                chunks = []
+                for i0 in range(0, len(times), chunk_size):
+                    chunk = pd.DataFrame({'System Date': system_time[i0:i0 + chunk_size]})
+                    chunks += deducer.update(chunk)
+                chunks += deducer.finish()
+                result = pd.concat(chunks)['System Date'].to_numpy(dtype='datetime64[ns]').view('int64')
+                np.testing.assert_array_equal(result, expected)
+
 
 class TestExcelCatmanReader(TestCase):
 
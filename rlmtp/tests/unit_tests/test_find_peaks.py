@@ -0,0 +1,68 @@
+from unittest import TestCase
+import numpy as np
+import pandas as pd
+from rlmtp.find_peaks import find_peaks, find_peaks2, CycleIndex, CycleIndexBuilder
+from rlmtp.downsampler import find_saturation_index
+from rlmtp.tests.unit_tests.peaks_reference import find_peaks_loop, find_peaks2_loop
+
+
+def random_signal(rng, n):
+    """ Returns a random signal with sign changes, exact zeros, ties, and NaN entries. """
+    kind = rng.randint(4)
+    if kind == 0:
+        x = rng.normal(size=n)
+    elif kind == 1:
+        x = np.round(np.sin(np.linspace(0., rng.uniform(1., 30.), n)) * 3. + rng.normal(scale=0.5, size=n))
+    elif kind == 2:
+        x = rng.randint(-2, 3, size=n).astype(float)
+    else:
+        x = np.repeat(rng.normal(size=n), rng.randint(1, 4, size=n))[:n]
+    x[rng.uniform(size=n) < 0.05] = 0.
+    x[rng.uniform(size=n) < 0.02] = np.nan
+    return x
+
+
+class TestFindPeaks(TestCase):
+    def test_equivalence(self):
+        """ Compares with the original loop implementations on random signals. """
+        rng = np.random.RandomState(0)
+        for trial in range(500):
+            n = rng.randint(1, 60)
+            index = np.arange(n) + rng.randint(0, 3) * rng.randint(0, 100)
+            x = pd.Series(random_signal(rng, n), index=index)
+            y = pd.Series(random_signal(rng, n), index=index)
+            self.assertEqual(find_peaks(x), find_peaks_loop(x), msg='find_peaks, trial {0}'.format(trial))
+            self.assertEqual(find_peaks2(x, y), find_peaks2_loop(x, y), msg='find_peaks2, trial {0}'.format(trial))
+
+    def test_simple_cycles(self):
+        x = pd.Series([0.5, 2., 1., -1., -3., -2., 1., 4., 3.])
+        self.assertEqual(find_peaks(x), [1, 4, 7, 8])
+
+    def test_cycle_index(self):
+        """ Results from a CycleIndex are identical to the functions that scan the data. """
+        rng = np.random.RandomState(1)
+        for trial in range(100):
+            n = rng.randint(2, 200)
+            d = pd.DataFrame({'e_true': random_signal(rng, n), 'Sigma_true': random_signal(rng, n)})
+            d['Sigma_true'] = d['Sigma_true'].fillna(0.)
+            cycle_index = CycleIndex.from_data(d)
+            self.assertEqual(find_peaks(d['Sigma_true'], cycle_index), find_peaks_loop(d['Sigma_true']))
+            self.assertEqual(cycle_index.strain_peaks.tolist(), find_peaks2_loop(d['e_true'], d['Sigma_true']))
+            if d['Sigma_true'].max() > 0. > d['Sigma_true'].min():
+                self.assertEqual(find_saturation_index(d, 0.9, cycle_index), find_saturation_index(d, 0.9))
+
+    def test_cycle_index_builder(self):
+        """ Building from chunks gives the same half-cycles and peaks. """
+        rng = np.random.RandomState(2)
+        for trial in range(200):
+            n = rng.randint(2, 200)
+            d = pd.DataFrame({'e_true': random_signal(rng, n), 'Sigma_true': random_signal(rng, n)})
+            cycle_index = CycleIndex.from_data(d)
+            builder = CycleIndexBuilder()
+            splits = np.sort(rng.randint(0, n, size=rng.randint(0, 5)))
+            for e, s in zip(np.split(d['e_true'].values, splits), np.split(d['Sigma_true'].values, splits)):
+                builder.update(s, e)
+            built = builder.build()
+            for a, b in zip(built.extremes() + [built.starts, built.peaks, built.strain_peaks],
+                            cycle_index.extremes() + [cycle_index.starts, cycle_index.peaks, cycle_index.strain_peaks]):
+                np.testing.assert_array_equal(a, b, err_msg='trial {0}'.format(trial))
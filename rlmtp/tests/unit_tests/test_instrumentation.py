@@ -0,0 +1,50 @@
+from unittest import TestCase
+import os
+import shutil
+import tempfile
+import numpy as np
+from rlmtp.instrumentation import Recorder, recording, timed_stage, record_event, read_records, summarize
+
+
+class TestInstrumentation(TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_nested_stages(self):
+        file = os.path.join(self.dir, 'records.jsonl')
+        recorder = Recorder(specimen='s1', output_file=file, trace_memory=True)
+        with recording(recorder):
+            with timed_stage('outer', n_points=10) as info:
+                with timed_stage('inner'):
+                    x = np.ones(2 ** 20)
+                    record_event('iteration', error=0.1)
+                info['n_points_kept'] = 5
+        del x
+
+        records = read_records(file)
+        self.assertEqual(records, recorder.records)
+        self.assertEqual([r['type'] for r in records], ['event', 'stage', 'stage'])
+        event, inner, outer = records
+        self.assertEqual(event['stage'], 'inner')
+        self.assertEqual(inner['parent'], 'outer')
+        self.assertIsNone(outer['parent'])
+        self.assertEqual(outer['n_points'], 10)
+        self.assertEqual(outer['n_points_kept'], 5)
+        # The 8 MB array is allocated in the inner stage, so also in the outer stage
+        self.assertGreater(inner['traced_peak_mb'], 7.)
+        self.assertGreaterEqual(outer['traced_peak_mb'], inner['traced_peak_mb'])
+        self.assertGreaterEqual(outer['wall_s'], inner['wall_s'])
+
+        summary = summarize(records)
+        self.assertEqual(sorted(summary.index), ['inner', 'outer'])
+        self.assertEqual(summary.loc['outer', 'count'], 1)
+
+    def test_inactive(self):
+        recorder = Recorder()
+        with timed_stage('stage') as info:
+            record_event('iteration')
+            info['n_points'] = 1
+        self.assertEqual(recorder.records, [])
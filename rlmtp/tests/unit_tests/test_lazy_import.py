@@ -0,0 +1,47 @@
+from unittest import TestCase
+import os
+import sys
+import subprocess
+import numpy as np
+import pandas as pd
+
+PACKAGE_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..'))
+
+
+def run_python(code):
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join([PACKAGE_ROOT, env.get('PYTHONPATH', '')])
+    return subprocess.run([sys.executable, '-W', 'ignore', '-c', code], env=env, check=True, capture_output=True,
+                          text=True).stdout.split()
+
+
+class TestLazyImport(TestCase):
+    def test_no_heavy_imports(self):
+        out = run_python('import sys, rlmtp\n'
+                         'print(*[m in sys.modules for m in ["matplotlib", "scipy", "polyprox"]])\n'
+                         'rlmtp.import_dion7_data\n'
+                         'print("matplotlib" in sys.modules)')
+        self.assertEqual(out, ['False', 'False', 'False', 'False'])
+
+    def test_names(self):
+        import rlmtp
+        for name in rlmtp.__all__:
+            self.assertTrue(callable(getattr(rlmtp, name)), name)
+        self.assertEqual(rlmtp.yield_properties.__name__, 'yield_properties')
+        self.assertTrue(hasattr(rlmtp.processed_data, 'read_processed_data'))
+        with self.assertRaises(AttributeError):
+            rlmtp.not_a_name
+
+    def test_rcparams_unchanged(self):
+        import tempfile
+        import shutil
+        import matplotlib as mpl
+        from rlmtp.plotting import plot_kind
+        before = dict(mpl.rcParams)
+        out_dir = tempfile.mkdtemp()
+        try:
+            e = np.linspace(0., 0.02, 50)
+            plot_kind('stress_strain', pd.DataFrame({'e_true': e, 'Sigma_true': 2.e5 * e}), out_dir, 's')
+        finally:
+            shutil.rmtree(out_dir)
+        self.assertEqual(dict(mpl.rcParams), before)
@@ -0,0 +1,80 @@
+from unittest import TestCase
+import os
+import shutil
+import tempfile
+from rlmtp.manifest import build_manifest, write_manifest, read_manifest, stale_reason
+from rlmtp.processing import rebuild_reason, processed_file_name, get_pre_name
+from rlmtp.data_cache import CACHE_DIR_NAME
+
+
+class TestManifest(TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.input_file = os.path.join(self.dir, 'downsampler_props.txt')
+        with open(self.input_file, 'w') as f:
+            f.write('downsample_tol,0.005\n')
+        self.output_file = os.path.join(self.dir, 'specimen_processed_data.csv')
+        self.parameters = {'should_downsample': True, 'segment_length': None}
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def manifest(self):
+        return build_manifest({'downsampler_props': self.input_file, 'catman': None}, self.parameters)
+
+    def test_up_to_date(self):
+        self.assertEqual(stale_reason(self.output_file, self.manifest()), 'no output')
+        with open(self.output_file, 'w') as f:
+            f.write('e_true,Sigma_true\n')
+        self.assertEqual(stale_reason(self.output_file, self.manifest()), 'no manifest')
+
+        write_manifest(self.output_file, self.manifest())
+        self.assertIsNone(stale_reason(self.output_file, self.manifest()))
+        self.assertIn('created', read_manifest(self.output_file))
+
+    def test_changes(self):
+        with open(self.output_file, 'w') as f:
+            f.write('e_true,Sigma_true\n')
+        write_manifest(self.output_file, self.manifest())
+
+        self.parameters['should_downsample'] = False
+        self.assertEqual(stale_reason(self.output_file, self.manifest()), 'changed parameters')
+        self.parameters['should_downsample'] = True
+        with open(self.input_file, 'w') as f:
+            f.write('downsample_tol,0.01\n')
+        self.assertEqual(stale_reason(self.output_file, self.manifest()), 'changed inputs: downsampler_props')
+
+    def test_corrupt_manifest(self):
+        with open(self.output_file, 'w') as f:
+            f.write('e_true,Sigma_true\n')
+        with open(os.path.join(self.dir, 'specimen_processed_data.manifest.json'), 'w') as f:
+            f.write('{')
+        self.assertIsNone(read_manifest(self.output_file))
+        self.assertEqual(stale_reason(self.output_file, self.manifest()), 'no manifest')
+
+    def test_cached_digest(self):
+        cache_dir = os.path.join(self.dir, 'cache')
+        manifest = build_manifest({'downsampler_props': self.input_file}, self.parameters, cache_dir=cache_dir)
+        self.assertEqual(manifest, self.manifest())
+        self.assertEqual(len(os.listdir(os.path.join(cache_dir, 'stat'))), 1)
+        # The digest is reused while the file is unchanged, and updated when it changes
+        self.assertEqual(build_manifest({'downsampler_props': self.input_file}, self.parameters, cache_dir=cache_dir),
+                         manifest)
+        with open(self.input_file, 'w') as f:
+            f.write('downsample_tol,0.01\n')
+        manifest_2 = build_manifest({'downsampler_props': self.input_file}, self.parameters, cache_dir=cache_dir)
+        self.assertNotEqual(manifest_2['inputs'], manifest['inputs'])
+        self.assertEqual(manifest_2, self.manifest())
+
+    def test_rebuild_reason_read_only(self):
+        # The digests are memoized in the output directory, the input directory is not written to
+        input_dir = '../test_specimen/'
+        output_dir = os.path.join(self.dir, 'output')
+        self.assertEqual(rebuild_reason(input_dir, output_dir), 'no output')
+        self.assertFalse(os.path.exists(output_dir))
+        os.makedirs(output_dir)
+        with open(processed_file_name(output_dir, get_pre_name(input_dir)), 'w') as f:
+            f.write('e_true,Sigma_true\n')
+        self.assertEqual(rebuild_reason(input_dir, output_dir), 'no manifest')
+        self.assertFalse(os.path.exists(os.path.join(input_dir, CACHE_DIR_NAME)))
+        self.assertTrue(os.path.isdir(os.path.join(output_dir, CACHE_DIR_NAME)))
@@ -0,0 +1,83 @@
+from unittest import TestCase
+import time
+import numpy as np
+import rlmtp.downsampler
+from rlmtp.downsampler import max_deviation_downsampler, max_dist, apply_downsampler, scale_data
+from rlmtp.tests.unit_tests.synthetic import cyclic_curve
+
+
+def max_deviation_reference(pos, thresh):
+    """ Original O(n^2) max distance method. """
+    adaptive_ind = [0]
+    last_n = 0
+    for n in range(1, pos.shape[0]):
+        if max_dist(pos, last_n, n) > thresh:
+            adaptive_ind.append(n - 1)
+            last_n = n - 1
+    return adaptive_ind
+
+
+def max_line_distance(pos, ind):
+    """ Returns the maximum distance of the points to the line through the kept points before and after them. """
+    ends = list(ind) + [len(pos) - 1]
+    dist_max = 0.
+    for k0, k1 in zip(ends[:-1], ends[1:]):
+        v = pos[k1] - pos[k0]
+        rel = pos[k0:k1 + 1] - pos[k0]
+        if np.hypot(v[0], v[1]) > 0.:
+            dist = np.abs(rel[:, 0] * v[1] - rel[:, 1] * v[0]) / np.hypot(v[0], v[1])
+        else:
+            dist = np.hypot(rel[:, 0], rel[:, 1])
+        dist_max = max(dist_max, dist.max())
+    return dist_max
+
+
+class TestMaxDeviation(TestCase):
+    def setUp(self):
+        self.scalar_points = rlmtp.downsampler.CONE_SCALAR_POINTS
+
+    def tearDown(self):
+        rlmtp.downsampler.CONE_SCALAR_POINTS = self.scalar_points
+
+    def test_same_as_reference(self):
+        rng = np.random.RandomState(0)
+        walk, _, _ = scale_data(rng.normal(size=(500, 2)).cumsum(axis=0))
+        cyclic = cyclic_curve(2000, scaled=True, n_cycles=3, noise=0.5)
+        for d in [walk, cyclic]:
+            for tol in [0.05, 0.01, 0.002]:
+                expected = max_deviation_reference(d, tol)
+                # Scanned one point at a time, in windows, and both
+                for scalar_points in [1, 16, 10 ** 9]:
+                    rlmtp.downsampler.CONE_SCALAR_POINTS = scalar_points
+                    self.assertEqual(max_deviation_downsampler(d, tol), expected)
+
+    def test_ties(self):
+        # The middle point is exactly at thresh from the line
+        d = np.array([[0., 0.], [1., 0.001], [2., 0.]])
+        self.assertEqual(max_deviation_downsampler(d, 0.001), [0])
+        # Quantized data has many distances equal to thresh, and returns to the anchor
+        rng = np.random.RandomState(1)
+        for i in range(100):
+            d = (rng.randint(-1, 2, size=(60, 2)) * 0.001).cumsum(axis=0)
+            rlmtp.downsampler.CONE_SCALAR_POINTS = [1, 16, 10 ** 9][i % 3]
+            ind = max_deviation_downsampler(d, 0.001)
+            self.assertLessEqual(max_line_distance(d, ind), 0.001 * (1. + 1.e-9))
+            self.assertLessEqual(len(ind), len(max_deviation_reference(d, 0.001)))
+
+    def test_linear_time(self):
+        def best_time(n):
+            d = cyclic_curve(n, scaled=True, n_cycles=20, noise=0.5)
+            times = []
+            for _ in range(3):
+                t0 = time.perf_counter()
+                max_deviation_downsampler(d, 0.001)
+                times.append(time.perf_counter() - t0)
+            return min(times)
+        self.assertLess(best_time(200000), 20. * best_time(20000))
+
+    def test_backend(self):
+        d = cyclic_curve(2000, n_cycles=3)
+        ind = apply_downsampler(d.copy(), len(d) - 1, 0.01, backend='max_deviation')
+        self.assertEqual(ind, max_deviation_reference(scale_data(d.copy())[0], 0.01))
+        with self.assertRaises(ValueError):
+            apply_downsampler(d.copy(), len(d) - 1, 0.01, backend='unknown')
@@ -0,0 +1,169 @@
+from unittest import TestCase
+import os
+import sys
+import shutil
+import tempfile
+import threading
+import contextlib
+import io
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', '..', 'Database_Management'))
+from pipeline import Stage, Pipeline, StageIncomplete
+
+
+class TestPipeline(TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.input_file = self.path('input.txt')
+        with open(self.input_file, 'w') as f:
+            f.write('1\n')
+        self.calls = []
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def path(self, name):
+        return os.path.join(self.dir, name)
+
+    def writer(self, name, result=None):
+        """ Returns a stage function that records its call and writes the output file name.txt. """
+        def func(**kwargs):
+            self.calls.append(name)
+            with open(self.path(name + '.txt'), 'w') as f:
+                f.write(name)
+            return result
+        return func
+
+    def pipeline(self, funcs=None, loaders=None):
+        """ Returns the pipeline a -> b -> d, a -> c, funcs replaces the functions of the stages. """
+        funcs = dict() if funcs is None else funcs
+        deps = {'a': [], 'b': ['a'], 'c': ['a'], 'd': ['b']}
+        inputs = {'a': [self.input_file], 'b': [self.path('a.txt')], 'c': [self.path('a.txt')],
+                  'd': [self.path('b.txt')]}
+        stages = [Stage(n, funcs.get(n, self.writer(n)), deps=deps[n], inputs=inputs[n],
+                        outputs=[self.path(n + '.txt')]) for n in ['d', 'c', 'b', 'a']]
+        return Pipeline(stages, loaders, state_file=self.path('state.json'))
+
+    def run_quietly(self, pipeline, **kwargs):
+        with contextlib.redirect_stdout(io.StringIO()):
+            return pipeline.run(**kwargs)
+
+    def test_order(self):
+        pipeline = self.pipeline()
+        order = pipeline.order()
+        self.assertEqual(sorted(order), ['a', 'b', 'c', 'd'])
+        self.assertLess(order.index('a'), order.index('b'))
+        self.assertLess(order.index('b'), order.index('d'))
+        self.assertLess(order.index('a'), order.index('c'))
+        self.assertEqual(pipeline.order(['d']), ['a', 'b', 'd'])
+        with self.assertRaises(ValueError):
+            pipeline.order(['unknown'])
+        with self.assertRaises(ValueError):
+            Pipeline([Stage('a', None, deps=['unknown'])])
+
+    def test_cycle(self):
+        pipeline = Pipeline([Stage('a', None, deps=['c']), Stage('b', None, deps=['a']), Stage('c', None, deps=['b'])])
+        with self.assertRaises(ValueError):
+            pipeline.order()
+
+    def test_up_to_date(self):
+        results = self.run_quietly(self.pipeline(), jobs=2)
+        self.assertEqual(results, [[n, 'ran'] for n in ['a', 'b', 'd', 'c']])
+        self.calls = []
+        results = self.run_quietly(self.pipeline(), jobs=2)
+        self.assertEqual(results, [[n, 'up-to-date'] for n in ['a', 'b', 'd', 'c']])
+        self.assertEqual(self.calls, [])
+        # A changed input only runs the stages that read it
+        with open(self.input_file, 'w') as f:
+            f.write('2\n')
+        self.run_quietly(self.pipeline())
+        self.assertEqual(self.calls, ['a'])
+        # A missing output runs the stage
+        os.remove(self.path('c.txt'))
+        self.calls = []
+        self.run_quietly(self.pipeline())
+        self.assertEqual(self.calls, ['c'])
+        self.calls = []
+        self.run_quietly(self.pipeline(), force=True)
+        self.assertEqual(sorted(self.calls), ['a', 'b', 'c', 'd'])
+
+    def test_failed(self):
+        def fail():
+            raise RuntimeError('bad data')
+
+        results = dict(self.run_quietly(self.pipeline({'b': fail}), jobs=2))
+        self.assertEqual(results, {'a': 'ran', 'b': 'failed: RuntimeError: bad data', 'c': 'ran', 'd': 'skipped'})
+        self.assertNotIn('d', self.calls)
+        self.assertNotIn('b', self.pipeline().read_state())
+
+    def test_incomplete(self):
+        def incomplete():
+            self.writer('b')()
+            raise StageIncomplete('1 specimen(s) failed')
+
+        self.run_quietly(self.pipeline())
+        self.assertIn('b', self.pipeline().read_state())
+        results = dict(self.run_quietly(self.pipeline({'b': incomplete}), force=True))
+        self.assertEqual(results['b'], 'incomplete: 1 specimen(s) failed')
+        # The dependents still run, the fingerprint of the stage is removed so that it runs again
+        self.assertEqual(results['d'], 'ran')
+        self.assertNotIn('b', self.pipeline().read_state())
+        self.calls = []
+        self.run_quietly(self.pipeline())
+        self.assertEqual(self.calls, ['b'])
+
+    def test_dry_run(self):
+        self.run_quietly(self.pipeline())
+        with open(self.input_file, 'w') as f:
+            f.write('2\n')
+        self.calls = []
+        results = self.pipeline().run(['c'], dry_run=True)
+        self.assertEqual(results, [['a', 'would run: changed inputs'], ['c', 'would run: depends on a']])
+        self.assertEqual(self.calls, [])
+        os.remove(self.path('a.txt'))
+        results = dict(self.pipeline().run(dry_run=True))
+        self.assertEqual(results['a'], 'would run: missing {0}'.format(self.path('a.txt')))
+        self.assertEqual(results['d'], 'would run: depends on b')
+
+    def test_artifacts(self):
+        frame = pd.DataFrame({'x': [1, 2]})
+        used = []
+
+        def use(x):
+            used.append(x)
+
+        def stages():
+            return [Stage('a', self.writer('a', result=frame), outputs=[self.path('a.txt')], provides='x'),
+                    Stage('b', use, deps=['a'], outputs=[self.path('b.txt')], uses={'x': 'x'})]
+
+        # The artifact is passed in memory
+        self.run_quietly(Pipeline(stages(), state_file=self.path('state.json')))
+        self.assertIs(used[0], frame)
+        # The stage that provides it is up-to-date, so the loader is used (b runs since it does not write b.txt)
+        loaded = pd.DataFrame({'x': [3]})
+        self.run_quietly(Pipeline(stages(), {'x': lambda: loaded}, state_file=self.path('state.json')))
+        self.assertIs(used[1], loaded)
+        # No loader
+        results = dict(self.run_quietly(Pipeline(stages(), state_file=self.path('state.json'))))
+        self.assertTrue(results['b'].startswith('failed: KeyError'))
+
+    def test_exclusive(self):
+        lock = threading.Lock()
+        overlaps = []
+
+        def exclusive(name):
+            def func():
+                if not lock.acquire(blocking=False):
+                    overlaps.append(name)
+                    return
+                try:
+                    threading.Event().wait(0.05)
+                finally:
+                    lock.release()
+            return func
+
+        stages = [Stage(n, exclusive(n), exclusive='workers') for n in ['a', 'b', 'c']] + [Stage('d', lambda: None)]
+        results = self.run_quietly(Pipeline(stages, state_file=self.path('state.json')), jobs=4)
+        self.assertEqual(overlaps, [])
+        self.assertEqual([s for _, s in results], ['ran'] * 4)
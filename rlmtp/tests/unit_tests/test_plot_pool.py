@@ -0,0 +1,39 @@
+from unittest import TestCase
+import os
+import shutil
+import tempfile
+import warnings
+import numpy as np
+import pandas as pd
+from rlmtp.plotting import stress_strain_plotter, temp_time_plotter
+from rlmtp.plot_pool import PlotPool, plotting_pool, submit_plot, active_pool
+
+
+class TestPlotPool(TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        e = np.linspace(0., 0.02, 200)
+        self.data = pd.DataFrame({'Time[s]': np.arange(200.), 'e_true': e, 'Sigma_true': 2.e5 * e,
+                                  'Temperature[C]': 20. + e})
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_background_plots(self):
+        with PlotPool(jobs=2) as pool, plotting_pool(pool):
+            self.assertIs(active_pool(), pool)
+            for k in range(5):
+                submit_plot(stress_strain_plotter, self.data, self.dir, 's{0}'.format(k))
+            # Missing temperature column
+            with warnings.catch_warnings(record=True):
+                warnings.simplefilter('always')
+                submit_plot(temp_time_plotter, self.data[['Time[s]', 'e_true']], self.dir, 'bad')
+                pool.wait()
+        self.assertIsNone(active_pool())
+        for k in range(5):
+            self.assertTrue(os.path.isfile(os.path.join(self.dir, 's{0}_stress_strain_plot.pdf'.format(k))))
+        self.assertEqual([e[0] for e in pool.errors], ['bad'])
+
+    def test_immediate_plots(self):
+        submit_plot(temp_time_plotter, self.data, self.dir, 's')
+        self.assertTrue(os.path.isfile(os.path.join(self.dir, 's_temperature_time_plot.pdf')))
@@ -0,0 +1,45 @@
+from unittest import TestCase
+import os
+import re
+import shutil
+import tempfile
+import numpy as np
+import pandas as pd
+import matplotlib as mpl
+from rlmtp.plotting import plot_kind, batch_plotter
+
+
+class TestPlotting(TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        e = np.linspace(0., 0.02, 200)
+        self.data = pd.DataFrame({'Time[s]': np.arange(200.), 'e_true': e, 'Sigma_true': 2.e5 * e})
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_render_cache(self):
+        self.assertTrue(plot_kind('stress_strain', self.data, self.dir, 's'))
+        self.assertTrue(os.path.isfile(os.path.join(self.dir, 's_stress_strain_plot.pdf')))
+        # Same arrays and style
+        self.assertFalse(plot_kind('stress_strain', self.data.copy(), self.dir, 's'))
+        # Changed data
+        data = self.data.copy()
+        data.loc[10, 'Sigma_true'] += 1.
+        self.assertTrue(plot_kind('stress_strain', data, self.dir, 's'))
+        # Changed style
+        with mpl.rc_context({'figure.figsize': [5., 4.]}):
+            self.assertTrue(plot_kind('stress_strain', data, self.dir, 's'))
+        # Missing figure
+        os.remove(os.path.join(self.dir, 's_stress_strain_plot.pdf'))
+        self.assertTrue(plot_kind('stress_strain', data, self.dir, 's'))
+
+    def test_batch(self):
+        file = os.path.join(self.dir, 'all.pdf')
+        curves = [['LP1_S{0}'.format(k), self.data * (1. + k)] for k in range(4)]
+        self.assertTrue(batch_plotter(curves, file))
+        with open(file, 'rb') as f:
+            n_pages = len(re.findall(rb'/Type /Page\b', f.read()))
+        self.assertEqual(n_pages, 4)
+        self.assertFalse(batch_plotter(curves, file))
+        self.assertTrue(batch_plotter(curves[:3], file))
@@ -0,0 +1,112 @@
+from unittest import TestCase
+import os
+import shutil
+import tempfile
+import numpy as np
+import pandas as pd
+import polyprox
+from rlmtp.point_ranking import RDPRanking, rdp_significance, threshold_indices, VWRanking, vw_significance
+from rlmtp.point_ranking import triangle_area
+from rlmtp.downsampler import downsample_loop, scale_data, rlmtp_downsampler, stress_strain_peaks, read_downsample_props
+from rlmtp.tests.unit_tests.synthetic import cyclic_stress_strain, cyclic_curve
+
+
+class TestRDPRanking(TestCase):
+    def setUp(self):
+        self.d = cyclic_curve(5000, scaled=True, n_cycles=10)
+
+    def test_same_as_polyprox(self):
+        rng = np.random.RandomState(0)
+        walk, _, _ = scale_data(rng.uniform(size=(1000, 2)).cumsum(axis=0))
+        for d in [self.d, walk]:
+            ranking = RDPRanking(d, min_significance=1.e-2)
+            for tol in [0.1, 0.03, 1.e-2, 3.e-3, 1.e-4, 2.e-4]:
+                np.testing.assert_array_equal(ranking.indices(tol), polyprox.min_num(d, epsilon=tol, return_index=True))
+            significance = rdp_significance(d, min_significance=1.e-3)
+            np.testing.assert_array_equal(threshold_indices(significance, 5.e-3),
+                                          polyprox.min_num(d, epsilon=5.e-3, return_index=True))
+
+    def test_downsample_loop(self):
+        """ The ranking gives the same points as running polyprox for each local tolerance. """
+        for tol in [0.002, 0.02]:
+            ind_loop = downsample_loop(self.d.copy(), len(self.d) - 1, tol, use_ranking=False)
+            ind_ranking = downsample_loop(self.d.copy(), len(self.d) - 1, tol, use_ranking=True)
+            self.assertEqual(ind_loop, ind_ranking)
+
+
+def vw_reference(d, is_forced):
+    """ Visvalingam-Whyatt algorithm that recomputes all the areas after each removal. """
+    significance = np.full(len(d), np.inf)
+    kept = list(range(len(d)))
+    last_significance = -np.inf
+    while True:
+        k = np.array(kept)
+        area = triangle_area(d[k[:-2], 0], d[k[:-2], 1], d[k[1:-1], 0], d[k[1:-1], 1], d[k[2:], 0], d[k[2:], 1])
+        area[is_forced[k[1:-1]]] = np.inf
+        if len(area) == 0 or np.isinf(area.min()):
+            return significance
+        j = int(np.argmin(area)) + 1
+        last_significance = max(last_significance, area[j - 1])
+        significance[kept.pop(j)] = last_significance
+
+
+class TestVWRanking(TestCase):
+    def setUp(self):
+        rng = np.random.RandomState(1)
+        self.d, _, _ = scale_data(rng.normal(size=(300, 2)).cumsum(axis=0))
+
+    def test_same_as_reference(self):
+        is_forced = np.zeros(len(self.d), dtype=bool)
+        is_forced[[20, 150, 151]] = True
+        for forced in [None, is_forced]:
+            significance = vw_significance(self.d, forced)
+            if forced is None:
+                forced = np.zeros(len(self.d), dtype=bool)
+            np.testing.assert_array_equal(significance, vw_reference(self.d, forced))
+
+    def test_budget(self):
+        forced = [20, 150]
+        excluded = list(range(100, 120))
+        ranking = VWRanking(self.d, forced=forced, excluded=excluded)
+        for n_points in [10, 57, 200]:
+            ind = ranking.budget_indices(n_points)
+            self.assertEqual(len(ind), n_points)
+            self.assertTrue(set(forced + [0, len(self.d) - 1]).issubset(ind))
+            self.assertFalse(set(excluded).intersection(ind))
+            # The budget is equivalent to a tolerance on the effective area
+            tol = np.sort(ranking.significance)[::-1][n_points]
+            np.testing.assert_array_equal(ranking.indices(tol), ind)
+        self.assertEqual(len(ranking.budget_indices(len(self.d))), len(self.d) - len(excluded))
+        with self.assertWarns(UserWarning):
+            self.assertEqual(len(ranking.budget_indices(2)), 4)
+
+    def test_rlmtp_downsampler(self):
+        strain, stress = cyclic_stress_strain(5000, n_cycles=5)
+        data = pd.DataFrame({'e_true': strain, 'Sigma_true': stress})
+        ind = rlmtp_downsampler(data, backend='visvalingam', n_points=150, removal_ranges=[[1000, 1500]])
+        self.assertEqual(len(ind), 150)
+        self.assertFalse([i for i in ind if 1000 < i < 1500])
+        ind_ss, _ = stress_strain_peaks(data)
+        self.assertTrue(set(i for i in ind_ss if not 1000 < i < 1500).issubset(ind))
+
+
+class TestDownsampleProps(TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.file = os.path.join(self.dir, 'downsampler_props.txt')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def read(self, text):
+        with open(self.file, 'w') as f:
+            f.write(text)
+        return read_downsample_props(self.file)
+
+    def test_booleans(self):
+        props = self.read('use_ranking,False\nuse_local_error, false\napply_filter,0\ncut_sat_cycles,True\n')
+        self.assertEqual([props[p] for p in ['use_ranking', 'use_local_error', 'apply_filter', 'cut_sat_cycles']],
+                         [False, False, False, True])
+        props = self.read('use_ranking,yes\nbackend,visvalingam\nn_points,None\n')
+        self.assertEqual(props, {'use_ranking': True, 'backend': 'visvalingam', 'n_points': None,
+                                 'removal_ranges': []})
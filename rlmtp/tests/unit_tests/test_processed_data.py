@@ -0,0 +1,62 @@
+from unittest import TestCase, skipIf
+import os
+import shutil
+import tempfile
+import importlib.util
+import numpy as np
+import pandas as pd
+from rlmtp.processed_data import write_processed_data, write_processed_chunks, read_processed_data, find_data_files, \
+    csv_has_index
+
+HAS_PYARROW = importlib.util.find_spec('pyarrow') is not None
+
+
+class TestProcessedData(TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        rng = np.random.RandomState(1)
+        index = np.sort(rng.choice(10000, 500, replace=False))
+        self.data = pd.DataFrame(rng.normal(size=(500, 4)), index=index,
+                                 columns=['Time[s]', 'e_true', 'Sigma_true', 'Temperature[C]'])
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def round_trip(self, output_format):
+        file = os.path.join(self.dir, 'specimen_processed_data.' + output_format)
+        chunks = (self.data.iloc[i:i + 128] for i in range(0, len(self.data), 128))
+        write_processed_chunks(chunks, file, len(self.data), output_format=output_format)
+        pd.testing.assert_frame_equal(read_processed_data(file), self.data, check_index_type=False)
+
+    def test_csv(self):
+        file = os.path.join(self.dir, 'specimen_processed_data.csv')
+        write_processed_data(self.data, file)
+        # Same as the previous output and the scripts that read it
+        with open(file, 'r') as f:
+            self.assertEqual(f.read(), self.data.to_csv())
+        pd.testing.assert_frame_equal(read_processed_data(file), self.data, check_index_type=False)
+        self.assertTrue(csv_has_index(file))
+        # Non-RLMTP data without an index
+        self.data.to_csv(file, index=False)
+        self.assertFalse(csv_has_index(file))
+        pd.testing.assert_frame_equal(read_processed_data(file, has_index=False), self.data.reset_index(drop=True))
+
+    def test_npz(self):
+        self.round_trip('npz')
+
+    @skipIf(not HAS_PYARROW, 'pyarrow is not installed')
+    def test_parquet(self):
+        self.round_trip('parquet')
+
+    @skipIf(not HAS_PYARROW, 'pyarrow is not installed')
+    def test_feather(self):
+        self.round_trip('feather')
+
+    def test_find_data_files(self):
+        for f in ['a.csv', 'b.npz', 'c.pdf', 'd.manifest.json']:
+            open(os.path.join(self.dir, f), 'w').close()
+        self.assertEqual(find_data_files(self.dir), [os.path.join(self.dir, f) for f in ['a.csv', 'b.npz']])
+
+    def test_unknown_format(self):
+        with self.assertRaises(ValueError):
+            write_processed_data(self.data, os.path.join(self.dir, 'x.h5'), output_format='hdf5')
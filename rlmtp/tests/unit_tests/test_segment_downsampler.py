@@ -0,0 +1,30 @@
+from unittest import TestCase
+import numpy as np
+import pandas as pd
+from rlmtp.downsampler import segment_breaks, segment_downsampler, stress_strain_peaks, downsample_error
+from rlmtp.tests.unit_tests.synthetic import cyclic_curve
+
+
+class TestSegmentDownsampler(TestCase):
+    def setUp(self):
+        self.d = cyclic_curve(20000, n_cycles=20)
+        ind_ss, _ = stress_strain_peaks(pd.DataFrame({'e_true': self.d[:, 0], 'Sigma_true': self.d[:, 1]}))
+        self.ind_ss = sorted(set(ind_ss))
+
+    def test_segment_breaks(self):
+        breaks = segment_breaks(self.ind_ss, 4)
+        self.assertEqual(len(breaks), 5)
+        self.assertEqual(breaks[0], 0)
+        self.assertEqual(breaks[-1], self.ind_ss[-1])
+        self.assertTrue(set(breaks[1:]).issubset(self.ind_ss))
+        self.assertTrue(np.all(np.diff(breaks) >= 1000))
+
+    def test_parallel(self):
+        breaks = segment_breaks(self.ind_ss, 4)
+        for use_global, tol in [(False, 0.001), (True, 0.01)]:
+            ind_serial = segment_downsampler(self.d.copy(), breaks, tol, use_global=use_global, n_jobs=1)
+            ind_parallel = segment_downsampler(self.d.copy(), breaks, tol, use_global=use_global, n_jobs=2)
+            self.assertEqual(ind_serial, ind_parallel)
+            self.assertTrue(set(breaks).issubset(ind_serial))
+            if use_global:
+                self.assertLess(downsample_error(self.d.copy(), ind_serial), tol)
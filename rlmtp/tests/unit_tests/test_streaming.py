@@ -0,0 +1,55 @@
+from unittest import TestCase
+import os
+import glob
+import shutil
+import tempfile
+import contextlib
+import io
+import pandas as pd
+from rlmtp.readers import ExcelDion7Reader, ExcelCatmanReader
+from rlmtp.sync_temperature import sync_temperature
+from rlmtp.downsampler import rlmtp_downsampler
+from rlmtp.streaming import stream_process
+
+
+class TestStreaming(TestCase):
+    def setUp(self):
+        self.dion7_file = '../test_specimen/Excel/testData_07012019.xlsx'
+        self.catman_data = ExcelCatmanReader().read(glob.glob('../test_specimen/rawData/Temperature*')[0])
+        self.out_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.out_dir)
+
+    def test_same_as_in_memory(self):
+        reader = ExcelDion7Reader()
+        data = sync_temperature(reader.read(self.dion7_file), self.catman_data)
+        data.index = data.index.astype('int64')
+        output_file = os.path.join(self.out_dir, 'processed_data.csv')
+        # The local criteria is not split into segments, the segment length is shorter than the data
+        cases = [({'use_local_error': True}, None, None), ({'use_local_error': True}, 3000, None),
+                 ({'use_local_error': True, 'backend': 'max_deviation'}, 3000, None),
+                 ({'use_local_error': False, 'downsample_tol': 0.005}, 3000, 3000)]
+        self.assertLess(3000, len(data))
+        for params, segment_length, in_memory_length in cases:
+            with contextlib.redirect_stdout(io.StringIO()):
+                ind = rlmtp_downsampler(data, segment_length=in_memory_length, **params)
+                result = stream_process(reader.iter_chunks(self.dion7_file, chunk_size=1000), output_file,
+                                        catman_data=self.catman_data, downsample_params=params,
+                                        segment_length=segment_length, chunk_size=1000)
+            self.assertEqual(result.indices, ind)
+            self.assertEqual(result.n_rows, len(data))
+        # Output of the last run
+        expected = data[['C_1_Temps[s]', 'e_true', 'Sigma_true', 'Temperature[C]']].loc[ind]
+        expected = expected.rename(columns={'C_1_Temps[s]': 'Time[s]'})
+        pd.testing.assert_frame_equal(pd.read_csv(output_file, index_col=0), expected, check_index_type=False)
+
+    def test_no_downsampling(self):
+        reader = ExcelDion7Reader()
+        output_file = os.path.join(self.out_dir, 'processed_data.csv')
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = stream_process(reader.iter_chunks(self.dion7_file, chunk_size=1000), output_file,
+                                    should_downsample=False, chunk_size=1000)
+        self.assertEqual(result.indices, range(result.n_rows))
+        self.assertIsNone(result.data)
+        self.assertEqual(len(pd.read_csv(output_file, index_col=0)), result.n_rows)
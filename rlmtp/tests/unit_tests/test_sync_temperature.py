@@ -1,14 +1,43 @@
 from unittest import TestCase
+import numpy as np
 from rlmtp.readers import ExcelDion7Reader, ExcelCatmanReader
-from rlmtp.sync_temperature import sync_temperature
+from rlmtp.sync_temperature import sync_temperature, sync_catman_channels, interp_columns
+from rlmtp.downsampler import output_columns
 
 
 class TestSync_temperature(TestCase):
-    def test_sync_temperature(self):
+    def setUp(self):
         reader = ExcelDion7Reader()
-        dion_data = reader.read('../LP9_1_181211.xlsx')
+        self.dion_data = reader.read('../LP9_1_181211.xlsx')
         reader = ExcelCatmanReader()
-        catman_data = reader.read('../Temp_LP9_1_181211.XLSX')
-        synced_data = sync_temperature(dion_data, catman_data)
+        self.catman_data = reader.read('../Temp_LP9_1_181211.XLSX')
+
+    def test_sync_temperature(self):
+        synced_data = sync_temperature(self.dion_data, self.catman_data)
 
         self.assertTrue('Temperature[C]' in synced_data.columns)
+        self.assertFalse('Temperature[C]' in self.dion_data.data.columns)
+
+    def test_sync_catman_channels(self):
+        result = sync_catman_channels(self.dion_data.to_array_timed_data(),
+                                      self.catman_data.to_array_timed_data(implicit_time=True))
+        synced_data = sync_temperature(self.dion_data, self.catman_data, inplace=True)
+        self.assertEqual(result.channels, ['Temperature[C]'])
+        self.assertEqual(result.coverage.n_before + result.coverage.n_after, 0)
+        np.testing.assert_array_equal(result.values[:, 0], synced_data['Temperature[C]'])
+        self.assertTrue('Temperature[C]' in self.dion_data.data.columns)
+
+    def test_output_columns(self):
+        synced_data = sync_temperature(self.dion_data, self.catman_data)
+        synced_data['Temperature_2[C]'] = synced_data['Temperature[C]']
+        self.assertEqual(output_columns(synced_data), ['C_1_Temps[s]', 'e_true', 'Sigma_true', 'Temperature[C]'])
+        self.assertEqual(output_columns(self.dion_data.data), ['C_1_Temps[s]', 'e_true', 'Sigma_true'])
+
+    def test_interp_columns(self):
+        rng = np.random.RandomState(0)
+        x = np.sort(rng.uniform(-1., 11., 500))
+        xp = np.sort(rng.uniform(0., 10., 40))
+        fp = rng.uniform(size=(40, 3))
+        values = interp_columns(x, xp, fp)
+        for k in range(3):
+            np.testing.assert_array_equal(values[:, k], np.interp(x, xp, fp[:, k]))
@@ -0,0 +1,29 @@
+from unittest import TestCase
+import numpy as np
+from rlmtp.readers import ExcelCatmanReader
+from rlmtp.timed_data import ArrayTimedData
+
+
+class TestArrayTimedData(TestCase):
+    def setUp(self):
+        self.catman_data = ExcelCatmanReader().read('../Temp_LP9_1_181211.XLSX')
+
+    def test_implicit_time(self):
+        compact = self.catman_data.to_array_timed_data(implicit_time=True)
+        self.assertTrue(compact.has_implicit_time)
+        np.testing.assert_array_equal(compact['System Date'], self.catman_data.data['System Date'].to_numpy())
+        inc = [0, 10, len(compact) - 1]
+        self.assertEqual(compact.get_times_at_increments(inc), self.catman_data.get_times_at_increments(inc))
+
+    def test_increments_at_times(self):
+        inc = [3, 7, 100]
+        times = self.catman_data.get_times_at_increments(inc)
+        for implicit_time in [True, False]:
+            compact = self.catman_data.to_array_timed_data(implicit_time=implicit_time)
+            np.testing.assert_array_equal(compact.get_increments_at_times(times), inc)
+            np.testing.assert_array_equal(compact.get_increments_at_times(times, side='right'), np.add(inc, 1))
+
+    def test_columns(self):
+        compact = ArrayTimedData.from_timed_data(self.catman_data)
+        np.testing.assert_allclose(compact['Temperature[C]'], self.catman_data.data['Temperature[C]'].astype(float))
+        self.assertEqual(len(compact.to_dataframe()), len(self.catman_data.data))
@@ -2,9 +2,14 @@
 Object to store data that starts at a specific time and has a specific sampling rate.
 
 TimedData objects are generally used to store temperature and stress-strain data.
+ArrayTimedData objects are a compact alternative that store the columns as NumPy arrays.
 """
 
 import datetime
+import numpy as np
+import pandas as pd
+
+SYSTEM_DATE = 'System Date'
 
 
 class TimedData:
@@ -29,9 +34,165 @@ class TimedData:
         :param list inc: Zero-indexed time increments in self.data
         :return list: (datetime.datetime) Corresponding entries in System Date.
         """
-        t = []
-        for ti in inc:
-            t.append(self.data['System Date'][ti])
-        return t
+        return list(self.data[SYSTEM_DATE].iloc[list(inc)])
+
+    def to_array_timed_data(self, implicit_time=False):
+        """ Returns an ArrayTimedData with the same columns and times.
+
+        :param bool implicit_time: If True, the times are derived from start_time and sample_rate_ms instead of being
+            stored, only use this option if the System Date entries are at a constant rate from the start time.
+        :return ArrayTimedData: Compact copy of the data.
+        """
+        return ArrayTimedData.from_timed_data(self, implicit_time=implicit_time)
+
+
+class ArrayTimedData:
+    """ Compact time series data, each column is a contiguous NumPy array and the times are int64 ns since epoch.
+
+    Notes:
+    ======
+        - The times are either stored explicitly, or derived from the start time and sampling rate as
+            t_i = start_time + (i + time_offset) * sample_rate_ms
+        where time_offset = 0 if the first entry is measured at the start time (e.g., catman).
+        - Time to index lookups use np.searchsorted on the (non-decreasing) times.
+    """
+    __slots__ = ('start_time', 'sample_rate_ms', 'columns', 'time_offset', '_time_ns', '_n')
+
+    def __init__(self, columns, start_time, sample_rate_ms, time_ns=None, time_offset=0):
+        """ Constructor.
+
+        :param dict columns: (str, np.ndarray) Measured data, all the arrays have the same length.
+        :param datetime.datetime start_time: Time that the recording started.
+        :param datetime.timedelta sample_rate_ms: Sampling rate in milliseconds.
+        :param np.ndarray time_ns: (n, ) Time of each entry in ns since epoch, if None then the times are implicit.
+        :param int time_offset: Number of samples between the start time and the first entry for implicit times.
+        """
+        self.columns = {str(k): np.ascontiguousarray(v) for k, v in columns.items()}
+        lengths = set(len(v) for v in self.columns.values())
+        if time_ns is not None:
+            time_ns = np.ascontiguousarray(time_ns, dtype=np.int64)
+            lengths.add(len(time_ns))
+        if len(lengths) > 1:
+            raise ValueError('All the columns must have the same length.')
+        self._n = lengths.pop() if len(lengths) == 1 else 0
+        self.start_time = start_time
+        self.sample_rate_ms = sample_rate_ms
+        self.time_offset = time_offset
+        self._time_ns = time_ns
+
+    @classmethod
+    def from_timed_data(cls, timed_data, implicit_time=False):
+        """ Returns an ArrayTimedData from a TimedData object, see TimedData.to_array_timed_data. """
+        data = timed_data.data
+        columns = dict()
+        for c in data.columns:
+            if c == SYSTEM_DATE:
+                continue
+            col = data[c]
+            if col.dtype == object:
+                try:
+                    col = col.astype(float)
+                except (TypeError, ValueError):
+                    pass
+            columns[c] = col.to_numpy()
+        if implicit_time:
+            time_ns = None
+            # Offset of the first entry from the start time in number of samples
+            first_ns = data[SYSTEM_DATE].iloc[0].value
+            time_offset = int(round((first_ns - _to_ns(timed_data.start_time)) / _to_ns(timed_data.sample_rate_ms)))
+        else:
+            time_ns = data[SYSTEM_DATE].to_numpy(dtype='datetime64[ns]').view('int64')
+            time_offset = 0
+        return cls(columns, timed_data.start_time, timed_data.sample_rate_ms, time_ns=time_ns,
+                   time_offset=time_offset)
+
+    def __len__(self):
+        return self._n
+
+    def __getitem__(self, column):
+        """ Returns the array for column, 'System Date' returns the times as datetime64[ns]. """
+        if column == SYSTEM_DATE:
+            return self.time_ns.view('datetime64[ns]')
+        return self.columns[column]
+
+    def __contains__(self, column):
+        return column == SYSTEM_DATE or column in self.columns
+
+    @property
+    def has_implicit_time(self):
+        """ True if the times are derived from the start time and sampling rate. """
+        return self._time_ns is None
+
+    @property
+    def time_ns(self):
+        """ np.ndarray: (n, ) int64 time of each entry in ns since epoch. """
+        if self._time_ns is not None:
+            return self._time_ns
+        return self._implicit_time_ns(np.arange(self._n, dtype=np.int64))
+
+    @property
+    def nbytes(self):
+        """ int: Number of bytes used by the arrays. """
+        n = sum(v.nbytes for v in self.columns.values())
+        if self._time_ns is not None:
+            n += self._time_ns.nbytes
+        return n
+
+    def _implicit_time_ns(self, inc):
+        """ Returns the implicit times in ns at the increments inc. """
+        return _to_ns(self.start_time) + (inc + self.time_offset) * _to_ns(self.sample_rate_ms)
+
+    def get_times_ns_at_increments(self, inc):
+        """ Returns the int64 times in ns since epoch corresponding to the provided time increments. """
+        inc = np.asarray(inc, dtype=np.int64)
+        if self._time_ns is not None:
+            return self._time_ns[inc]
+        inc = np.where(inc < 0, inc + self._n, inc)
+        return self._implicit_time_ns(inc)
+
+    def get_times_at_increments(self, inc):
+        """ Returns the System Date corresponding to the provided time increments.
+
+        :param list inc: Zero-indexed time increments.
+        :return list: (pd.Timestamp) Corresponding times.
+        """
+        return list(pd.to_datetime(self.get_times_ns_at_increments(inc)))
+
+    def get_epoch_seconds(self):
+        """ Returns the time of each entry in seconds since epoch, truncated to the microsecond. """
+        return (self.time_ns // 1000) / 1.e6
+
+    def get_increments_at_times(self, times, side='left'):
+        """ Returns the increments of the first entries at or after (side='left') the provided times.
+
+        :param list times: (datetime.datetime or np.datetime64) Times of interest.
+        :param str side: 'left' or 'right', see np.searchsorted.
+        :return np.ndarray: (int) Increments in [0, n], n means that the time is after the last entry.
+        """
+        t_ns = np.asarray(pd.to_datetime(times).to_numpy(dtype='datetime64[ns]').view('int64'))
+        if self._time_ns is not None:
+            return np.searchsorted(self._time_ns, t_ns, side=side)
+        rate = _to_ns(self.sample_rate_ms)
+        rel = t_ns - _to_ns(self.start_time) - self.time_offset * rate
+        if side == 'left':
+            inc = -(-rel // rate)
+        else:
+            inc = rel // rate + 1
+        return np.clip(inc, 0, self._n)
+
+    def to_dataframe(self):
+        """ Returns a DataFrame with the columns and 'System Date', as in TimedData.data. """
+        data = pd.DataFrame(self.columns)
+        data[SYSTEM_DATE] = self[SYSTEM_DATE]
+        return data
+
+    def to_timed_data(self):
+        """ Returns a TimedData object with the same data. """
+        return TimedData(self.to_dataframe(), self.start_time, self.sample_rate_ms)
 
 
+def _to_ns(t):
+    """ Returns the datetime or timedelta t as an integer number of nanoseconds (since epoch for datetimes). """
+    if isinstance(t, (datetime.timedelta, np.timedelta64)):
+        return int(pd.Timedelta(t).value)
+    return int(pd.Timestamp(t).value)
@@ -11,4 +11,7 @@ setup(name='rlmtp',
       install_requires=[
           'numpy', 'pandas>=0.24.1', 'xlrd', 'matplotlib', 'polyprox'
       ],
+      extras_require={
+          'parquet': ['pyarrow']
+      },
       zip_safe=False)